@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""
+Deferred rendering and output formats for the diagram generators
+
+Generators build their graph under `with Diagram(...)`, which renders on
+exit. build_deferred() runs a generator's build() with rendering held back,
+so the graph can be inspected (e.g. hashed for the render cache) and then
+rendered with render_deferred() in one of FORMATS:
+
+    png  Graphviz render with the embedded icons (published docs)
+    svg  Graphviz render without icons; no raster images are loaded
+    dot  The DOT source without icons, written directly; Graphviz is not run
+
+The svg and dot outputs are meant for quick previews, e.g. on pull requests.
+"""
+
+import argparse
+import inspect
+import os
+import re
+
+FORMATS = ("png", "svg", "dot")
+
+# Node attributes that make Graphviz load and embed an icon image
+ICON_ATTRIBUTES = re.compile(r'\s(?:image="[^"]*"|shape=none)')
+
+
+def build_deferred(build, model=None, outformat="png"):
+    """
+    Run a generator's build() without rendering
+
+    Diagram.render is swapped for one that only writes the DOT source (which
+    Diagram.__exit__ removes again).
+
+    Args:
+        build: The generator's build function
+        model: Optional TerraformModel, passed to generators whose build()
+            takes one
+        outformat: One of FORMATS
+
+    Returns:
+        Tuple of (build() result, list of the Diagram objects built)
+    """
+    from diagrams import Diagram
+
+    built = []
+
+    def defer(diagram):
+        built.append(diagram)
+        diagram.dot.save()
+
+    kwargs = {"outformat": outformat}
+    if model is not None and "model" in inspect.signature(build).parameters:
+        kwargs["model"] = model
+
+    render = Diagram.render
+    Diagram.render = defer
+    try:
+        return build(**kwargs), built
+    finally:
+        Diagram.render = render
+
+
+def headless_source(diagram):
+    """DOT source of a Diagram with the icon images left out"""
+    return ICON_ATTRIBUTES.sub("", diagram.dot.source)
+
+
+def render_deferred(diagrams_built):
+    """
+    Render deferred diagrams in the format they were built with, the way
+    Diagram.__exit__ does (leaving only the output file)
+    """
+    import graphviz
+
+    for diagram in diagrams_built:
+        if diagram.outformat == "dot":
+            with open(f"{diagram.filename}.dot", "w") as output:
+                output.write(headless_source(diagram))
+            continue
+        if diagram.outformat == "svg":
+            graphviz.Source(headless_source(diagram), filename=diagram.filename).render(format="svg", quiet=True)
+        else:
+            diagram.render()
+        # Rendering writes the DOT source next to the output again
+        os.remove(diagram.filename)
+
+
+def run(build, description):
+    """
+    Command line entry point of a single generator
+
+    Usage: <script> [--format png|svg|dot] [terraform.tfstate | terraform show -json output]
+
+    Returns:
+        Name of the rendered file
+    """
+    from terraform_model import load_model
+
+    parser = argparse.ArgumentParser(description=description)
+    parser.add_argument("state", nargs="?", help="terraform.tfstate or `terraform show -json` output")
+    parser.add_argument("--format", choices=FORMATS, default="png", help="Output format (default: png)")
+    args = parser.parse_args()
+
+    model = load_model(args.state) if args.state else None
+    output, diagrams_built = build_deferred(build, model, args.format)
+    render_deferred(diagrams_built)
+    return output
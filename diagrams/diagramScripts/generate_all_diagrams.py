@@ -2,21 +2,63 @@
 """
 Generate all Skill Tracker architecture diagrams
 Requires: pip install diagrams
+
+Each generator module exposes build(). The diagrams are rendered in a
+process pool (one worker per CPU, at most one per diagram), so the
+diagrams import is paid once per worker instead of once per script and the
+Graphviz renders run side by side.
+
+Renders are cached: render_manifest.json, next to the PNGs, records a key per
+output file hashed from the generator source, its DOT output, the output
+format and the diagrams, graphviz and Graphviz versions. A diagram whose key
+is unchanged and whose file exists is not rendered again. The manifest is
+not committed; the diagrams workflow keeps it in the CI cache.
+
+--format svg or dot renders previews without the icon images (see
+diagram_output.py); png, the default, is what the docs publish.
+
+With --state, the architecture, network and data flow diagrams are drawn
+from a terraform.tfstate or `terraform show -json` file (see
+terraform_model.py) instead of their built-in layouts.
+
+Usage:
+    python3 generate_all_diagrams.py [--force] [--only network ...] [--state FILE] [--format png|svg|dot]
 """
 
+import argparse
+import hashlib
+import importlib
+import importlib.metadata
+import json
+import os
+import re
 import subprocess
 import sys
-import os
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+
+from diagram_output import FORMATS, build_deferred, render_deferred
+from terraform_model import load_model
 
-# List of diagram scripts
-DIAGRAM_SCRIPTS = [
-    "generate_architecture.py",
-    "generate_network.py",
-    "generate_cicd.py",
-    "generate_monitoring.py",
-    "generate_data_flow.py",
+# Generator modules, each exposing build()
+DIAGRAM_MODULES = [
+    "generate_architecture",
+    "generate_network",
+    "generate_cicd",
+    "generate_monitoring",
+    "generate_data_flow",
 ]
 
+# Published diagrams live one level above the scripts
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+OUTPUT_DIR = os.path.dirname(SCRIPT_DIR)
+MANIFEST = "render_manifest.json"
+
+# diagrams gives every node a random uuid4 hex id, quoted when it starts with a digit
+NODE_ID = re.compile(r'"?\b([0-9a-f]{32})\b"?')
+
 def check_dependencies():
     """Check if required packages are installed"""
     try:
@@ -31,25 +73,172 @@ def check_dependencies():
         print("  pip install -r requirements.txt")
         return False
 
-def generate_diagram(script_name):
-    """Generate a single diagram"""
-    print(f"\n🎨 Generating {script_name}...")
+def tool_versions():
+    """Versions of the diagrams and graphviz packages and the Graphviz binary"""
+    versions = {}
+    for package in ("diagrams", "graphviz"):
+        try:
+            versions[package] = importlib.metadata.version(package)
+        except importlib.metadata.PackageNotFoundError:
+            versions[package] = None
     try:
-        result = subprocess.run(
-            [sys.executable, script_name],
-            capture_output=True,
-            text=True,
-            check=True
-        )
-        print(result.stdout)
-        return True
-    except subprocess.CalledProcessError as e:
-        print(f"❌ Error generating {script_name}")
-        print(e.stderr)
-        return False
+        result = subprocess.run(["dot", "-V"], capture_output=True, text=True)
+        versions["dot"] = (result.stderr or result.stdout).strip()
+    except OSError:
+        versions["dot"] = None
+    return versions
+
+def normalized_dot(source):
+    """
+    DOT source with run-specific details removed
+
+    Node ids are renumbered in order of appearance and icon paths made
+    relative to the diagrams install, so the same diagram hashes the same
+    on every run and machine.
+    """
+    import diagrams
+
+    ids = {}
+    source = NODE_ID.sub(lambda match: ids.setdefault(match.group(1), f"n{len(ids)}"), source)
+    install_dir = os.path.dirname(os.path.dirname(os.path.abspath(diagrams.__file__)))
+    return source.replace(install_dir + os.sep, "")
+
+def cache_key(module_file, dot_sources, outformat, versions):
+    """sha256 of the generator source, its normalized DOT output, the format and the tool versions"""
+    digest = hashlib.sha256()
+    with open(module_file, "rb") as source:
+        digest.update(source.read())
+    for dot_source in dot_sources:
+        digest.update(normalized_dot(dot_source).encode("utf-8"))
+    digest.update(outformat.encode("utf-8"))
+    digest.update(json.dumps(versions, sort_keys=True).encode("utf-8"))
+    return digest.hexdigest()
+
+def load_manifest(path):
+    try:
+        with open(path) as manifest:
+            return json.load(manifest)
+    except FileNotFoundError:
+        return {}
+
+def save_manifest(path, manifest):
+    with open(path, "w") as output:
+        json.dump(manifest, output, indent=2, sort_keys=True)
+        output.write("\n")
+
+def generate_diagram(module_name, manifest=None, versions=None, force=False, model=None, outformat="png"):
+    """
+    Generate a single diagram (runs in a worker process)
+
+    Args:
+        module_name: Generator module exposing build()
+        manifest: Render manifest of earlier runs
+        versions: tool_versions() of this run
+        force: Render even when the cache key matches
+        model: Optional TerraformModel for the generators that use one
+        outformat: One of diagram_output.FORMATS
+
+    Returns:
+        Dict with the module name, rendered file, cache key, whether the
+        cached file was kept, seconds taken and the error traceback (None on
+        success)
+    """
+    started = time.perf_counter()
+    result = {"module": module_name, "output": None, "key": None, "cached": False, "seconds": 0.0, "error": None}
+    try:
+        module = importlib.import_module(module_name)
+        result["output"], diagrams_built = build_deferred(module.build, model, outformat)
+        dot_sources = [diagram.dot.source for diagram in diagrams_built]
+        result["key"] = cache_key(module.__file__, dot_sources, outformat, versions)
+        cached = (manifest or {}).get(result["output"], {})
+        if not force and cached.get("key") == result["key"] and os.path.exists(result["output"]):
+            result["cached"] = True
+        else:
+            render_deferred(diagrams_built)
+    except Exception:
+        result["error"] = traceback.format_exc()
+    result["seconds"] = time.perf_counter() - started
+    return result
+
+def generate_all(module_names, manifest=None, force=False, model=None, outformat="png", workers=None):
+    """
+    Render diagrams in a process pool
+
+    Args:
+        module_names: Generator modules to run
+        manifest: Render manifest of earlier runs
+        force: Ignore the manifest and render everything
+        model: Optional TerraformModel for the generators that use one
+        outformat: One of diagram_output.FORMATS
+        workers: Pool size (the CPU count by default)
+
+    Returns:
+        List of generate_diagram results, in module_names order
+    """
+    generate = partial(
+        generate_diagram, manifest=manifest, versions=tool_versions(), force=force, model=model, outformat=outformat
+    )
+    workers = min(workers or os.cpu_count() or 1, len(module_names))
+    if workers <= 1:
+        return [generate(name) for name in module_names]
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(generate, module_names))
+
+def selected_modules(only):
+    """
+    Generator modules picked with --only
+
+    Args:
+        only: Names as given, with or without the generate_ prefix
+
+    Returns:
+        Module names, in DIAGRAM_MODULES order
+    """
+    if not only:
+        return list(DIAGRAM_MODULES)
+    wanted = {name if name.startswith("generate_") else f"generate_{name}" for name in only}
+    unknown = wanted - set(DIAGRAM_MODULES)
+    if unknown:
+        choices = ", ".join(name[len("generate_"):] for name in DIAGRAM_MODULES)
+        print(f"❌ Unknown diagram(s): {', '.join(sorted(unknown))} (choose from {choices})")
+        sys.exit(2)
+    return [name for name in DIAGRAM_MODULES if name in wanted]
+
+def print_summary(results, elapsed):
+    """Print per-diagram timing and errors"""
+    print("\n" + "=" * 60)
+    for result in results:
+        status = "✅" if result["error"] is None else "❌"
+        output = result["output"] or "-"
+        note = " (unchanged, not rendered)" if result["cached"] else ""
+        print(f"{status} {result['module']:<24} {output:<28} {result['seconds']:6.2f}s{note}")
+    for result in results:
+        if result["error"] is not None:
+            print(f"\n❌ Error generating {result['module']}")
+            print(result["error"])
+
+    success_count = sum(1 for result in results if result["error"] is None)
+    cached_count = sum(1 for result in results if result["cached"])
+    print("=" * 60)
+    print(f"✅ Successfully generated {success_count}/{len(results)} diagrams in {elapsed:.2f}s"
+          f" ({cached_count} unchanged)")
+    print("=" * 60)
+    return success_count
 
 def main():
     """Main function to generate all diagrams"""
+    parser = argparse.ArgumentParser(description="Generate the Skill Tracker architecture diagrams")
+    parser.add_argument("--force", action="store_true", help="Render even diagrams that have not changed")
+    parser.add_argument("--only", action="append", metavar="NAME",
+                        help="Only this diagram, e.g. network or generate_network (repeatable)")
+    parser.add_argument("--state", metavar="FILE",
+                        help="terraform.tfstate or `terraform show -json` output to draw the infrastructure from")
+    parser.add_argument("--format", choices=FORMATS, default="png",
+                        help="png for the published docs (default); svg or dot for quick previews without icons")
+    args = parser.parse_args()
+
+    module_names = selected_modules(args.only)
+
     print("=" * 60)
     print("Skill Tracker - Diagram Generator")
     print("=" * 60)
@@ -58,31 +247,37 @@ def main():
     if not check_dependencies():
         sys.exit(1)
 
-    # Change to script directory
-    script_dir = os.path.dirname(os.path.abspath(__file__))
-    os.chdir(script_dir)
+    model = None
+    if args.state:
+        model = load_model(args.state)
+        print(f"📦 Loaded {model.resource_count} resources from {args.state}")
+        if not model.by_type:
+            print("⚠️  No diagrammed resources in the state; using the built-in layouts")
+
+    # Render into the published diagrams directory; workers inherit it
+    os.chdir(OUTPUT_DIR)
+    if SCRIPT_DIR not in sys.path:
+        sys.path.insert(0, SCRIPT_DIR)
 
     # Generate all diagrams
-    success_count = 0
-    for script in DIAGRAM_SCRIPTS:
-        if generate_diagram(script):
-            success_count += 1
+    print(f"\n🎨 Generating {len(module_names)} diagram(s)...")
+    started = time.perf_counter()
+    manifest = load_manifest(MANIFEST)
+    results = generate_all(module_names, manifest, force=args.force, model=model, outformat=args.format)
+    success_count = print_summary(results, time.perf_counter() - started)
 
-    # Summary
-    print("\n" + "=" * 60)
-    print(f"✅ Successfully generated {success_count}/{len(DIAGRAM_SCRIPTS)} diagrams")
-    print("=" * 60)
+    for result in results:
+        if result["error"] is None:
+            manifest[result["output"]] = {"module": result["module"], "key": result["key"]}
+    save_manifest(MANIFEST, manifest)
 
-    if success_count == len(DIAGRAM_SCRIPTS):
+    if success_count == len(results):
         print("\n📁 Generated files:")
-        print("  - architecture_overview.png")
-        print("  - network_architecture.png")
-        print("  - cicd_pipeline.png")
-        print("  - monitoring_stack.png")
-        print("  - data_flow.png")
+        for result in results:
+            print(f"  - {result['output']}")
         print("\n💡 View these diagrams in your image viewer or include them in documentation")
     else:
-        print(f"\n⚠️  {len(DIAGRAM_SCRIPTS) - success_count} diagram(s) failed to generate")
+        print(f"\n⚠️  {len(results) - success_count} diagram(s) failed to generate")
         sys.exit(1)
 
 if __name__ == "__main__":
@@ -2,10 +2,17 @@
 """
 Generate Skill Tracker Architecture Diagram
 Requires: pip install diagrams
+
+Usage:
+    python3 generate_architecture.py [--format png|svg|dot] [terraform.tfstate | terraform show -json output]
+
+With a state or plan file, the ECS services and their ports, the load
+balancers, the Lambda functions and the RDS Multi-AZ setup are taken from
+it (see terraform_model.py).
 """
 
 from diagrams import Diagram, Cluster, Edge
-from diagrams.aws.compute import ECS
+from diagrams.aws.compute import ECS, Lambda
 from diagrams.aws.database import RDS
 from diagrams.aws.network import ALB, CloudFront
 from diagrams.aws.storage import S3
@@ -17,9 +24,54 @@ from diagrams.onprem.inmemory import Redis
 from diagrams.onprem.monitoring import Grafana
 from diagrams.programming.framework import Spring
 
+from diagram_output import run
+from terraform_model import ecs_services
+
 # Note: Using S3 icon for Amplify as diagrams library doesn't have dedicated Amplify icon
 # Amplify uses S3 + CloudFront under the hood anyway
 
+FILENAME = "architecture_overview"
+
+# Container ports drawn without a Terraform model, by ECS service resource name
+DEFAULT_PORTS = {
+    "config_server": 8081,
+    "discovery_server": 8082,
+    "api_gateway": 8080,
+    "user_service": 8083,
+    "task_service": 8084,
+    "analytics_service": 8087,
+    "feedback_service": 8088,
+    "notification_service": 8089,
+    "mongodb": 27017,
+    "rabbitmq": 5672,
+    "redis": 6379,
+}
+
+# Services drawn in their own layer and icon; the rest are business services
+CORE_SERVICES = ("config_server", "discovery_server", "api_gateway")
+DATA_SERVICES = {"mongodb": MongoDB, "rabbitmq": RabbitMQ, "redis": Redis}
+
+# Connections of the known services to the data layer and storage, drawn
+# when both ends are on the diagram
+DEPENDENCIES = [
+    ("user_service", "rds"),
+    ("task_service", "rds"),
+    ("feedback_service", "rds"),
+    ("task_service", "mongodb"),
+    ("analytics_service", "mongodb"),
+    ("notification_service", "mongodb"),
+    ("notification_service", "rabbitmq"),
+    ("task_service", "rabbitmq"),
+    ("analytics_service", "rabbitmq"),
+    ("user_service", "redis"),
+    ("api_gateway", "redis"),
+    ("user_service", "s3_uploads"),
+    ("task_service", "s3_uploads"),
+    ("user_service", "s3_logs"),
+    ("task_service", "s3_logs"),
+    ("analytics_service", "s3_logs"),
+]
+
 # Configure diagram
 graph_attr = {
     "fontsize": "14",
@@ -27,110 +79,149 @@ graph_attr = {
     "pad": "0.5",
 }
 
-with Diagram(
-    "Skill Tracker - Complete Architecture",
-    filename="architecture_overview",
-    show=False,
-    direction="TB",
-    graph_attr=graph_attr,
-):
-    users = Users("Users")
-
-    with Cluster("AWS Cloud"):
-        # Frontend Layer
-        with Cluster("Frontend Layer"):
-            cdn = CloudFront("CloudFront CDN")
-            amplify = S3("AWS Amplify\n(Angular App)\n[S3 + CloudFront]")
-
-        # API Layer
-        with Cluster("API Layer"):
-            alb = ALB("Application\nLoad Balancer")
-
-        # ECS Cluster
-        with Cluster("ECS Fargate Cluster"):
-            with Cluster("Core Services"):
-                config_server = Spring("Config Server\n:8081")
-                discovery_server = Spring("Discovery Server\n:8082")
-                api_gateway = Spring("API Gateway\n:8080")
-
-            with Cluster("Business Services"):
-                user_service = ECS("User Service\n:8083")
-                task_service = ECS("Task Service\n:8084")
-                analytics_service = ECS("Analytics Service\n:8087")
-                feedback_service = ECS("Feedback Service\n:8088")
-                notification_service = ECS("Notification Service\n:8089")
-
-        # Data Services
-        with Cluster("Data Services (ECS)"):
-            mongodb = MongoDB("MongoDB\n:27017")
-            rabbitmq = RabbitMQ("RabbitMQ\n:5672")
-            redis = Redis("Redis\n:6379")
-
-        # Database Layer
-        with Cluster("Database Layer"):
-            rds = RDS("PostgreSQL\nRDS Multi-AZ")
-
-        # Storage
-        with Cluster("Storage"):
-            s3_uploads = S3("User Uploads")
-            s3_logs = S3("Application Logs")
-
-        # Monitoring
-        with Cluster("Monitoring & Observability"):
-            cloudwatch = Cloudwatch("CloudWatch")
-            grafana = Grafana("Grafana")
-
-    # User connections
-    users >> Edge(label="HTTPS") >> cdn
-    cdn >> Edge(label="Static Assets") >> amplify
-    cdn >> Edge(label="API Calls") >> alb
-
-    # ALB to API Gateway
-    alb >> api_gateway
-
-    # API Gateway to Core Services
-    api_gateway >> config_server
-    api_gateway >> discovery_server
-
-    # API Gateway to Business Services
-    api_gateway >> user_service
-    api_gateway >> task_service
-    api_gateway >> analytics_service
-    api_gateway >> feedback_service
-    api_gateway >> notification_service
-
-    # Database connections
-    user_service >> rds
-    task_service >> rds
-    feedback_service >> rds
-
-    # MongoDB connections
-    task_service >> mongodb
-    analytics_service >> mongodb
-    notification_service >> mongodb
-
-    # RabbitMQ connections
-    notification_service >> rabbitmq
-    task_service >> rabbitmq
-    analytics_service >> rabbitmq
-
-    # Redis connections
-    user_service >> redis
-    api_gateway >> redis
-
-    # S3 connections
-    user_service >> s3_uploads
-    task_service >> s3_uploads
-    [user_service, task_service, analytics_service] >> s3_logs
-
-    # Monitoring connections
-    [
-        user_service,
-        task_service,
-        analytics_service,
-        feedback_service,
-        notification_service,
-    ] >> cloudwatch
-    cloudwatch >> grafana
-
-print("✅ Architecture diagram generated: architecture_overview.png")
+
+def load_balancers(model=None):
+    """
+    Load balancers to draw, as dicts of label and internal
+
+    Args:
+        model: Optional TerraformModel
+
+    Returns:
+        One entry per load balancer in the model, or the single public ALB
+        drawn without one
+    """
+    balancers = model.load_balancers() if model else []
+    if not balancers:
+        return [{"label": "Application\nLoad Balancer", "internal": False}]
+    return [
+        {"label": f"{lb['name']}\n(internal)" if lb["internal"] else lb["name"], "internal": lb["internal"]}
+        for lb in balancers
+    ]
+
+
+def service_label(service):
+    if service["port"] is None:
+        return service["label"]
+    return f"{service['label']}\n:{service['port']}"
+
+
+def build(model=None, outformat="png"):
+    """
+    Render the architecture overview diagram
+
+    Args:
+        model: Optional TerraformModel to take the services, load
+            balancers, Lambda functions and RDS setup from
+        outformat: Output format, see diagram_output.FORMATS
+
+    Returns:
+        Name of the rendered file
+    """
+    services = ecs_services(model, DEFAULT_PORTS)
+    core = [service for service in services if service["key"] in CORE_SERVICES]
+    data = [service for service in services if service["key"] in DATA_SERVICES]
+    business = [service for service in services if service not in core and service not in data]
+    lambdas = model.lambdas() if model else []
+    databases = model.databases() if model else []
+    multi_az = any(db["multi_az"] for db in databases) if databases else True
+    with Diagram(
+        "Skill Tracker - Complete Architecture",
+        filename=FILENAME,
+        outformat=outformat,
+        show=False,
+        direction="TB",
+        graph_attr=graph_attr,
+    ):
+        users = Users("Users")
+        nodes = {}
+
+        with Cluster("AWS Cloud"):
+            # Frontend Layer
+            with Cluster("Frontend Layer"):
+                cdn = CloudFront("CloudFront CDN")
+                amplify = S3("AWS Amplify\n(Angular App)\n[S3 + CloudFront]")
+
+            # API Layer
+            with Cluster("API Layer"):
+                albs = [(ALB(lb["label"]), lb["internal"]) for lb in load_balancers(model)]
+
+            # ECS Cluster
+            with Cluster("ECS Fargate Cluster"):
+                if core:
+                    with Cluster("Core Services"):
+                        for service in core:
+                            nodes[service["key"]] = Spring(service_label(service))
+
+                if business:
+                    with Cluster("Business Services"):
+                        for service in business:
+                            nodes[service["key"]] = ECS(service_label(service))
+
+            # Data Services
+            if data:
+                with Cluster("Data Services (ECS)"):
+                    for service in data:
+                        nodes[service["key"]] = DATA_SERVICES[service["key"]](service_label(service))
+
+            # Database Layer
+            with Cluster("Database Layer"):
+                nodes["rds"] = RDS("PostgreSQL\nRDS Multi-AZ" if multi_az else "PostgreSQL\nRDS")
+
+            # Storage
+            with Cluster("Storage"):
+                nodes["s3_uploads"] = S3("User Uploads")
+                nodes["s3_logs"] = S3("Application Logs")
+
+            # Lambda functions
+            if lambdas:
+                with Cluster("Lambda Functions"):
+                    functions = [Lambda(function["name"]) for function in lambdas]
+
+            # Monitoring
+            with Cluster("Monitoring & Observability"):
+                cloudwatch = Cloudwatch("CloudWatch")
+                grafana = Grafana("Grafana")
+
+        # User connections
+        users >> Edge(label="HTTPS") >> cdn
+        cdn >> Edge(label="Static Assets") >> amplify
+        public = [alb for alb, internal in albs if not internal] or [alb for alb, _ in albs]
+        for alb in public:
+            cdn >> Edge(label="API Calls") >> alb
+
+        # ALB to API Gateway, or straight to the services without one
+        api_gateway = nodes.get("api_gateway")
+        for alb, _ in albs:
+            if api_gateway:
+                alb >> api_gateway
+            else:
+                alb >> [nodes[service["key"]] for service in business]
+
+        if api_gateway:
+            # API Gateway to Core Services
+            for service in core:
+                if service["key"] != "api_gateway":
+                    api_gateway >> nodes[service["key"]]
+
+            # API Gateway to Business Services
+            for service in business:
+                api_gateway >> nodes[service["key"]]
+
+        # Database, MongoDB, RabbitMQ, Redis and S3 connections
+        for source, target in DEPENDENCIES:
+            if source in nodes and target in nodes:
+                nodes[source] >> nodes[target]
+
+        # Monitoring connections
+        [nodes[service["key"]] for service in business] >> cloudwatch
+        if lambdas:
+            functions >> Edge(style="dashed") >> cloudwatch
+        cloudwatch >> grafana
+
+    return f"{FILENAME}.{outformat}"
+
+
+if __name__ == "__main__":
+    output = run(build, "Generate the architecture overview diagram")
+    print(f"✅ Architecture diagram generated: {output}")
@@ -2,6 +2,12 @@
 """
 Generate Data Flow Diagram
 Requires: pip install diagrams
+
+Usage:
+    python3 generate_data_flow.py [--format png|svg|dot] [terraform.tfstate | terraform show -json output]
+
+With a state or plan file, the ECS services, their ports and the event
+consumers among them are taken from it (see terraform_model.py).
 """
 
 from diagrams import Diagram, Cluster, Edge
@@ -11,61 +17,104 @@ from diagrams.onprem.database import MongoDB
 from diagrams.onprem.queue import RabbitMQ
 from diagrams.onprem.client import User
 
+from diagram_output import run
+from terraform_model import ecs_services
+
+FILENAME = "data_flow"
+
+# Services and container ports drawn without a Terraform model, by ECS
+# service resource name; the event consumers are drawn without a port
+DEFAULT_PORTS = {
+    "api_gateway": 8080,
+    "task_service": 8084,
+    "analytics_service": None,
+    "notification_service": None,
+    "recommendation_service": None,
+}
+
+# Services subscribed to TaskSubmitted, and the ones writing back to MongoDB
+EVENT_CONSUMERS = ("analytics_service", "notification_service", "recommendation_service")
+WRITES_BACK = ("analytics_service", "notification_service")
+CONSUMER_COLORS = ("orange", "purple", "red")
+
 graph_attr = {
     "fontsize": "14",
     "bgcolor": "white",
     "pad": "0.5",
 }
 
-with Diagram(
-    "Skill Tracker - Data Flow (Task Submission)",
-    filename="data_flow",
-    show=False,
-    direction="LR",
-    graph_attr=graph_attr,
-):
-    user = User("User")
 
-    with Cluster("API Layer"):
-        api_gateway = ECS("API Gateway\n:8080")
+def build(model=None, outformat="png"):
+    """
+    Render the task submission data flow diagram
+
+    Args:
+        model: Optional TerraformModel to take the services and ports from
+        outformat: Output format, see diagram_output.FORMATS
+
+    Returns:
+        Name of the rendered file
+    """
+    services = {service["key"]: service for service in ecs_services(model, DEFAULT_PORTS)}
+    # The request path is always drawn, with its default port when the model lacks it
+    ports = {key: services[key]["port"] if key in services else DEFAULT_PORTS[key] for key in ("api_gateway", "task_service")}
+    consumers = [services[key] for key in services if key in EVENT_CONSUMERS]
+    with Diagram(
+        "Skill Tracker - Data Flow (Task Submission)",
+        filename=FILENAME,
+        outformat=outformat,
+        show=False,
+        direction="LR",
+        graph_attr=graph_attr,
+    ):
+        user = User("User")
+
+        with Cluster("API Layer"):
+            api_gateway = ECS(f"API Gateway\n:{ports['api_gateway']}")
+
+        with Cluster("Business Logic"):
+            task_service = ECS(f"Task Service\n:{ports['task_service']}")
+
+        with Cluster("Data Persistence"):
+            postgres = RDS("PostgreSQL\n(Task Metadata)")
+            mongo = MongoDB("MongoDB\n(Submissions)")
 
-    with Cluster("Business Logic"):
-        task_service = ECS("Task Service\n:8084")
+        with Cluster("Event Processing"):
+            rabbitmq = RabbitMQ("RabbitMQ\nMessage Queue")
 
-    with Cluster("Data Persistence"):
-        postgres = RDS("PostgreSQL\n(Task Metadata)")
-        mongo = MongoDB("MongoDB\n(Submissions)")
+            consumer_nodes = []
+            if consumers:
+                with Cluster("Event Consumers"):
+                    consumer_nodes = [ECS(consumer["label"].replace(" ", "\n")) for consumer in consumers]
 
-    with Cluster("Event Processing"):
-        rabbitmq = RabbitMQ("RabbitMQ\nMessage Queue")
+        # Request flow
+        user >> Edge(label="1. Submit Task") >> api_gateway
+        api_gateway >> Edge(label="2. Route") >> task_service
 
-        with Cluster("Event Consumers"):
-            analytics = ECS("Analytics\nService")
-            notification = ECS("Notification\nService")
-            recommendation = ECS("Recommendation\nService")
+        # Data persistence (parallel)
+        task_service >> Edge(label="3a. Save Metadata", color="blue") >> postgres
+        task_service >> Edge(label="3b. Save Submission", color="green") >> mongo
 
-    # Request flow
-    user >> Edge(label="1. Submit Task") >> api_gateway
-    api_gateway >> Edge(label="2. Route") >> task_service
+        # Event publishing
+        task_service >> Edge(label="4. Publish Event") >> rabbitmq
 
-    # Data persistence (parallel)
-    task_service >> Edge(label="3a. Save Metadata", color="blue") >> postgres
-    task_service >> Edge(label="3b. Save Submission", color="green") >> mongo
+        # Event consumption (parallel)
+        for index, node in enumerate(consumer_nodes):
+            step = f"5{chr(ord('a') + index)}. TaskSubmitted"
+            rabbitmq >> Edge(label=step, color=CONSUMER_COLORS[index % len(CONSUMER_COLORS)]) >> node
 
-    # Event publishing
-    task_service >> Edge(label="4. Publish Event") >> rabbitmq
+        # Consumers write back
+        for consumer, node in zip(consumers, consumer_nodes):
+            if consumer["key"] in WRITES_BACK:
+                node >> Edge(style="dashed") >> mongo
 
-    # Event consumption (parallel)
-    rabbitmq >> Edge(label="5a. TaskSubmitted", color="orange") >> analytics
-    rabbitmq >> Edge(label="5b. TaskSubmitted", color="purple") >> notification
-    rabbitmq >> Edge(label="5c. TaskSubmitted", color="red") >> recommendation
+        # Response
+        task_service >> Edge(label="6. Response", style="dotted") >> api_gateway
+        api_gateway >> Edge(label="7. Success", style="dotted") >> user
 
-    # Consumers write back
-    analytics >> Edge(style="dashed") >> mongo
-    notification >> Edge(style="dashed") >> mongo
+    return f"{FILENAME}.{outformat}"
 
-    # Response
-    task_service >> Edge(label="6. Response", style="dotted") >> api_gateway
-    api_gateway >> Edge(label="7. Success", style="dotted") >> user
 
-print("✅ Data flow diagram generated: data_flow.png")
+if __name__ == "__main__":
+    output = run(build, "Generate the data flow diagram")
+    print(f"✅ Data flow diagram generated: {output}")
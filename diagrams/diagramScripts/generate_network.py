@@ -2,6 +2,12 @@
 """
 Generate Network Architecture Diagram
 Requires: pip install diagrams
+
+Usage:
+    python3 generate_network.py [--format png|svg|dot] [terraform.tfstate | terraform show -json output]
+
+With a state or plan file, the VPC, subnets, NAT gateways and RDS Multi-AZ
+setup are taken from it (see terraform_model.py).
 """
 
 from diagrams import Diagram, Cluster, Edge
@@ -10,65 +16,134 @@ from diagrams.aws.compute import ECS
 from diagrams.aws.database import RDS
 from diagrams.onprem.client import Users
 
+from diagram_output import run
+
+FILENAME = "network_architecture"
+
+# Layout drawn without a Terraform model
+DEFAULT_NETWORK = {
+    "vpc_cidr": "10.x.0.0/16",
+    "zones": [
+        {"name": "1a", "public": ["10.x.1.0/24"], "private": ["10.x.10.0/24"]},
+        {"name": "1b", "public": ["10.x.2.0/24"], "private": ["10.x.11.0/24"]},
+    ],
+    "nat_gateways": 2,
+    "multi_az_db": True,
+}
+
 graph_attr = {
     "fontsize": "14",
     "bgcolor": "white",
     "pad": "0.5",
 }
 
-with Diagram(
-    "Skill Tracker - Network Architecture",
-    filename="network_architecture",
-    show=False,
-    direction="TB",
-    graph_attr=graph_attr,
-):
-    users = Users("Internet Users")
-    igw = InternetGateway("Internet Gateway")
-
-    with Cluster("VPC 10.x.0.0/16"):
-        with Cluster("Availability Zone 1a"):
-            with Cluster("Public Subnet 1\n10.x.1.0/24"):
-                alb1 = ALB("ALB")
-                nat1 = NATGateway("NAT Gateway 1")
-
-            with Cluster("Private Subnet 1\n10.x.10.0/24"):
-                ecs1 = ECS("ECS Tasks\n(Services)")
-                rds1 = RDS("RDS Primary")
-
-        with Cluster("Availability Zone 1b"):
-            with Cluster("Public Subnet 2\n10.x.2.0/24"):
-                alb2 = ALB("ALB")
-                nat2 = NATGateway("NAT Gateway 2")
-
-            with Cluster("Private Subnet 2\n10.x.11.0/24"):
-                ecs2 = ECS("ECS Tasks\n(Services)")
-                rds2 = RDS("RDS Standby")
-
-    # Internet to IGW
-    users >> Edge(label="HTTPS") >> igw
-
-    # IGW to ALBs
-    igw >> Edge(label="Public") >> alb1
-    igw >> Edge(label="Public") >> alb2
-
-    # ALBs to ECS
-    alb1 >> Edge(label="Private") >> ecs1
-    alb2 >> Edge(label="Private") >> ecs2
-
-    # ECS to NAT (for outbound)
-    ecs1 >> Edge(label="Outbound", style="dashed") >> nat1
-    ecs2 >> Edge(label="Outbound", style="dashed") >> nat2
-
-    # NAT to IGW
-    nat1 >> Edge(style="dashed") >> igw
-    nat2 >> Edge(style="dashed") >> igw
-
-    # ECS to RDS
-    ecs1 >> Edge(label="5432") >> rds1
-    ecs2 >> Edge(label="5432") >> rds1
-
-    # RDS replication
-    rds1 >> Edge(label="Replication", style="dotted") >> rds2
-
-print("✅ Network diagram generated: network_architecture.png")
+
+def network_layout(model=None):
+    """
+    Network layout to draw
+
+    Args:
+        model: Optional TerraformModel
+
+    Returns:
+        Dict shaped like DEFAULT_NETWORK; DEFAULT_NETWORK when the model has
+        no subnets
+    """
+    subnets = model.subnets() if model else []
+    if not subnets:
+        return DEFAULT_NETWORK
+    zones = {}
+    for subnet in subnets:
+        zone = zones.setdefault(subnet["az"], {"name": subnet["az"], "public": [], "private": []})
+        zone["public" if subnet["public"] else "private"].append(subnet["cidr"])
+    return {
+        "vpc_cidr": model.vpc_cidr() or DEFAULT_NETWORK["vpc_cidr"],
+        "zones": list(zones.values()),
+        "nat_gateways": model.nat_gateway_count(),
+        "multi_az_db": any(db["multi_az"] for db in model.databases()),
+    }
+
+
+def build(model=None, outformat="png"):
+    """
+    Render the network architecture diagram
+
+    Args:
+        model: Optional TerraformModel to take the network layout from
+        outformat: Output format, see diagram_output.FORMATS
+
+    Returns:
+        Name of the rendered file
+    """
+    network = network_layout(model)
+    with Diagram(
+        "Skill Tracker - Network Architecture",
+        filename=FILENAME,
+        outformat=outformat,
+        show=False,
+        direction="TB",
+        graph_attr=graph_attr,
+    ):
+        users = Users("Internet Users")
+        igw = InternetGateway("Internet Gateway")
+
+        albs, nats, ecs_tasks = [], [], []
+        public_count = private_count = 0
+        with Cluster(f"VPC {network['vpc_cidr']}"):
+            for zone in network["zones"]:
+                with Cluster(f"Availability Zone {zone['name']}"):
+                    zone_albs, zone_ecs = [], []
+                    for cidr in zone["public"]:
+                        public_count += 1
+                        with Cluster(f"Public Subnet {public_count}\n{cidr}"):
+                            zone_albs.append(ALB("ALB"))
+                            if len(nats) < network["nat_gateways"]:
+                                nats.append(NATGateway(f"NAT Gateway {len(nats) + 1}"))
+
+                    for cidr in zone["private"]:
+                        private_count += 1
+                        with Cluster(f"Private Subnet {private_count}\n{cidr}"):
+                            zone_ecs.append(ECS("ECS Tasks\n(Services)"))
+                            if private_count == 1:
+                                rds_primary = RDS("RDS Primary")
+                            elif private_count == 2 and network["multi_az_db"]:
+                                rds_standby = RDS("RDS Standby")
+
+                    albs.append(zone_albs)
+                    ecs_tasks.append(zone_ecs)
+
+        # Internet to IGW
+        users >> Edge(label="HTTPS") >> igw
+
+        for zone_index, (zone_albs, zone_ecs) in enumerate(zip(albs, ecs_tasks)):
+            # IGW to ALBs
+            for alb in zone_albs:
+                igw >> Edge(label="Public") >> alb
+
+            for ecs_index, ecs in enumerate(zone_ecs):
+                # ALBs to ECS
+                if zone_albs:
+                    zone_albs[min(ecs_index, len(zone_albs) - 1)] >> Edge(label="Private") >> ecs
+
+                # ECS to NAT (for outbound), the zone's own NAT when it has one
+                if nats:
+                    ecs >> Edge(label="Outbound", style="dashed") >> nats[min(zone_index, len(nats) - 1)]
+
+                # ECS to RDS
+                if private_count:
+                    ecs >> Edge(label="5432") >> rds_primary
+
+        # NAT to IGW
+        for nat in nats:
+            nat >> Edge(style="dashed") >> igw
+
+        # RDS replication
+        if private_count >= 2 and network["multi_az_db"]:
+            rds_primary >> Edge(label="Replication", style="dotted") >> rds_standby
+
+    return f"{FILENAME}.{outformat}"
+
+
+if __name__ == "__main__":
+    output = run(build, "Generate the network architecture diagram")
+    print(f"✅ Network diagram generated: {output}")
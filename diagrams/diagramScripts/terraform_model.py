@@ -0,0 +1,421 @@
+#!/usr/bin/env python3
+"""
+Build a diagram model from Terraform state or plan output
+
+Reads either a terraform.tfstate file or the output of `terraform show -json`
+(of a state or a plan) and indexes the resources the diagrams draw: the VPC,
+subnets, NAT gateways, load balancers, ECS services and their container
+ports, RDS instances and Lambda functions.
+
+The file is streamed: resources are decoded one at a time and only the
+attributes the diagrams use are kept, so memory stays bounded by the largest
+single resource instead of growing with the size of the state.
+
+Usage:
+    terraform show -json > state.json
+    python3 terraform_model.py state.json
+"""
+
+import json
+import re
+import sys
+from collections import namedtuple
+
+CHUNK_SIZE = 64 * 1024
+
+# Attributes kept per resource type; everything else is dropped while streaming
+MODEL_ATTRIBUTES = {
+    "aws_vpc": ["cidr_block", "tags"],
+    "aws_subnet": ["cidr_block", "availability_zone", "map_public_ip_on_launch", "tags"],
+    "aws_nat_gateway": ["tags"],
+    "aws_lb": ["name", "internal", "load_balancer_type"],
+    "aws_ecs_service": ["name", "desired_count"],
+    "aws_ecs_task_definition": ["family", "container_definitions"],
+    "aws_db_instance": ["identifier", "engine", "multi_az", "replicate_source_db"],
+    "aws_lambda_function": ["function_name", "runtime"],
+}
+
+Resource = namedtuple("Resource", ["address", "module", "type", "name", "index", "attributes"])
+
+STRUCTURAL = re.compile(r'["\[\]{}]')
+STRING_TAIL = re.compile(r'(?:[^"\\]|\\.)*"', re.S)
+SCALAR = re.compile(r'[^\s,\]}]+')
+WHITESPACE = re.compile(r"\s*")
+
+
+class JsonStream:
+    """
+    Incremental reader over a JSON document
+
+    Objects and arrays are walked with items() and elements(); each value
+    reached that way must be consumed with read_value() (decodes it) or
+    skip_value() (scans past it without keeping it). Only the text of the
+    value being read is held in memory.
+
+    Args:
+        stream: Text file object
+        chunk_size: Characters read at a time
+    """
+
+    def __init__(self, stream, chunk_size=CHUNK_SIZE):
+        self.stream = stream
+        self.chunk_size = chunk_size
+        self.buffer = ""
+        self.pos = 0
+        self.mark = None
+
+    def _more(self):
+        """Read another chunk, dropping text already consumed; False at EOF"""
+        chunk = self.stream.read(self.chunk_size)
+        if not chunk:
+            return False
+        keep = self.pos if self.mark is None else self.mark
+        self.buffer = self.buffer[keep:] + chunk
+        self.pos -= keep
+        if self.mark is not None:
+            self.mark = 0
+        return True
+
+    def _error(self, message):
+        return ValueError(f"{message} near {self.buffer[self.pos:self.pos + 40]!r}")
+
+    def peek(self):
+        """Next non-whitespace character, without consuming it ('' at EOF)"""
+        while True:
+            self.pos = WHITESPACE.match(self.buffer, self.pos).end()
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+            if not self._more():
+                return ""
+
+    def _expect(self, chars):
+        char = self.peek()
+        if not char or char not in chars:
+            raise self._error(f"Expected one of {chars!r}")
+        self.pos += 1
+        return char
+
+    def _end_of_string(self):
+        """Move past the string whose opening quote is at pos"""
+        while True:
+            match = STRING_TAIL.match(self.buffer, self.pos + 1)
+            if match:
+                self.pos = match.end()
+                return
+            if not self._more():
+                raise self._error("Unterminated string")
+
+    def _end_of_value(self):
+        """Move past the value starting at pos"""
+        char = self.peek()
+        if char == '"':
+            self._end_of_string()
+            return
+        if char and char in "[{":
+            depth = 0
+            while True:
+                match = STRUCTURAL.search(self.buffer, self.pos)
+                if match is None:
+                    self.pos = len(self.buffer)
+                    if not self._more():
+                        raise self._error("Unexpected end of JSON")
+                    continue
+                self.pos = match.start()
+                if match.group() == '"':
+                    self._end_of_string()
+                    continue
+                self.pos += 1
+                depth += 1 if match.group() in "[{" else -1
+                if depth == 0:
+                    return
+        while True:
+            match = SCALAR.match(self.buffer, self.pos)
+            if match is None:
+                raise self._error("Expected a JSON value")
+            if match.end() < len(self.buffer) or not self._more():
+                self.pos = match.end()
+                return
+
+    def read_value(self):
+        """Decode the next value"""
+        self.peek()
+        self.mark = self.pos
+        try:
+            self._end_of_value()
+            return json.loads(self.buffer[self.mark:self.pos])
+        finally:
+            self.mark = None
+
+    def skip_value(self):
+        """Scan past the next value without decoding it"""
+        self.peek()
+        self._end_of_value()
+
+    def items(self):
+        """Iterate the keys of the next object; consume each value before continuing"""
+        self._expect("{")
+        if self.peek() == "}":
+            self.pos += 1
+            return
+        while True:
+            key = self.read_value()
+            self._expect(":")
+            yield key
+            if self._expect(",}") == "}":
+                return
+
+    def elements(self):
+        """Iterate the next array; consume each element before continuing"""
+        self._expect("[")
+        if self.peek() == "]":
+            self.pos += 1
+            return
+        while True:
+            yield
+            if self._expect(",]") == "]":
+                return
+
+
+def instance_address(module, resource_type, name, index):
+    address = f"{resource_type}.{name}"
+    if index is not None:
+        address += f"[{json.dumps(index)}]"
+    return f"{module}.{address}" if module else address
+
+
+def state_resources(resource):
+    """Resources of one terraform.tfstate (v4) resource entry"""
+    if resource.get("mode") != "managed":
+        return
+    module = resource.get("module", "")
+    for instance in resource.get("instances", []):
+        index = instance.get("index_key")
+        yield Resource(
+            instance_address(module, resource["type"], resource["name"], index),
+            module, resource["type"], resource["name"], index, instance.get("attributes") or {}
+        )
+
+
+def module_resources(stream):
+    """Resources of a `terraform show -json` module object and its child modules"""
+    for key in stream.items():
+        if key == "resources":
+            for _ in stream.elements():
+                resource = stream.read_value()
+                if resource.get("mode") != "managed":
+                    continue
+                suffix = f"{resource['type']}.{resource['name']}"
+                module = resource["address"].rpartition(suffix)[0].rstrip(".")
+                yield Resource(
+                    resource["address"], module, resource["type"], resource["name"],
+                    resource.get("index"), resource.get("values") or {}
+                )
+        elif key == "child_modules":
+            for _ in stream.elements():
+                yield from module_resources(stream)
+        else:
+            stream.skip_value()
+
+
+def iter_resources(path):
+    """
+    Stream the managed resources of a state or plan file
+
+    Args:
+        path: terraform.tfstate, or `terraform show -json` output of a state
+            (values) or plan (planned_values)
+
+    Yields:
+        Resource tuples, one per resource instance
+    """
+    with open(path, encoding="utf-8") as source:
+        stream = JsonStream(source)
+        for key in stream.items():
+            if key == "resources":
+                for _ in stream.elements():
+                    yield from state_resources(stream.read_value())
+            elif key in ("values", "planned_values"):
+                for values_key in stream.items():
+                    if values_key == "root_module":
+                        yield from module_resources(stream)
+                    else:
+                        stream.skip_value()
+            else:
+                stream.skip_value()
+
+
+# Display labels title-casing gets wrong, by resource name
+LABELS = {
+    "api_gateway": "API Gateway",
+    "mongodb": "MongoDB",
+    "rabbitmq": "RabbitMQ",
+}
+
+
+def label(name):
+    """Display label of a Terraform resource name, e.g. user_service -> User Service"""
+    return LABELS.get(name) or name.replace("_", " ").replace("-", " ").title()
+
+
+def container_port(task_definition):
+    """First container port of an ECS task definition, if any"""
+    definitions = task_definition.attributes.get("container_definitions")
+    if isinstance(definitions, str):
+        definitions = json.loads(definitions)
+    for container in definitions or []:
+        for mapping in container.get("portMappings") or []:
+            if mapping.get("containerPort"):
+                return mapping["containerPort"]
+    return None
+
+
+class TerraformModel:
+    """
+    Resources of a state or plan, indexed by type and module
+
+    Args:
+        resources: Iterable of Resource; types outside MODEL_ATTRIBUTES are
+            only counted
+    """
+
+    def __init__(self, resources=()):
+        self.by_type = {}
+        self.by_module = {}
+        self.resource_count = 0
+        for resource in resources:
+            self.add(resource)
+
+    def add(self, resource):
+        self.resource_count += 1
+        counts = self.by_module.setdefault(resource.module or "root", {})
+        counts[resource.type] = counts.get(resource.type, 0) + 1
+        keys = MODEL_ATTRIBUTES.get(resource.type)
+        if keys is None:
+            return
+        attributes = {key: resource.attributes[key] for key in keys if key in resource.attributes}
+        self.by_type.setdefault(resource.type, []).append(resource._replace(attributes=attributes))
+
+    def resources(self, resource_type):
+        return sorted(self.by_type.get(resource_type, []), key=lambda resource: resource.address)
+
+    def vpc_cidr(self):
+        for vpc in self.resources("aws_vpc"):
+            return vpc.attributes.get("cidr_block")
+        return None
+
+    def subnets(self):
+        """
+        Subnets as dicts of name, cidr, az and public, ordered by AZ and
+        CIDR
+        """
+        subnets = []
+        for subnet in self.resources("aws_subnet"):
+            tags = subnet.attributes.get("tags") or {}
+            subnets.append({
+                "name": tags.get("Name", subnet.address),
+                "cidr": subnet.attributes.get("cidr_block"),
+                "az": subnet.attributes.get("availability_zone", ""),
+                "public": bool(subnet.attributes.get("map_public_ip_on_launch")) or tags.get("Type") == "Public",
+            })
+        return sorted(subnets, key=lambda subnet: (subnet["az"], not subnet["public"], subnet["cidr"] or ""))
+
+    def nat_gateway_count(self):
+        return len(self.by_type.get("aws_nat_gateway", []))
+
+    def load_balancers(self):
+        return [
+            {"name": lb.attributes.get("name", lb.name), "internal": bool(lb.attributes.get("internal"))}
+            for lb in self.resources("aws_lb")
+        ]
+
+    def ecs_services(self):
+        """
+        ECS services as dicts of key (resource name), label, module, port
+        (from the task definition of the same name) and desired count
+        """
+        task_definitions = {
+            (resource.module, resource.name): resource
+            for resource in self.by_type.get("aws_ecs_task_definition", [])
+        }
+        services = []
+        for service in self.resources("aws_ecs_service"):
+            task_definition = task_definitions.get((service.module, service.name))
+            services.append({
+                "key": service.name,
+                "label": label(service.name),
+                "module": service.module,
+                "port": container_port(task_definition) if task_definition else None,
+                "desired_count": service.attributes.get("desired_count"),
+            })
+        return services
+
+    def databases(self):
+        return [
+            {
+                "name": db.attributes.get("identifier", db.name),
+                "engine": db.attributes.get("engine"),
+                "multi_az": bool(db.attributes.get("multi_az")),
+                "replica": bool(db.attributes.get("replicate_source_db")),
+            }
+            for db in self.resources("aws_db_instance")
+        ]
+
+    def lambdas(self):
+        return [
+            {"name": function.attributes.get("function_name", function.name), "module": function.module}
+            for function in self.resources("aws_lambda_function")
+        ]
+
+
+def ecs_services(model, defaults):
+    """
+    ECS services to draw
+
+    Args:
+        model: Optional TerraformModel
+        defaults: Dict of ECS service resource name to container port (or
+            None), drawn without a model or when it has no ECS services
+
+    Returns:
+        List of dicts of key, label and port, in the order of the model or
+        of defaults; a service the model has no port for keeps its default
+    """
+    services = model.ecs_services() if model else []
+    if not services:
+        return [{"key": key, "label": label(key), "port": port} for key, port in defaults.items()]
+    return [
+        {"key": service["key"], "label": service["label"], "port": service["port"] or defaults.get(service["key"])}
+        for service in services
+    ]
+
+
+def load_model(path):
+    """Stream a state or plan file into a TerraformModel"""
+    return TerraformModel(iter_resources(path))
+
+
+def main():
+    if len(sys.argv) != 2:
+        print(f"Usage: {sys.argv[0]} <terraform.tfstate | terraform show -json output>")
+        sys.exit(2)
+    model = load_model(sys.argv[1])
+    print(f"📦 {model.resource_count} resources in {len(model.by_module)} module(s)")
+    for module, counts in sorted(model.by_module.items()):
+        print(f"  {module}: {sum(counts.values())}")
+    print(f"\n🌐 VPC {model.vpc_cidr() or '-'}, {model.nat_gateway_count()} NAT gateway(s)")
+    for subnet in model.subnets():
+        kind = "public" if subnet["public"] else "private"
+        print(f"  {subnet['az']:<12} {kind:<8} {subnet['cidr']}")
+    print("\n🐳 ECS services")
+    for service in model.ecs_services():
+        print(f"  {service['label']:<24} :{service['port'] or '-'}")
+    print("\n🗄️  Databases")
+    for db in model.databases():
+        print(f"  {db['name']} ({db['engine']}, multi-AZ: {db['multi_az']}, replica: {db['replica']})")
+    print("\nλ Lambda functions")
+    for function in model.lambdas():
+        print(f"  {function['name']}")
+
+
+if __name__ == "__main__":
+    main()
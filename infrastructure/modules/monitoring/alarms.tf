@@ -162,3 +162,138 @@ resource "aws_cloudwatch_metric_alarm" "alb_response_time" {
 
   tags = var.tags
 }
+
+# Log Export Failures Alarm (metrics emitted by log_exporter in EMF)
+resource "aws_cloudwatch_metric_alarm" "log_export_failures" {
+  count               = local.batch_log_export ? 1 : 0
+  alarm_name          = "${var.project_name}-${var.environment}-log-export-failures"
+  comparison_operator = "GreaterThanThreshold"
+  evaluation_periods  = "1"
+  metric_name         = "ExportsFailed"
+  namespace           = "${upper(var.project_name)}/LogExport"
+  period              = "3600"
+  statistic           = "Sum"
+  threshold           = "0"
+  alarm_description   = "This metric monitors failed CloudWatch Logs export tasks"
+  alarm_actions       = [aws_sns_topic.alarms.arn]
+  treat_missing_data  = "notBreaching"
+
+  dimensions = {
+    Environment = var.environment
+  }
+
+  tags = var.tags
+}
+
+# Log Export Backlog Alarm
+resource "aws_cloudwatch_metric_alarm" "log_export_backlog" {
+  count               = local.batch_log_export ? 1 : 0
+  alarm_name          = "${var.project_name}-${var.environment}-log-export-backlog"
+  comparison_operator = "GreaterThanThreshold"
+  evaluation_periods  = "3"
+  metric_name         = "ExportsPending"
+  namespace           = "${upper(var.project_name)}/LogExport"
+  period              = "3600"
+  statistic           = "Minimum"
+  threshold           = "0"
+  alarm_description   = "This metric monitors log export windows left over after each run"
+  alarm_actions       = [aws_sns_topic.alarms.arn]
+  treat_missing_data  = "notBreaching"
+
+  dimensions = {
+    Environment = var.environment
+  }
+
+  tags = var.tags
+}
+
+# Log Export Run Time Alarm (runs approaching the 900s Lambda timeout)
+resource "aws_cloudwatch_metric_alarm" "log_export_run_time" {
+  count               = local.batch_log_export ? 1 : 0
+  alarm_name          = "${var.project_name}-${var.environment}-log-export-run-time-high"
+  comparison_operator = "GreaterThanThreshold"
+  evaluation_periods  = "2"
+  metric_name         = "WallTime"
+  namespace           = "${upper(var.project_name)}/LogExport"
+  period              = "3600"
+  statistic           = "Maximum"
+  threshold           = "720000" # 12 minutes in milliseconds
+  alarm_description   = "This metric monitors log export run time against the Lambda timeout"
+  alarm_actions       = [aws_sns_topic.alarms.arn]
+  treat_missing_data  = "notBreaching"
+
+  dimensions = {
+    Environment = var.environment
+  }
+
+  tags = var.tags
+}
+
+# Cost Anomaly Alarm (daily total far above its baseline, from cost_exporter)
+resource "aws_cloudwatch_metric_alarm" "cost_anomaly" {
+  alarm_name          = "${var.project_name}-${var.environment}-cost-anomaly"
+  comparison_operator = "GreaterThanThreshold"
+  evaluation_periods  = "1"
+  metric_name         = "CostAnomalyScore"
+  namespace           = "${upper(var.project_name)}/Costs"
+  period              = "86400"
+  statistic           = "Maximum"
+  threshold           = var.cost_anomaly_threshold
+  alarm_description   = "This metric monitors daily cost against its rolling baseline"
+  alarm_actions       = [aws_sns_topic.alarms.arn]
+  treat_missing_data  = "notBreaching"
+
+  dimensions = {
+    Project     = var.project_name
+    Environment = var.environment
+  }
+
+  tags = var.tags
+}
+
+# Per-service Cost Anomaly Alarms (e.g. runaway NAT or RDS spend)
+resource "aws_cloudwatch_metric_alarm" "service_cost_anomaly" {
+  for_each            = toset(var.cost_anomaly_services)
+  alarm_name          = "${var.project_name}-${var.environment}-${lower(each.key)}-cost-anomaly"
+  comparison_operator = "GreaterThanThreshold"
+  evaluation_periods  = "1"
+  metric_name         = "CostAnomalyScore"
+  namespace           = "${upper(var.project_name)}/Costs"
+  period              = "86400"
+  statistic           = "Maximum"
+  threshold           = var.cost_anomaly_threshold
+  alarm_description   = "This metric monitors daily ${each.key} cost against its rolling baseline"
+  alarm_actions       = [aws_sns_topic.alarms.arn]
+  treat_missing_data  = "notBreaching"
+
+  dimensions = {
+    Project     = var.project_name
+    Environment = var.environment
+    ServiceName = each.key
+  }
+
+  tags = var.tags
+}
+
+# Projected Month-End Cost Alarm
+resource "aws_cloudwatch_metric_alarm" "projected_month_end_cost" {
+  count               = var.monthly_cost_budget > 0 ? 1 : 0
+  alarm_name          = "${var.project_name}-${var.environment}-projected-cost-over-budget"
+  comparison_operator = "GreaterThanThreshold"
+  evaluation_periods  = "1"
+  metric_name         = "ProjectedMonthEndCost"
+  namespace           = "${upper(var.project_name)}/Costs"
+  period              = "86400"
+  statistic           = "Maximum"
+  threshold           = var.monthly_cost_budget
+  alarm_description   = "This metric monitors the projected month-end cost against the monthly budget"
+  alarm_actions       = [aws_sns_topic.alarms.arn]
+  treat_missing_data  = "notBreaching"
+
+  dimensions = {
+    Project     = var.project_name
+    Environment = var.environment
+  }
+
+  tags = var.tags
+}
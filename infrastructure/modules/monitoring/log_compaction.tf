@@ -0,0 +1,158 @@
+# Parquet compaction of exported CloudWatch logs
+# Rewrites each service's exported hour as one Parquet file under
+# cloudwatch-logs-parquet/service=<name>/date=<Y-M-D>/<H>.parquet
+
+locals {
+  log_compaction = var.enable_log_export_to_s3 && var.enable_log_compaction
+}
+
+resource "aws_lambda_function" "log_compactor" {
+  count = local.log_compaction ? 1 : 0
+
+  filename         = data.archive_file.log_compactor_zip[0].output_path
+  function_name    = "${var.project_name}-${var.environment}-log-compactor"
+  role             = aws_iam_role.lambda_log_compactor[0].arn
+  handler          = "index.handler"
+  runtime          = "python3.11"
+  timeout          = 300
+  memory_size      = 1024
+
+  # Provides pyarrow, e.g. the AWS SDK for pandas layer
+  layers = var.log_compaction_layer_arns
+
+  source_code_hash = data.archive_file.log_compactor_zip[0].output_base64sha256
+
+  environment {
+    variables = {
+      S3_BUCKET  = var.app_logs_bucket_id
+      LOG_GROUPS = jsonencode(local.exported_log_groups)
+    }
+  }
+
+  tags = var.tags
+}
+
+data "archive_file" "log_compactor_zip" {
+  count = local.log_compaction ? 1 : 0
+
+  type        = "zip"
+  output_path = "/tmp/log_compactor.zip"
+
+  source {
+    content  = file("${path.module}/templates/log_compactor.py")
+    filename = "index.py"
+  }
+}
+
+resource "aws_iam_role" "lambda_log_compactor" {
+  count = local.log_compaction ? 1 : 0
+
+  name = "${var.project_name}-${var.environment}-lambda-log-compactor"
+
+  assume_role_policy = jsonencode({
+    Version = "2012-10-17"
+    Statement = [
+      {
+        Action = "sts:AssumeRole"
+        Effect = "Allow"
+        Principal = {
+          Service = "lambda.amazonaws.com"
+        }
+      }
+    ]
+  })
+
+  tags = var.tags
+}
+
+resource "aws_iam_role_policy" "lambda_log_compactor" {
+  count = local.log_compaction ? 1 : 0
+
+  name = "${var.project_name}-${var.environment}-lambda-log-compactor-policy"
+  role = aws_iam_role.lambda_log_compactor[0].id
+
+  policy = jsonencode({
+    Version = "2012-10-17"
+    Statement = [
+      {
+        Effect = "Allow"
+        Action = [
+          "logs:CreateLogGroup",
+          "logs:CreateLogStream",
+          "logs:PutLogEvents"
+        ]
+        Resource = "arn:aws:logs:${var.aws_region}:*:*"
+      },
+      {
+        Effect = "Allow"
+        Action = [
+          "s3:ListBucket"
+        ]
+        Resource = var.app_logs_bucket_arn
+      },
+      {
+        Effect = "Allow"
+        Action = [
+          "s3:GetObject"
+        ]
+        Resource = "${var.app_logs_bucket_arn}/cloudwatch-logs/*"
+      },
+      {
+        Effect = "Allow"
+        Action = [
+          "s3:PutObject"
+        ]
+        Resource = "${var.app_logs_bucket_arn}/cloudwatch-logs-parquet/*"
+      }
+    ]
+  })
+}
+
+# The batch exporter invokes the compactor for every completed window
+resource "aws_iam_role_policy" "lambda_log_exporter_compaction" {
+  count = local.log_compaction && local.batch_log_export ? 1 : 0
+
+  name = "${var.project_name}-${var.environment}-lambda-log-exporter-compaction"
+  role = aws_iam_role.lambda_log_exporter[0].id
+
+  policy = jsonencode({
+    Version = "2012-10-17"
+    Statement = [
+      {
+        Effect   = "Allow"
+        Action   = "lambda:InvokeFunction"
+        Resource = aws_lambda_function.log_compactor[0].arn
+      }
+    ]
+  })
+}
+
+# The streaming engine has no completion events, so compact the previous
+# hour once late deliveries have settled
+resource "aws_cloudwatch_event_rule" "hourly_log_compaction" {
+  count = local.log_compaction && local.streaming_log_export ? 1 : 0
+
+  name                = "${var.project_name}-${var.environment}-hourly-log-compaction"
+  description         = "Compact the previous hour of streamed logs into Parquet"
+  schedule_expression = "cron(20 * * * ? *)"
+
+  tags = var.tags
+}
+
+resource "aws_cloudwatch_event_target" "hourly_log_compaction" {
+  count = local.log_compaction && local.streaming_log_export ? 1 : 0
+
+  rule      = aws_cloudwatch_event_rule.hourly_log_compaction[0].name
+  target_id = "LogCompactorTarget"
+  arn       = aws_lambda_function.log_compactor[0].arn
+}
+
+resource "aws_lambda_permission" "allow_log_compaction_schedule" {
+  count = local.log_compaction && local.streaming_log_export ? 1 : 0
+
+  statement_id  = "AllowExecutionFromCloudWatch"
+  action        = "lambda:InvokeFunction"
+  function_name = aws_lambda_function.log_compactor[0].function_name
+  principal     = "events.amazonaws.com"
+  source_arn    = aws_cloudwatch_event_rule.hourly_log_compaction[0].arn
+}
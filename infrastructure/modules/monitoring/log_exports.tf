@@ -1,6 +1,15 @@
 # CloudWatch Logs Export to S3
 # This configuration automatically exports CloudWatch logs to S3 for long-term storage
 
+locals {
+  batch_log_export     = var.enable_log_export_to_s3 && var.log_export_engine == "batch"
+  streaming_log_export = var.enable_log_export_to_s3 && var.log_export_engine == "streaming"
+
+  exported_log_groups = [
+    for service in var.service_names : "/ecs/${var.project_name}/${var.environment}/${service}"
+  ]
+}
+
 # IAM Role for CloudWatch Logs to write to S3
 resource "aws_iam_role" "cloudwatch_logs_export" {
   name = "${var.project_name}-${var.environment}-cloudwatch-logs-export"
@@ -46,23 +55,31 @@ resource "aws_iam_role_policy" "cloudwatch_logs_export" {
 
 # Lambda function for automated log export
 resource "aws_lambda_function" "log_exporter" {
-  count = var.enable_log_export_to_s3 ? 1 : 0
+  count = local.batch_log_export ? 1 : 0
 
   filename         = data.archive_file.log_exporter_zip[0].output_path
   function_name    = "${var.project_name}-${var.environment}-log-exporter"
   role            = aws_iam_role.lambda_log_exporter[0].arn
   handler         = "index.handler"
   runtime         = "python3.9"
-  timeout         = 900  # 15 minutes to handle sequential processing and retries
+  timeout         = 900  # 15 minutes; the scheduler stops early and carries leftovers over
+
+  # Runs share the checkpoint manifest, so never let two overlap
+  reserved_concurrent_executions = 1
 
   source_code_hash = data.archive_file.log_exporter_zip[0].output_base64sha256
 
   environment {
     variables = {
-      S3_BUCKET = var.app_logs_bucket_id
-      LOG_GROUPS = jsonencode([
-        for service in var.service_names : "/ecs/${var.project_name}/${var.environment}/${service}"
-      ])
+      PROJECT_NAME        = var.project_name
+      ENVIRONMENT         = var.environment
+      S3_BUCKET           = var.app_logs_bucket_id
+      LOG_GROUPS          = jsonencode(local.exported_log_groups)
+      LOG_GROUP_PREFIX    = "/ecs/${var.project_name}/${var.environment}/"
+      MAX_WINDOWS_PER_RUN = var.log_export_max_windows_per_run
+      MAX_CATCHUP_HOURS   = var.log_export_max_catchup_hours
+      EXPORT_MODE         = var.log_export_mode
+      COMPACTOR_FUNCTION  = local.log_compaction ? "${var.project_name}-${var.environment}-log-compactor" : ""
     }
   }
 
@@ -71,7 +88,7 @@ resource "aws_lambda_function" "log_exporter" {
 
 # Lambda function code
 data "archive_file" "log_exporter_zip" {
-  count = var.enable_log_export_to_s3 ? 1 : 0
+  count = local.batch_log_export ? 1 : 0
 
   type        = "zip"
   output_path = "/tmp/log_exporter.zip"
@@ -83,11 +100,17 @@ data "archive_file" "log_exporter_zip" {
     })
     filename = "index.py"
   }
+
+  # Client factory shared with the cost Lambdas
+  source {
+    content  = file("${path.module}/../observability/lambda/aws_clients.py")
+    filename = "aws_clients.py"
+  }
 }
 
 # IAM Role for Lambda
 resource "aws_iam_role" "lambda_log_exporter" {
-  count = var.enable_log_export_to_s3 ? 1 : 0
+  count = local.batch_log_export ? 1 : 0
 
   name = "${var.project_name}-${var.environment}-lambda-log-exporter"
 
@@ -109,7 +132,7 @@ resource "aws_iam_role" "lambda_log_exporter" {
 
 # IAM Policy for Lambda
 resource "aws_iam_role_policy" "lambda_log_exporter" {
-  count = var.enable_log_export_to_s3 ? 1 : 0
+  count = local.batch_log_export ? 1 : 0
 
   name = "${var.project_name}-${var.environment}-lambda-log-exporter-policy"
   role = aws_iam_role.lambda_log_exporter[0].id
@@ -131,7 +154,8 @@ resource "aws_iam_role_policy" "lambda_log_exporter" {
         Action = [
           "logs:CreateExportTask",
           "logs:DescribeExportTasks",
-          "logs:DescribeLogGroups"
+          "logs:DescribeLogGroups",
+          "logs:DescribeLogStreams"
         ]
         Resource = "*"
       },
@@ -139,6 +163,8 @@ resource "aws_iam_role_policy" "lambda_log_exporter" {
         Effect = "Allow"
         Action = [
           "s3:PutObject",
+          "s3:GetObject",
+          "s3:ListBucket",
           "s3:GetBucketAcl"
         ]
         Resource = [
@@ -152,7 +178,7 @@ resource "aws_iam_role_policy" "lambda_log_exporter" {
 
 # CloudWatch Event Rule to trigger hourly log export
 resource "aws_cloudwatch_event_rule" "hourly_log_export" {
-  count = var.enable_log_export_to_s3 ? 1 : 0
+  count = local.batch_log_export ? 1 : 0
 
   name                = "${var.project_name}-${var.environment}-hourly-log-export"
   description         = "Trigger hourly log export to S3"
@@ -163,7 +189,7 @@ resource "aws_cloudwatch_event_rule" "hourly_log_export" {
 
 # CloudWatch Event Target
 resource "aws_cloudwatch_event_target" "lambda_target" {
-  count = var.enable_log_export_to_s3 ? 1 : 0
+  count = local.batch_log_export ? 1 : 0
 
   rule      = aws_cloudwatch_event_rule.hourly_log_export[0].name
   target_id = "LogExporterTarget"
@@ -172,7 +198,7 @@ resource "aws_cloudwatch_event_target" "lambda_target" {
 
 # Lambda permission for CloudWatch Events
 resource "aws_lambda_permission" "allow_cloudwatch" {
-  count = var.enable_log_export_to_s3 ? 1 : 0
+  count = local.batch_log_export ? 1 : 0
 
   statement_id  = "AllowExecutionFromCloudWatch"
   action        = "lambda:InvokeFunction"
@@ -180,3 +206,170 @@ resource "aws_lambda_permission" "allow_cloudwatch" {
   principal     = "events.amazonaws.com"
   source_arn    = aws_cloudwatch_event_rule.hourly_log_export[0].arn
 }
+
+# Async mode: check export progress every few minutes as a fallback to the
+# S3 notifications below
+resource "aws_cloudwatch_event_rule" "log_export_check" {
+  count = local.batch_log_export && var.log_export_mode == "async" ? 1 : 0
+
+  name                = "${var.project_name}-${var.environment}-log-export-check"
+  description         = "Confirm running log export tasks and submit queued ones"
+  schedule_expression = "rate(5 minutes)"
+
+  tags = var.tags
+}
+
+resource "aws_cloudwatch_event_target" "log_export_check" {
+  count = local.batch_log_export && var.log_export_mode == "async" ? 1 : 0
+
+  rule      = aws_cloudwatch_event_rule.log_export_check[0].name
+  target_id = "LogExportCheckTarget"
+  arn       = aws_lambda_function.log_exporter[0].arn
+  input     = jsonencode({ action = "check" })
+}
+
+resource "aws_lambda_permission" "allow_log_export_check" {
+  count = local.batch_log_export && var.log_export_mode == "async" ? 1 : 0
+
+  statement_id  = "AllowExecutionFromLogExportCheck"
+  action        = "lambda:InvokeFunction"
+  function_name = aws_lambda_function.log_exporter[0].function_name
+  principal     = "events.amazonaws.com"
+  source_arn    = aws_cloudwatch_event_rule.log_export_check[0].arn
+}
+
+# Async mode: exported objects landing in S3 trigger a completion check
+resource "aws_lambda_permission" "allow_app_logs_bucket" {
+  count = local.batch_log_export && var.log_export_mode == "async" ? 1 : 0
+
+  statement_id  = "AllowExecutionFromAppLogsBucket"
+  action        = "lambda:InvokeFunction"
+  function_name = aws_lambda_function.log_exporter[0].function_name
+  principal     = "s3.amazonaws.com"
+  source_arn    = var.app_logs_bucket_arn
+}
+
+resource "aws_s3_bucket_notification" "log_export_completed" {
+  count = local.batch_log_export && var.log_export_mode == "async" ? 1 : 0
+
+  bucket = var.app_logs_bucket_id
+
+  lambda_function {
+    lambda_function_arn = aws_lambda_function.log_exporter[0].arn
+    events              = ["s3:ObjectCreated:*"]
+    filter_prefix       = "cloudwatch-logs/"
+    filter_suffix       = ".gz"
+  }
+
+  depends_on = [aws_lambda_permission.allow_app_logs_bucket]
+}
+
+# Streaming engine: subscription filters deliver log events to the shipper
+# as they are written, instead of hourly export tasks
+resource "aws_lambda_function" "log_shipper" {
+  count = local.streaming_log_export ? 1 : 0
+
+  filename         = data.archive_file.log_shipper_zip[0].output_path
+  function_name    = "${var.project_name}-${var.environment}-log-shipper"
+  role             = aws_iam_role.lambda_log_shipper[0].arn
+  handler          = "index.handler"
+  runtime          = "python3.9"
+  timeout          = 60
+  memory_size      = 256
+
+  source_code_hash = data.archive_file.log_shipper_zip[0].output_base64sha256
+
+  environment {
+    variables = {
+      S3_BUCKET = var.app_logs_bucket_id
+    }
+  }
+
+  tags = var.tags
+}
+
+data "archive_file" "log_shipper_zip" {
+  count = local.streaming_log_export ? 1 : 0
+
+  type        = "zip"
+  output_path = "/tmp/log_shipper.zip"
+
+  source {
+    content  = file("${path.module}/templates/log_shipper.py")
+    filename = "index.py"
+  }
+}
+
+resource "aws_iam_role" "lambda_log_shipper" {
+  count = local.streaming_log_export ? 1 : 0
+
+  name = "${var.project_name}-${var.environment}-lambda-log-shipper"
+
+  assume_role_policy = jsonencode({
+    Version = "2012-10-17"
+    Statement = [
+      {
+        Action = "sts:AssumeRole"
+        Effect = "Allow"
+        Principal = {
+          Service = "lambda.amazonaws.com"
+        }
+      }
+    ]
+  })
+
+  tags = var.tags
+}
+
+resource "aws_iam_role_policy" "lambda_log_shipper" {
+  count = local.streaming_log_export ? 1 : 0
+
+  name = "${var.project_name}-${var.environment}-lambda-log-shipper-policy"
+  role = aws_iam_role.lambda_log_shipper[0].id
+
+  policy = jsonencode({
+    Version = "2012-10-17"
+    Statement = [
+      {
+        Effect = "Allow"
+        Action = [
+          "logs:CreateLogGroup",
+          "logs:CreateLogStream",
+          "logs:PutLogEvents"
+        ]
+        Resource = "arn:aws:logs:${var.aws_region}:*:*"
+      },
+      {
+        Effect = "Allow"
+        Action = [
+          "s3:PutObject"
+        ]
+        Resource = [
+          "${var.app_logs_bucket_arn}/cloudwatch-logs/*"
+        ]
+      }
+    ]
+  })
+}
+
+resource "aws_lambda_permission" "allow_cloudwatch_logs" {
+  count = local.streaming_log_export ? 1 : 0
+
+  statement_id  = "AllowExecutionFromCloudWatchLogs"
+  action        = "lambda:InvokeFunction"
+  function_name = aws_lambda_function.log_shipper[0].function_name
+  principal     = "logs.amazonaws.com"
+  source_arn    = "arn:aws:logs:${var.aws_region}:*:log-group:/ecs/${var.project_name}/${var.environment}/*"
+}
+
+# Log groups are created by the ECS module and must exist before apply
+resource "aws_cloudwatch_log_subscription_filter" "log_shipper" {
+  for_each = local.streaming_log_export ? toset(local.exported_log_groups) : toset([])
+
+  name            = "${var.project_name}-${var.environment}-log-shipper"
+  log_group_name  = each.value
+  filter_pattern  = ""
+  destination_arn = aws_lambda_function.log_shipper[0].arn
+
+  depends_on = [aws_lambda_permission.allow_cloudwatch_logs]
+}
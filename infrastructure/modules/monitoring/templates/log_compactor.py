@@ -0,0 +1,207 @@
+import gzip
+import io
+import json
+import boto3
+import os
+import re
+import tempfile
+from datetime import datetime, timedelta, timezone
+
+# pyarrow is not part of the Lambda runtime; it comes from the layer set in
+# log_compaction_layer_arns (e.g. AWS SDK for pandas)
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+SOURCE_PREFIX = 'cloudwatch-logs/'
+TARGET_PREFIX = 'cloudwatch-logs-parquet/'
+
+# Daily backfill chunks log_exporter writes under <group>/daily/; only the
+# hourly windows are compacted, so these are never read
+DAILY_DIR = 'daily'
+
+# Completion marker log_exporter writes next to each exported window
+MARKER_NAME = '_COMPLETED.json'
+
+HOUR_MS = 3600 * 1000
+
+# Rows buffered before a row group is written, which bounds memory use
+ROW_GROUP_SIZE = int(os.environ.get('ROW_GROUP_SIZE', 50000))
+
+SCHEMA = pa.schema([
+    ('timestamp', pa.timestamp('ms', tz='UTC')),
+    ('level', pa.string()),
+    ('logger', pa.string()),
+    ('thread', pa.string()),
+    ('message', pa.string()),
+    ('log_stream', pa.string()),
+])
+
+# Line prefix added by create_export_task and log_shipper
+EXPORT_LINE = re.compile(r'^(\d{4}-\d{2}-\d{2}T\d{2}:\d{2}:\d{2}\.\d{3}Z) (.*)$')
+
+# Spring Boot console format, e.g.
+# 2025-01-01T12:00:00.123Z  INFO 1 --- [user-service] [main] c.a.s.UserService : Started
+SPRING_LINE = re.compile(
+    r'^\S+[T ]\S+\s+(?P<level>TRACE|DEBUG|INFO|WARN|ERROR|FATAL)\s+\d*\s*---\s+'
+    r'(?:\[(?P<app>[^\]]*)\]\s+)?\[\s*(?P<thread>[^\]]*)\]\s+(?P<logger>\S+)\s*:\s(?P<message>.*)$',
+    re.DOTALL
+)
+
+
+def parse_message(message):
+    """
+    Split a Spring Boot log line into level, logger, thread and message.
+    Lines in any other format are kept whole as the message.
+    """
+    match = SPRING_LINE.match(message)
+    if not match:
+        return None, None, None, message
+    return match.group('level'), match.group('logger'), match.group('thread').strip(), match.group('message')
+
+
+def read_events(body, log_stream):
+    """
+    Stream events out of one gzip export object.
+
+    Lines without the export timestamp prefix continue the previous event
+    (multi-line messages such as stack traces).
+    """
+    event = None
+    with gzip.GzipFile(fileobj=body) as raw:
+        for line in io.TextIOWrapper(raw, encoding='utf-8', errors='replace'):
+            line = line.rstrip('\n')
+            match = EXPORT_LINE.match(line)
+            if match:
+                if event:
+                    yield event
+                timestamp = datetime.strptime(match.group(1), '%Y-%m-%dT%H:%M:%S.%fZ').replace(tzinfo=timezone.utc)
+                event = {'timestamp': timestamp, 'message': match.group(2), 'log_stream': log_stream}
+            elif event:
+                event['message'] += '\n' + line
+    if event:
+        yield event
+
+
+def completed_task(s3_client, bucket, prefix):
+    """ID of the export task the hour's completion marker names, or None"""
+    try:
+        response = s3_client.get_object(Bucket=bucket, Key=prefix + MARKER_NAME)
+    except s3_client.exceptions.NoSuchKey:
+        return None
+    return json.loads(response['Body'].read())['taskId']
+
+
+def source_objects(s3_client, bucket, prefix):
+    """
+    List the gzip export objects under an hour prefix. When the hour has a
+    completion marker, only the objects of the task it names are read, so
+    a retried export never contributes its rows twice.
+    """
+    task_id = completed_task(s3_client, bucket, prefix)
+    params = {'Bucket': bucket, 'Prefix': prefix}
+    while True:
+        response = s3_client.list_objects_v2(**params)
+        for item in response.get('Contents', []):
+            key = item['Key']
+            if not key.endswith('.gz'):
+                continue
+            if task_id and not key.startswith((f'{prefix}{task_id}/', f'{prefix}stream/')):
+                continue
+            yield key
+        if not response.get('IsTruncated'):
+            break
+        params['ContinuationToken'] = response['NextContinuationToken']
+
+
+def stream_name(prefix, key):
+    """
+    Log stream name from an object key. Export tasks write
+    <prefix>/<taskId>/<stream>/000000.gz, log_shipper writes
+    <prefix>/stream/<stream>-<firstEventId>.gz
+    """
+    parts = key[len(prefix):].split('/')
+    if parts[0] == 'stream':
+        return parts[-1].rsplit('-', 1)[0]
+    return '/'.join(parts[1:-1])
+
+
+def compact_hour(s3_client, bucket, log_group, hour):
+    """
+    Rewrite one log group's exported hour as a single Parquet file
+
+    Args:
+        s3_client: boto3 S3 client
+        bucket: Bucket holding cloudwatch-logs/ exports
+        log_group: Log group name, e.g. /ecs/sdt/dev/user-service
+        hour: Start of the hour as a UTC datetime
+
+    Returns:
+        Dict with the target key and the number of rows written
+    """
+    prefix = f"{SOURCE_PREFIX}{log_group.replace('/', '-')}/{hour.strftime('%Y/%m/%d/%H')}/"
+    service = log_group.rstrip('/').split('/')[-1]
+    target_key = f"{TARGET_PREFIX}service={service}/date={hour.strftime('%Y-%m-%d')}/{hour.strftime('%H')}.parquet"
+
+    rows = 0
+    columns = {name: [] for name in SCHEMA.names}
+    with tempfile.NamedTemporaryFile(suffix='.parquet') as output:
+        writer = pq.ParquetWriter(output.name, SCHEMA, compression='zstd')
+
+        def write_row_group():
+            writer.write_table(pa.Table.from_pydict(columns, schema=SCHEMA))
+            for values in columns.values():
+                values.clear()
+
+        for key in source_objects(s3_client, bucket, prefix):
+            body = s3_client.get_object(Bucket=bucket, Key=key)['Body']
+            for event in read_events(body, stream_name(prefix, key)):
+                level, logger, thread, message = parse_message(event['message'])
+                columns['timestamp'].append(event['timestamp'])
+                columns['level'].append(level)
+                columns['logger'].append(logger)
+                columns['thread'].append(thread)
+                columns['message'].append(message)
+                columns['log_stream'].append(event['log_stream'])
+                rows += 1
+                if len(columns['timestamp']) >= ROW_GROUP_SIZE:
+                    write_row_group()
+
+        if columns['timestamp']:
+            write_row_group()
+        writer.close()
+
+        if rows:
+            s3_client.upload_file(output.name, bucket, target_key)
+
+    print(f"Compacted {rows} events from {prefix} into {target_key}" if rows else f"No events under {prefix}")
+    return {'key': target_key if rows else None, 'rows': rows}
+
+
+def handler(event, context):
+    """
+    Lambda function to compact exported CloudWatch logs into Parquet
+    Invoked by log_exporter for each completed window, or on a schedule to
+    compact the previous hour of every configured log group
+    """
+
+    s3_client = boto3.client('s3')
+    s3_bucket = os.environ['S3_BUCKET']
+
+    if 'logGroup' in event:
+        if event.get('toTime') is not None and event['toTime'] - event['fromTime'] != HOUR_MS:
+            print(f"Skipping {event['logGroup']}: only hourly windows are compacted, not {DAILY_DIR}/ chunks")
+            return {'statusCode': 200, 'body': json.dumps({'compactedFiles': 0, 'rows': 0})}
+        targets = [(event['logGroup'], datetime.fromtimestamp(event['fromTime'] / 1000, tz=timezone.utc))]
+    else:
+        hour = datetime.now(timezone.utc).replace(minute=0, second=0, microsecond=0) - timedelta(hours=1)
+        targets = [(log_group, hour) for log_group in json.loads(os.environ['LOG_GROUPS'])]
+
+    results = [compact_hour(s3_client, s3_bucket, log_group, hour) for log_group, hour in targets]
+
+    return {
+        'statusCode': 200,
+        'body': json.dumps({
+            'compactedFiles': sum(1 for r in results if r['key']),
+            'rows': sum(r['rows'] for r in results)
+        })
+    }
@@ -1,134 +1,1025 @@
+import argparse
+import hashlib
 import json
-import boto3
 import os
-from datetime import datetime, timedelta
+import random
+from collections import deque
+from datetime import datetime, timedelta, timezone
 import time
 
-def handler(event, context):
+import aws_clients
+
+# CloudWatch Logs allows a single active export task per account, so the
+# exporter submits one task, waits for it to finish and then submits the next.
+TERMINAL_STATUSES = ('COMPLETED', 'FAILED', 'CANCELLED')
+
+# Manifest in S3_BUCKET recording how far each log group has been exported
+MANIFEST_KEY = 'cloudwatch-logs/_exporter/checkpoints.json'
+
+# Written next to a completed export; names the task whose objects are the
+# window's data, so retried or duplicate tasks under the prefix are ignored
+MARKER_NAME = '_COMPLETED.json'
+
+HOUR_MS = 3600 * 1000
+DAY_MS = 24 * HOUR_MS
+
+# Daily backfill chunks are written under <group>/daily/<Y/M/D>, apart from
+# the hourly <group>/<Y/M/D/H> windows, so a day exported both ways is never
+# read twice by scans of the hourly layout
+DAILY_DIR = 'daily'
+
+# Manifests of backfill requests, one per request, for resuming them
+BACKFILL_PREFIX = 'cloudwatch-logs/_exporter/backfill/'
+
+# Per-run budget of hourly windows, and how far back a missing or stale
+# checkpoint is allowed to reach (bounded by the log group retention)
+MAX_WINDOWS_PER_RUN = int(os.environ.get('MAX_WINDOWS_PER_RUN', 48))
+MAX_CATCHUP_HOURS = int(os.environ.get('MAX_CATCHUP_HOURS', 24))
+
+# Hours before the newest window that are never skipped as idle: stream
+# lastEventTimestamp is eventually consistent and the discovery index's
+# storedBytes can be cached, so recent activity may not show yet
+IDLE_GRACE_HOURS = int(os.environ.get('IDLE_GRACE_HOURS', 1))
+
+# Log group index reused across warm invocations until it expires
+DISCOVERY_TTL_SECONDS = int(os.environ.get('DISCOVERY_TTL_SECONDS', 900))
+_discovery_cache = {'prefix': None, 'expires': 0, 'index': None}
+
+# Stop starting new work when less than this much Lambda time is left
+SAFETY_MARGIN_MS = int(os.environ.get('SAFETY_MARGIN_MS', 60000))
+
+# 'wait' keeps polling each task until the run's time is up. 'async' only
+# waits ASYNC_WAIT_SECONDS and leaves the rest to check_completion, which
+# runs on S3 object-created events and on a short schedule.
+EXPORT_MODE = os.environ.get('EXPORT_MODE', 'wait')
+ASYNC_WAIT_SECONDS = int(os.environ.get('ASYNC_WAIT_SECONDS', 20))
+
+# Lambda that rewrites each completed window as Parquet (optional)
+COMPACTOR_FUNCTION = os.environ.get('COMPACTOR_FUNCTION')
+
+# Embedded Metric Format namespace for run and per-export metrics
+PROJECT_NAME = os.environ.get('PROJECT_NAME', 'sdt')
+ENVIRONMENT = os.environ.get('ENVIRONMENT', 'dev')
+METRICS_NAMESPACE = f'{PROJECT_NAME.upper()}/LogExport'
+
+
+class AdaptiveBackoff:
     """
-    Lambda function to export CloudWatch logs to S3
-    Runs hourly to export previous hour's logs
+    Delay that grows while an API keeps throttling and decays once calls
+    succeed again, so sleeps follow the throttling we actually observe.
     """
-    
-    logs_client = boto3.client('logs')
-    s3_bucket = os.environ['S3_BUCKET']
-    log_groups = json.loads(os.environ['LOG_GROUPS'])
-    
-    # Calculate time range for previous hour
-    end_time = datetime.now().replace(minute=0, second=0, microsecond=0)
-    start_time = end_time - timedelta(hours=1)
-    
-    # Convert to epoch milliseconds
-    from_time = int(start_time.timestamp() * 1000)
-    to_time = int(end_time.timestamp() * 1000)
-    
-    export_tasks = []
-    successful_exports = 0
-    failed_exports = 0
-    
-    for log_group in log_groups:
+
+    def __init__(self, initial=1.0, maximum=60.0, factor=2.0):
+        self.initial = initial
+        self.maximum = maximum
+        self.factor = factor
+        self.delay = 0.0
+
+    def throttled(self):
+        """Record a throttled call and return the jittered delay to sleep"""
+        self.delay = min(max(self.delay * self.factor, self.initial), self.maximum)
+        return random.uniform(self.delay / 2, self.delay)
+
+    def succeeded(self):
+        """Record a successful call"""
+        self.delay = self.delay / self.factor
+        if self.delay < self.initial:
+            self.delay = 0.0
+
+
+class ExportScheduler:
+    """
+    Runs queued export jobs through the account's single export slot.
+
+    The next job is submitted as soon as the running task reaches a terminal
+    state. Throttled submits are retried with adaptive backoff, and the
+    scheduler stops before the Lambda deadline, leaving unfinished jobs in
+    the queue for the caller to persist.
+
+    Args:
+        logs_client: boto3 CloudWatch Logs client
+        bucket: Destination S3 bucket
+        remaining_ms: Callable returning the remaining invocation time in ms
+        sleep: Sleep function (replaceable in tests)
+        on_submit: Optional callable(job, task_id) run after a task is created
+        on_finish: Optional callable(job, status) run when a job is done;
+            the job carries the taskId of its export
+        is_exported: Optional callable(job) returning True when the window
+            was already exported, in which case it finishes as EXISTS
+            without submitting a task
+        budget_ms: Optional cap on how long this run may take, on top of
+            the Lambda deadline
+    """
+
+    def __init__(self, logs_client, bucket, remaining_ms, sleep=time.sleep,
+                 on_submit=None, on_finish=None, is_exported=None, budget_ms=None):
+        self.logs_client = logs_client
+        self.bucket = bucket
+        self.remaining_ms = remaining_ms
+        self.stop_at_ms = SAFETY_MARGIN_MS
+        if budget_ms is not None:
+            self.stop_at_ms = max(self.stop_at_ms, remaining_ms() - budget_ms)
+        self.sleep = sleep
+        self.on_submit = on_submit
+        self.on_finish = on_finish
+        self.is_exported = is_exported
+        self.queue = deque()
+        self.stopped = False
+        self.submit_backoff = AdaptiveBackoff(initial=2.0, maximum=60.0)
+        self.results = []
+        self.retries = {}
+        self.throttles = 0
+
+    def add(self, job):
+        """
+        Queue an export job
+
+        Args:
+            job: Dict with logGroup, fromTime, toTime and destinationPrefix
+                keys, plus taskId when the task was already submitted
+        """
+        self.queue.append(job)
+
+    def discard(self, log_group):
+        """Drop queued jobs for a log group, e.g. after one of them failed"""
+        self.queue = deque(job for job in self.queue if job['logGroup'] != log_group)
+
+    def has_time(self, needed_ms=0):
+        if self.stopped:
+            return False
+        return self.remaining_ms() - needed_ms > self.stop_at_ms
+
+    def run(self):
+        """Drain the queue until it is empty or the time budget runs out"""
+        while self.queue and self.has_time():
+            job = self.queue[0]
+            task_id = job.get('taskId')
+            if task_id is None:
+                if self.is_exported and self.is_exported(job):
+                    self.queue.popleft()
+                    self._finish(job, None, 'EXISTS')
+                    print(f"Window {job['destinationPrefix']} already exported, skipping...")
+                    continue
+                task_id = self._submit(job)
+                if task_id is None:
+                    continue
+                if self.on_submit:
+                    self.on_submit(job, task_id)
+
+            self.queue.popleft()
+            status, task = self._wait(task_id)
+            self._finish(job, task_id, status, task)
+            print(f"Export task {task_id} for {job['logGroup']}: {status}")
+
+            if status == 'RUNNING':
+                # Out of time while the task is still running; it will
+                # finish on its own, but nothing more can be submitted.
+                break
+
+        return self.results
+
+    def _finish(self, job, task_id, status, task=None):
+        execution = (task or {}).get('executionInfo', {})
+        duration_ms = None
+        if 'creationTime' in execution and 'completionTime' in execution:
+            duration_ms = execution['completionTime'] - execution['creationTime']
+
+        self.results.append({
+            'taskId': task_id,
+            'logGroup': job['logGroup'],
+            'fromTime': job['fromTime'],
+            'destinationPrefix': job['destinationPrefix'],
+            'status': status,
+            'retries': self.retries.get((job['logGroup'], job['fromTime']), 0),
+            'durationMs': duration_ms
+        })
+        if self.on_finish:
+            self.on_finish(dict(job, taskId=task_id), status)
+
+    def _submit(self, job):
+        """
+        Submit one export task.
+
+        Returns the task ID, or None if the job should be attempted again
+        (after throttling) or was dropped from the queue (on other errors).
+        """
         try:
-            # Check if log group exists
+            response = self.logs_client.create_export_task(
+                logGroupName=job['logGroup'],
+                fromTime=job['fromTime'],
+                to=job['toTime'],
+                destination=self.bucket,
+                destinationPrefix=job['destinationPrefix']
+            )
+        except self.logs_client.exceptions.LimitExceededException:
+            self.throttles += 1
+            key = (job['logGroup'], job['fromTime'])
+            self.retries[key] = self.retries.get(key, 0) + 1
+            delay = self.submit_backoff.throttled()
+            if not self.has_time(delay * 1000):
+                print(f"Rate limit hit for {job['logGroup']}, no time left to retry")
+                # Leave the job at the head of the queue for the next run
+                self.stopped = True
+                return None
+            print(f"Rate limit hit for {job['logGroup']}, retrying in {delay:.1f} seconds...")
+            self.sleep(delay)
+            return None
+        except Exception as e:
+            print(f"Error creating export task for {job['logGroup']}: {str(e)}")
+            self.queue.popleft()
+            self._finish(job, None, 'FAILED')
+            return None
+
+        self.submit_backoff.succeeded()
+        print(f"Created export task {response['taskId']} for {job['logGroup']}")
+        return response['taskId']
+
+    def _wait(self, task_id):
+        """
+        Poll an export task until it reaches a terminal state.
+
+        The poll interval starts short, so small exports hand the slot to
+        the next job quickly, and stretches out for long-running ones.
+        Returns the final status code, or RUNNING if time ran out first,
+        together with the last task description seen.
+        """
+        interval = 1.0
+        poll_backoff = AdaptiveBackoff(initial=2.0, maximum=30.0)
+
+        while True:
             try:
-                response = logs_client.describe_log_groups(logGroupNamePrefix=log_group)
-                if not response['logGroups']:
-                    print(f"Log group {log_group} not found, skipping...")
-                    continue
+                response = self.logs_client.describe_export_tasks(taskId=task_id)
+                poll_backoff.succeeded()
+                if not response['exportTasks']:
+                    print(f"Export task {task_id} not found")
+                    return 'FAILED', None
+                task = response['exportTasks'][0]
+                if task['status']['code'] in TERMINAL_STATUSES:
+                    return task['status']['code'], task
             except Exception as e:
-                print(f"Error checking log group {log_group}: {str(e)}")
-                failed_exports += 1
-                continue
-            
-            # Create export task with retry logic for rate limits
-            max_retries = 3
-            retry_delay = 30  # seconds
-            
-            for attempt in range(max_retries):
-                try:
-                    destination_prefix = f"cloudwatch-logs/{log_group.replace('/', '-')}/{start_time.strftime('%Y/%m/%d/%H')}"
-                    
-                    response = logs_client.create_export_task(
-                        logGroupName=log_group,
-                        fromTime=from_time,
-                        to=to_time,
-                        destination=s3_bucket,
-                        destinationPrefix=destination_prefix
-                    )
-                    
-                    export_tasks.append({
-                        'taskId': response['taskId'],
-                        'logGroup': log_group,
-                        'status': 'PENDING'
-                    })
-                    
-                    print(f"Created export task {response['taskId']} for {log_group}")
-                    successful_exports += 1
-                    
-                    # Wait between export tasks to avoid hitting rate limits
-                    if len(export_tasks) < len(log_groups):
-                        time.sleep(5)  # 5 second delay between tasks
-                    
-                    break  # Success, exit retry loop
-                    
-                except logs_client.exceptions.LimitExceededException:
-                    if attempt < max_retries - 1:
-                        print(f"Rate limit hit for {log_group}, retrying in {retry_delay} seconds... (attempt {attempt + 1}/{max_retries})")
-                        time.sleep(retry_delay)
-                        retry_delay *= 2  # Exponential backoff
-                    else:
-                        print(f"Failed to create export task for {log_group} after {max_retries} attempts: Rate limit exceeded")
-                        failed_exports += 1
-                        break
-                        
-                except Exception as e:
-                    print(f"Error creating export task for {log_group}: {str(e)}")
-                    failed_exports += 1
-                    break
-                    
+                # Throttled or transient; the task itself keeps running
+                print(f"Error checking task {task_id}: {str(e)}")
+                self.throttles += 1
+                interval = max(interval, poll_backoff.throttled())
+
+            if not self.has_time(interval * 1000):
+                return 'RUNNING', None
+
+            self.sleep(interval)
+            interval = min(interval * 1.5, 15.0)
+
+
+class RunMetrics:
+    """
+    Collects timings for one run and prints them as CloudWatch Embedded
+    Metric Format records. Lambda ships stdout to CloudWatch Logs, which
+    extracts the metrics without any PutMetricData calls.
+
+    Args:
+        clock: Monotonic clock (replaceable in tests)
+        sleep: Sleep function; time spent in it is reported as SleepTime
+    """
+
+    def __init__(self, clock=time.monotonic, sleep=time.sleep):
+        self.clock = clock
+        self._sleep = sleep
+        self.started = clock()
+        self.sleep_seconds = 0.0
+
+    def sleep(self, seconds):
+        self.sleep_seconds += seconds
+        self._sleep(seconds)
+
+    def emit_export(self, result, bytes_exported):
+        """Print the metrics of one finished export"""
+        values = {
+            'ExportRetries': (result['retries'], 'Count'),
+            'BytesExported': (bytes_exported, 'Bytes')
+        }
+        if result['durationMs'] is not None:
+            values['SubmitToCompleteTime'] = (result['durationMs'], 'Milliseconds')
+        self._emit({'LogGroup': result['logGroup']}, values, {
+            'taskId': result['taskId'],
+            'status': result['status']
+        })
+
+    def emit_run(self, counts):
+        """
+        Print the run totals
+
+        Args:
+            counts: Dict of metric name to count, e.g. ExportsCompleted
+        """
+        wall_ms = (self.clock() - self.started) * 1000
+        sleep_ms = self.sleep_seconds * 1000
+        values = {
+            'WallTime': (wall_ms, 'Milliseconds'),
+            'SleepTime': (sleep_ms, 'Milliseconds'),
+            'WorkTime': (max(wall_ms - sleep_ms, 0), 'Milliseconds')
+        }
+        for name, value in counts.items():
+            values[name] = (value, 'Count')
+        self._emit({}, values)
+
+    def _emit(self, dimensions, values, properties=None):
+        dimensions = dict(dimensions, Environment=ENVIRONMENT)
+        record = {
+            '_aws': {
+                'Timestamp': int(time.time() * 1000),
+                'CloudWatchMetrics': [{
+                    'Namespace': METRICS_NAMESPACE,
+                    'Dimensions': [sorted(dimensions)],
+                    'Metrics': [{'Name': name, 'Unit': unit} for name, (_, unit) in values.items()]
+                }]
+            }
+        }
+        record.update(dimensions)
+        record.update(properties or {})
+        record.update({name: value for name, (value, _) in values.items()})
+        print(json.dumps(record))
+
+
+class CheckpointStore:
+    """
+    Per log group export checkpoints kept in a small JSON manifest in S3.
+
+    Each entry records the end of the last contiguous hour exported for the
+    group and, while a task is running, the window it covers, so a run that
+    times out can pick the task up again instead of exporting it twice. In
+    async mode the manifest also holds the queue of windows not yet
+    submitted, for check_completion to work through.
+
+    Args:
+        s3_client: boto3 S3 client (or any object with get_object/put_object)
+        bucket: Bucket holding the manifest
+        key: Manifest object key
+    """
+
+    def __init__(self, s3_client, bucket, key=MANIFEST_KEY):
+        self.s3_client = s3_client
+        self.bucket = bucket
+        self.key = key
+        self.log_groups = {}
+        self.queue = []
+
+    def load(self):
+        try:
+            response = self.s3_client.get_object(Bucket=self.bucket, Key=self.key)
+        except self.s3_client.exceptions.NoSuchKey:
+            print("No export checkpoints found, starting fresh")
+            return self
+        manifest = json.loads(response['Body'].read())
+        self.log_groups = manifest.get('logGroups', {})
+        self.queue = manifest.get('queue', [])
+        return self
+
+    def save(self):
+        manifest = {'version': 1, 'logGroups': self.log_groups, 'queue': self.queue}
+        self.s3_client.put_object(
+            Bucket=self.bucket,
+            Key=self.key,
+            Body=json.dumps(manifest, sort_keys=True).encode('utf-8'),
+            ContentType='application/json'
+        )
+
+    def in_flight_jobs(self):
+        """Jobs for every task recorded as running"""
+        return [
+            dict(entry['inFlight'], logGroup=log_group)
+            for log_group, entry in sorted(self.log_groups.items())
+            if 'inFlight' in entry
+        ]
+
+    def exported_through(self, log_group):
+        """Epoch ms up to which the log group has been exported, or None"""
+        return self.log_groups.get(log_group, {}).get('exportedThrough')
+
+    def in_flight(self, log_group):
+        """Export task recorded as running for the log group, or None"""
+        return self.log_groups.get(log_group, {}).get('inFlight')
+
+    def start(self, job, task_id):
+        """Record a submitted task so a later run can resume tracking it"""
+        self.queue = [
+            queued for queued in self.queue
+            if (queued['logGroup'], queued['fromTime']) != (job['logGroup'], job['fromTime'])
+        ]
+        entry = self.log_groups.setdefault(job['logGroup'], {})
+        entry['inFlight'] = {
+            'taskId': task_id,
+            'fromTime': job['fromTime'],
+            'toTime': job['toTime'],
+            'destinationPrefix': job['destinationPrefix']
+        }
+        if 'advanceTo' in job:
+            entry['inFlight']['advanceTo'] = job['advanceTo']
+        self.save()
+
+    def finish(self, job, status):
+        """
+        Clear the running task and, if it completed, advance the checkpoint.
+        The checkpoint only moves when the window directly follows it, so a
+        failed hour is never skipped over.
+        """
+        entry = self.log_groups.setdefault(job['logGroup'], {})
+        entry.pop('inFlight', None)
+        through = entry.get('exportedThrough')
+        if status == 'COMPLETED' and (through is None or job['fromTime'] <= through):
+            # advanceTo also covers idle hours planned after this window
+            entry['exportedThrough'] = max(through or 0, job.get('advanceTo', job['toTime']))
+        entry['lastStatus'] = status
+        entry['updatedAt'] = datetime.utcnow().isoformat()
+        self.save()
+
+    def advance(self, log_group, through):
+        """Move a log group's checkpoint forward to through (saved with the next save())"""
+        entry = self.log_groups.setdefault(log_group, {})
+        entry['exportedThrough'] = max(entry.get('exportedThrough') or 0, through)
+        return entry
+
+    def skip(self, log_group, through):
+        """Advance an idle log group's checkpoint without exporting"""
+        entry = self.advance(log_group, through)
+        entry['lastStatus'] = 'SKIPPED'
+        entry['updatedAt'] = datetime.utcnow().isoformat()
+
+
+def discover_log_groups(logs_client, prefix, ttl=DISCOVERY_TTL_SECONDS, now=time.time):
+    """
+    List every log group under a prefix in one paginated sweep.
+
+    Replaces one describe_log_groups call per configured group, and matches
+    names exactly, so a longer name sharing the prefix is not mistaken for
+    the group itself. The index is cached at module level for warm starts.
+
+    Args:
+        logs_client: boto3 CloudWatch Logs client
+        prefix: Common prefix of the exported log groups
+        ttl: Seconds a cached index stays valid
+        now: Clock function (replaceable in tests)
+
+    Returns:
+        Dict of log group name to storedBytes, retentionInDays and creationTime
+    """
+    cache = _discovery_cache
+    if cache['prefix'] == prefix and cache['expires'] > now():
+        print(f"Using cached index of {len(cache['index'])} log groups")
+        return cache['index']
+
+    index = {}
+    params = {'limit': 50}
+    if prefix:
+        params['logGroupNamePrefix'] = prefix
+    while True:
+        response = logs_client.describe_log_groups(**params)
+        for group in response['logGroups']:
+            index[group['logGroupName']] = {
+                'storedBytes': group.get('storedBytes', 0),
+                'retentionInDays': group.get('retentionInDays'),
+                'creationTime': group.get('creationTime')
+            }
+        if not response.get('nextToken'):
+            break
+        params['nextToken'] = response['nextToken']
+
+    print(f"Discovered {len(index)} log groups under {prefix}")
+    cache.update(prefix=prefix, expires=now() + ttl, index=index)
+    return index
+
+
+def find_last_activity(logs_client, log_groups, index):
+    """
+    Look up when each log group last received events.
+
+    Uses the most recently written stream's lastEventTimestamp and
+    lastIngestionTime. Groups the discovery index reports as holding no
+    data are treated as idle without an API call. Groups whose lookup fails
+    are left out, so they are exported as usual.
+
+    Returns:
+        Dict of log group name to epoch ms of the last event, or None
+    """
+    activity = {}
+    for log_group in log_groups:
+        if index.get(log_group, {}).get('storedBytes') == 0:
+            activity[log_group] = None
+            continue
+        try:
+            response = logs_client.describe_log_streams(
+                logGroupName=log_group,
+                orderBy='LastEventTime',
+                descending=True,
+                limit=1
+            )
         except Exception as e:
-            print(f"Unexpected error processing {log_group}: {str(e)}")
-            failed_exports += 1
+            print(f"Error checking activity of {log_group}: {str(e)}")
+            continue
+
+        streams = response['logStreams']
+        activity[log_group] = max(
+            (stream.get(field) or 0 for stream in streams
+             for field in ('lastEventTimestamp', 'lastIngestionTime')),
+            default=None
+        )
+    return activity
+
+
+def exported_bytes(s3_client, bucket, prefix):
+    """Total size of the objects an export task wrote under its prefix"""
+    total = 0
+    params = {'Bucket': bucket, 'Prefix': prefix + '/'}
+    while True:
+        response = s3_client.list_objects_v2(**params)
+        total += sum(item['Size'] for item in response.get('Contents', []))
+        if not response.get('IsTruncated'):
+            return total
+        params['ContinuationToken'] = response['NextContinuationToken']
+
+
+def destination_prefix(log_group, from_time, window_ms=HOUR_MS):
+    window_start = datetime.fromtimestamp(from_time / 1000, tz=timezone.utc)
+    group_prefix = f"cloudwatch-logs/{log_group.replace('/', '-')}"
+    if window_ms == HOUR_MS:
+        return f"{group_prefix}/{window_start.strftime('%Y/%m/%d/%H')}"
+    return f"{group_prefix}/{DAILY_DIR}/{window_start.strftime('%Y/%m/%d')}"
+
+
+def plan_exports(log_groups, checkpoints, end_time, max_windows=MAX_WINDOWS_PER_RUN,
+                 max_catchup_hours=MAX_CATCHUP_HOURS, index=None, last_activity=None,
+                 start_time=None, window_ms=HOUR_MS, idle_cutoff=None):
+    """
+    Build the export jobs between each group's checkpoint and end_time.
+
+    Tasks recorded as in flight come first since they already hold the
+    export slot, followed by the remaining windows oldest first across all
+    groups, cut to the per-run budget. Windows starting after a group's last
+    event are not exported; the group's last exported window carries them
+    in advanceTo, or the whole group is reported as skipped. Idle windows
+    ending after idle_cutoff are neither exported nor skipped; the next run
+    looks at them again with fresher activity data. A checkpoint
+    older than the catch-up limit is moved up to it in checkpoints.
+
+    Args:
+        log_groups: Log group names to export
+        checkpoints: CheckpointStore with the current manifest
+        end_time: Epoch ms of the end of the newest window (hour aligned)
+        max_windows: Maximum number of windows to plan
+        max_catchup_hours: Oldest window allowed, in hours before end_time
+        index: Optional discovery index; windows past a group's retention
+            are not planned
+        last_activity: Optional dict of log group to epoch ms of its last
+            event (None when it has none), from find_last_activity
+        start_time: Epoch ms to start groups without a checkpoint from;
+            defaults to the last window before end_time
+        window_ms: Window length, hourly by default
+        idle_cutoff: Epoch ms after which windows are not skipped as idle;
+            defaults to IDLE_GRACE_HOURS before end_time
+
+    Returns:
+        Tuple of (jobs, total number of windows outstanding, dict of idle
+        log groups to the time their checkpoint can skip ahead to)
+    """
+    resumed = []
+    windows = []
+    skipped = {}
+    if idle_cutoff is None:
+        idle_cutoff = end_time - IDLE_GRACE_HOURS * HOUR_MS
+
+    for log_group in log_groups:
+        catchup_hours = max_catchup_hours
+        retention_days = (index or {}).get(log_group, {}).get('retentionInDays')
+        if retention_days:
+            catchup_hours = min(catchup_hours, retention_days * 24)
+        oldest_allowed = end_time - catchup_hours * HOUR_MS
+
+        start = checkpoints.exported_through(log_group)
+        if start is None:
+            start = end_time - window_ms if start_time is None else start_time
+        if start < oldest_allowed:
+            print(f"Checkpoint for {log_group} is older than {catchup_hours}h, skipping ahead")
+            start = oldest_allowed
+            # Give up on the older hours in the checkpoint too; finish() only
+            # advances it for a window starting at or before it
+            if checkpoints.exported_through(log_group) is not None:
+                checkpoints.advance(log_group, start)
+
+        group_jobs = []
+        in_flight = checkpoints.in_flight(log_group)
+        if in_flight:
+            group_jobs.append(dict(in_flight, logGroup=log_group))
+            start = max(start, in_flight['toTime'])
+
+        has_activity = last_activity is not None and log_group in last_activity
+        last_event = last_activity.get(log_group) if has_activity else None
+        for from_time in range(start, end_time, window_ms):
+            if has_activity and (last_event is None or from_time > last_event):
+                # Nothing was written from here on, so neither is this hour,
+                # as far as the activity data can tell up to the cutoff
+                idle_through = from_time + max(min(idle_cutoff, end_time) - from_time, 0) // window_ms * window_ms
+                if group_jobs:
+                    if idle_through > from_time:
+                        group_jobs[-1]['advanceTo'] = idle_through
+                elif idle_through > from_time or checkpoints.exported_through(log_group) is None:
+                    # A group without a checkpoint gets one even when nothing
+                    # is skipped, so the hours inside the cutoff are looked
+                    # at again next run
+                    skipped[log_group] = idle_through
+                break
+            group_jobs.append({
+                'logGroup': log_group,
+                'fromTime': from_time,
+                'toTime': min(from_time + window_ms, end_time),
+                'destinationPrefix': destination_prefix(log_group, from_time, window_ms)
+            })
+
+        for job in group_jobs:
+            (resumed if 'taskId' in job else windows).append(job)
+
+    windows.sort(key=lambda job: (job['fromTime'], job['logGroup']))
+    outstanding = len(resumed) + len(windows)
+    return resumed + windows[:max(max_windows - len(resumed), 0)], outstanding, skipped
+
+
+def export_marker(s3_client, bucket, prefix):
+    """The completion marker of an export prefix, or None if it has none"""
+    try:
+        response = s3_client.get_object(Bucket=bucket, Key=f'{prefix}/{MARKER_NAME}')
+    except s3_client.exceptions.NoSuchKey:
+        return None
+    return json.loads(response['Body'].read())
+
+
+def mark_exported(s3_client, bucket, job):
+    """Record which export task holds the data of a completed window"""
+    s3_client.put_object(
+        Bucket=bucket,
+        Key=f"{job['destinationPrefix']}/{MARKER_NAME}",
+        Body=json.dumps({
+            'taskId': job['taskId'],
+            'logGroup': job['logGroup'],
+            'fromTime': job['fromTime'],
+            'toTime': job['toTime'],
+            'completedAt': datetime.now(timezone.utc).isoformat()
+        }, sort_keys=True).encode('utf-8'),
+        ContentType='application/json'
+    )
+
+
+def on_finish(scheduler, checkpoints, s3_client, bucket, job, status, lambda_client=None):
+    """
+    Advance the checkpoint, or stop exporting a group after a failure.
+    Completed windows get their marker and are handed to the compactor
+    when one is configured.
+    """
+    if status == 'RUNNING':
+        # Still in flight; the manifest entry lets the next run resume it
+        return
+    if status == 'EXISTS':
+        checkpoints.finish(job, 'COMPLETED')
+        return
+    checkpoints.finish(job, status)
+    if status != 'COMPLETED':
+        print(f"Export of {job['logGroup']} failed, retrying from its checkpoint next run")
+        scheduler.discard(job['logGroup'])
+        return
+    mark_exported(s3_client, bucket, job)
+    if lambda_client and job['toTime'] - job['fromTime'] == HOUR_MS:
+        request_compaction(lambda_client, job)
+
+
+def request_compaction(lambda_client, job):
+    """Invoke the compactor asynchronously for an exported window"""
+    try:
+        lambda_client.invoke(
+            FunctionName=COMPACTOR_FUNCTION,
+            InvocationType='Event',
+            Payload=json.dumps({
+                'logGroup': job['logGroup'],
+                'fromTime': job['fromTime'],
+                'toTime': job['toTime']
+            }).encode('utf-8')
+        )
+    except Exception as e:
+        # The export itself succeeded; compaction can be rerun for the hour
+        print(f"Error requesting compaction for {job['logGroup']}: {str(e)}")
+
+
+def is_completion_event(event):
+    """True for S3 object-created notifications and scheduled check events"""
+    if event.get('action') == 'check':
+        return True
+    return any(record.get('eventSource') == 'aws:s3' for record in event.get('Records', []))
+
+
+def export_client():
+    """
+    Logs client for the export scheduler. botocore's retry modes treat
+    LimitExceededException as throttling; the scheduler paces the single
+    export slot itself, so this client does not retry on its own.
+    """
+    return aws_clients.client('logs', retries={'mode': 'standard', 'max_attempts': 1})
+
+
+def run_scheduler(logs_client, s3_client, s3_bucket, checkpoints, jobs, context, metrics,
+                  wait_budget_ms=None):
+    """
+    Run jobs through the export slot and keep the unsubmitted rest queued.
+    Emits the metrics of every finished export.
+
+    Args:
+        wait_budget_ms: Optional cap on the run time, used by async mode
+
+    Returns:
+        Tuple of (scheduler results, number of throttled calls)
+    """
+    lambda_client = aws_clients.client('lambda') if COMPACTOR_FUNCTION else None
+
+    def is_exported(job):
+        # Covered by the checkpoint (e.g. a stale queue entry), or marked
+        # complete by an earlier run or an overlapping invocation
+        through = checkpoints.exported_through(job['logGroup'])
+        if through is not None and through >= job['toTime']:
+            return True
+        return export_marker(s3_client, s3_bucket, job['destinationPrefix']) is not None
+
+    scheduler = ExportScheduler(
+        logs_client,
+        s3_bucket,
+        remaining_ms=context.get_remaining_time_in_millis,
+        sleep=metrics.sleep,
+        on_submit=checkpoints.start,
+        on_finish=lambda job, status: on_finish(
+            scheduler, checkpoints, s3_client, s3_bucket, job, status, lambda_client
+        ),
+        is_exported=is_exported,
+        budget_ms=wait_budget_ms
+    )
+    for job in jobs:
+        scheduler.add(job)
+
+    results = scheduler.run()
+    checkpoints.queue = [job for job in scheduler.queue if 'taskId' not in job]
+    checkpoints.save()
+
+    for result in results:
+        if result['status'] in ('RUNNING', 'EXISTS'):
             continue
-    
-    # Wait for tasks to complete (with timeout)
-    max_wait_time = 240  # 4 minutes
-    start_wait = time.time()
-    
-    while export_tasks and (time.time() - start_wait) < max_wait_time:
-        for task in export_tasks[:]:  # Create a copy to iterate over
+        size = 0
+        if result['status'] == 'COMPLETED':
             try:
-                response = logs_client.describe_export_tasks(
-                    taskId=task['taskId']
-                )
-                
-                if response['exportTasks']:
-                    status = response['exportTasks'][0]['status']['code']
-                    task['status'] = status
-                    
-                    if status in ['COMPLETED', 'FAILED', 'CANCELLED']:
-                        print(f"Export task {task['taskId']} for {task['logGroup']}: {status}")
-                        export_tasks.remove(task)
-                        
+                size = exported_bytes(s3_client, s3_bucket, f"{result['destinationPrefix']}/{result['taskId']}")
             except Exception as e:
-                print(f"Error checking task {task['taskId']}: {str(e)}")
-                export_tasks.remove(task)
-        
-        if export_tasks:
-            time.sleep(10)  # Wait 10 seconds before checking again
-    
+                print(f"Error measuring export of {result['logGroup']}: {str(e)}")
+        metrics.emit_export(result, size)
+
+    return results, scheduler.throttles
+
+
+def count_results(results):
+    """Completed (including already exported), running and failed export counts"""
+    completed = sum(1 for r in results if r['status'] in ('COMPLETED', 'EXISTS'))
+    running = sum(1 for r in results if r['status'] == 'RUNNING')
+    return completed, running, len(results) - completed - running
+
+
+def check_completion(event, context):
+    """
+    Confirm running export tasks and submit the next queued windows.
+
+    Invoked by S3 object-created events under cloudwatch-logs/ and by a
+    short schedule in async mode. Works only from the manifest, so it makes
+    no discovery calls and returns as soon as the slot is busy.
+    """
+
+    metrics = RunMetrics()
+    s3_client = aws_clients.client('s3')
+    s3_bucket = os.environ['S3_BUCKET']
+
+    checkpoints = CheckpointStore(s3_client, s3_bucket).load()
+    jobs = checkpoints.in_flight_jobs() + checkpoints.queue
+    if not jobs:
+        return {'statusCode': 200, 'body': json.dumps({'message': 'No exports pending'})}
+
+    results, throttles = run_scheduler(
+        export_client(), s3_client, s3_bucket, checkpoints, jobs, context, metrics,
+        wait_budget_ms=ASYNC_WAIT_SECONDS * 1000
+    )
+    successful_exports, running_exports, failed_exports = count_results(results)
+
+    metrics.emit_run({
+        'ExportsCompleted': successful_exports,
+        'ExportsFailed': failed_exports,
+        'ExportsPending': len(checkpoints.queue) + running_exports,
+        'Throttles': throttles
+    })
+
+    return {
+        'statusCode': 200,
+        'body': json.dumps({
+            'message': 'Checked export progress',
+            'successfulExports': successful_exports,
+            'runningExports': running_exports,
+            'failedExports': failed_exports,
+            'queuedExports': len(checkpoints.queue)
+        })
+    }
+
+
+def parse_time(value):
+    """Epoch ms from an ISO 8601 string (UTC unless an offset is given)"""
+    parsed = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return int(parsed.timestamp() * 1000)
+
+
+def backfill(event, context):
+    """
+    Export an arbitrary time range, e.g. for a postmortem.
+
+    The range is split into hourly or daily windows and run through the same
+    scheduler as the hourly export. Progress is kept in a manifest of its
+    own under cloudwatch-logs/_exporter/backfill/, so invoking the same
+    request again resumes where the last run stopped.
+
+    Event keys:
+        from, to: ISO 8601 times; from is rounded down and to up to the chunk
+        logGroups: Log group names (defaults to LOG_GROUPS)
+        chunk: 'hour' (default) or 'day'
+        id: Optional name for the request; derived from the other keys if absent
+    """
+
+    metrics = RunMetrics()
+    logs_client = aws_clients.client('logs')
+    s3_client = aws_clients.client('s3')
+    s3_bucket = os.environ['S3_BUCKET']
+    log_groups = event.get('logGroups') or json.loads(os.environ['LOG_GROUPS'])
+
+    window_ms = DAY_MS if event.get('chunk') == 'day' else HOUR_MS
+    from_time = parse_time(event['from']) // window_ms * window_ms
+    to_time = -(-parse_time(event['to']) // window_ms) * window_ms
+
+    request_id = event.get('id') or hashlib.sha1(json.dumps(
+        [event['from'], event['to'], sorted(log_groups), window_ms]
+    ).encode('utf-8')).hexdigest()[:12]
+    checkpoints = CheckpointStore(s3_client, s3_bucket, key=f'{BACKFILL_PREFIX}{request_id}.json').load()
+
+    if event.get('logGroups'):
+        # Requested groups need not be under the configured prefix
+        prefix = os.path.commonprefix(log_groups)
+    else:
+        prefix = os.environ.get('LOG_GROUP_PREFIX') or os.path.commonprefix(log_groups)
+    index = discover_log_groups(logs_client, prefix)
+    existing = [log_group for log_group in log_groups if log_group in index]
+    for log_group in sorted(set(log_groups) - set(existing)):
+        print(f"Log group {log_group} not found, skipping...")
+
+    jobs, outstanding, skipped = plan_exports(
+        existing, checkpoints, to_time,
+        max_windows=len(existing) * (to_time - from_time) // window_ms,
+        max_catchup_hours=(to_time - from_time) // HOUR_MS,
+        index=index,
+        last_activity=find_last_activity(logs_client, existing, index),
+        start_time=from_time,
+        window_ms=window_ms,
+        idle_cutoff=int(time.time() * 1000) - IDLE_GRACE_HOURS * HOUR_MS
+    )
+    for log_group, through in skipped.items():
+        checkpoints.skip(log_group, through)
+
+    print(f"Backfill {request_id}: {outstanding} window(s) left between {event['from']} and {event['to']}")
+    results, throttles = run_scheduler(export_client(), s3_client, s3_bucket, checkpoints, jobs, context, metrics)
+    successful_exports, running_exports, failed_exports = count_results(results)
+    pending_exports = outstanding - successful_exports - failed_exports
+
+    metrics.emit_run({
+        'ExportsCompleted': successful_exports,
+        'ExportsFailed': failed_exports,
+        'ExportsPending': pending_exports,
+        'Throttles': throttles
+    })
+
+    return {
+        'statusCode': 200,
+        'body': json.dumps({
+            'message': f'Backfill {request_id} ' + ('completed' if pending_exports == 0 and failed_exports == 0 else 'incomplete, invoke again to resume'),
+            'id': request_id,
+            'successfulExports': successful_exports,
+            'runningExports': running_exports,
+            'failedExports': failed_exports,
+            'pendingExports': pending_exports
+        })
+    }
+
+
+def handler(event, context):
+    """
+    Lambda function to export CloudWatch logs to S3
+    Runs hourly and exports every hour since each log group's last
+    checkpoint, oldest first, within a per-run budget
+    """
+
+    if is_completion_event(event):
+        return check_completion(event, context)
+    if event.get('action') == 'backfill':
+        return backfill(event, context)
+
+    metrics = RunMetrics()
+    logs_client = aws_clients.client('logs')
+    s3_client = aws_clients.client('s3')
+    s3_bucket = os.environ['S3_BUCKET']
+    log_groups = json.loads(os.environ['LOG_GROUPS'])
+
+    # Export up to the start of the current UTC hour
+    end_time = datetime.now(timezone.utc).replace(minute=0, second=0, microsecond=0)
+    to_time = int(end_time.timestamp() * 1000)
+
+    prefix = os.environ.get('LOG_GROUP_PREFIX') or os.path.commonprefix(log_groups)
+    index = discover_log_groups(logs_client, prefix)
+
+    existing = []
+    for log_group in log_groups:
+        if log_group not in index:
+            print(f"Log group {log_group} not found, skipping...")
+            continue
+        existing.append(log_group)
+
+    checkpoints = CheckpointStore(s3_client, s3_bucket).load()
+    last_activity = find_last_activity(logs_client, existing, index)
+    jobs, outstanding, skipped = plan_exports(
+        existing, checkpoints, to_time, index=index, last_activity=last_activity
+    )
+    for log_group, through in skipped.items():
+        print(f"No new events in {log_group}, skipping...")
+        checkpoints.skip(log_group, through)
+
+    results, throttles = run_scheduler(
+        export_client(), s3_client, s3_bucket, checkpoints, jobs, context, metrics,
+        wait_budget_ms=ASYNC_WAIT_SECONDS * 1000 if EXPORT_MODE == 'async' else None
+    )
+    successful_exports, running_exports, failed_exports = count_results(results)
+    pending_exports = outstanding - successful_exports - failed_exports
+
+    metrics.emit_run({
+        'ExportsCompleted': successful_exports,
+        'ExportsFailed': failed_exports,
+        'ExportsPending': pending_exports,
+        'LogGroupsSkipped': len(skipped),
+        'Throttles': throttles
+    })
+
     # Report final status
     result = {
         'statusCode': 200,
         'body': json.dumps({
-            'message': f'Log export completed for {start_time.strftime("%Y-%m-%d %H:00")}',
+            'message': f'Log export completed up to {end_time.strftime("%Y-%m-%d %H:00")} UTC',
             'totalLogGroups': len(log_groups),
             'successfulExports': successful_exports,
+            'runningExports': running_exports,
             'failedExports': failed_exports,
-            'timeRange': {
-                'from': start_time.isoformat(),
-                'to': end_time.isoformat()
-            }
+            'pendingExports': pending_exports,
+            'skippedLogGroups': sorted(skipped),
+            'oldestCheckpoint': datetime.fromtimestamp(min(
+                (checkpoints.exported_through(g) or to_time - HOUR_MS for g in existing),
+                default=to_time
+            ) / 1000, tz=timezone.utc).isoformat()
         })
     }
-    
+
     return result
+
+
+class LocalContext:
+    """Stand-in for the Lambda context when running from the command line"""
+
+    def __init__(self, minutes):
+        self.deadline = time.monotonic() + minutes * 60
+
+    def get_remaining_time_in_millis(self):
+        return int((self.deadline - time.monotonic()) * 1000)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Backfill CloudWatch log exports to S3')
+    parser.add_argument('--from', dest='from_time', required=True, help='Start, ISO 8601 (UTC)')
+    parser.add_argument('--to', dest='to_time', required=True, help='End, ISO 8601 (UTC)')
+    parser.add_argument('--log-group', dest='log_groups', action='append', help='Log group to export (repeatable)')
+    parser.add_argument('--chunk', choices=['hour', 'day'], default='hour')
+    parser.add_argument('--bucket', default=os.environ.get('S3_BUCKET'), help='Destination bucket (defaults to S3_BUCKET)')
+    parser.add_argument('--id', help='Name of the backfill, to resume it later')
+    parser.add_argument('--max-minutes', type=float, default=60, help='Stop after this long; rerun to resume')
+    args = parser.parse_args()
+
+    if not args.bucket:
+        parser.error('--bucket or S3_BUCKET is required')
+    os.environ['S3_BUCKET'] = args.bucket
+    if not args.log_groups and 'LOG_GROUPS' not in os.environ:
+        parser.error('--log-group or LOG_GROUPS is required')
+
+    print(backfill({
+        'from': args.from_time,
+        'to': args.to_time,
+        'logGroups': args.log_groups,
+        'chunk': args.chunk,
+        'id': args.id
+    }, LocalContext(args.max_minutes + SAFETY_MARGIN_MS / 60000))['body'])
@@ -0,0 +1,121 @@
+import base64
+import gzip
+import json
+import boto3
+import os
+from datetime import datetime, timezone
+
+# Upper bound on uncompressed bytes held for one service/hour before it is
+# written out, so a large delivery never holds everything in memory
+MAX_BATCH_BYTES = int(os.environ.get('MAX_BATCH_BYTES', 8 * 1024 * 1024))
+
+
+def decode_payload(data):
+    """
+    Decode a CloudWatch Logs subscription payload
+
+    Args:
+        data: The base64 string from event['awslogs']['data']
+
+    Returns:
+        Dict with messageType, logGroup, logStream and logEvents keys
+    """
+    return json.loads(gzip.decompress(base64.b64decode(data)))
+
+
+def format_event(event):
+    """Render an event the way create_export_task writes it"""
+    timestamp = datetime.fromtimestamp(event['timestamp'] / 1000, tz=timezone.utc)
+    return f"{timestamp.strftime('%Y-%m-%dT%H:%M:%S.')}{timestamp.microsecond // 1000:03d}Z {event['message']}\n"
+
+
+class HourlyBatcher:
+    """
+    Groups log events per log group and hour and writes each group as one
+    gzip object under the same cloudwatch-logs/<group>/<Y/M/D/H> layout the
+    hourly export tasks use.
+
+    Object names include the log stream and the first event ID of the batch,
+    so a redelivered payload overwrites its earlier copy instead of adding a
+    duplicate.
+
+    Args:
+        s3_client: boto3 S3 client (or any object with put_object)
+        bucket: Destination S3 bucket
+        max_batch_bytes: Uncompressed size at which a batch is flushed early
+    """
+
+    def __init__(self, s3_client, bucket, max_batch_bytes=MAX_BATCH_BYTES):
+        self.s3_client = s3_client
+        self.bucket = bucket
+        self.max_batch_bytes = max_batch_bytes
+        self.batches = {}
+        self.objects_written = 0
+        self.events_written = 0
+
+    def add(self, log_group, log_stream, events):
+        """Buffer events, flushing any batch that grows past the size limit"""
+        for event in events:
+            hour = datetime.fromtimestamp(event['timestamp'] / 1000, tz=timezone.utc).strftime('%Y/%m/%d/%H')
+            key = (log_group, log_stream, hour)
+            batch = self.batches.get(key)
+            if batch is None:
+                batch = self.batches[key] = {'firstId': event['id'], 'lines': [], 'bytes': 0}
+
+            line = format_event(event)
+            batch['lines'].append(line)
+            batch['bytes'] += len(line)
+
+            if batch['bytes'] >= self.max_batch_bytes:
+                self._write(key, self.batches.pop(key))
+
+    def flush(self):
+        """Write every buffered batch"""
+        for key in sorted(self.batches):
+            self._write(key, self.batches[key])
+        self.batches = {}
+
+    def _write(self, key, batch):
+        log_group, log_stream, hour = key
+        object_key = (
+            f"cloudwatch-logs/{log_group.replace('/', '-')}/{hour}/"
+            f"stream/{log_stream.replace('/', '-')}-{batch['firstId']}.gz"
+        )
+        self.s3_client.put_object(
+            Bucket=self.bucket,
+            Key=object_key,
+            Body=gzip.compress(''.join(batch['lines']).encode('utf-8')),
+            ContentType='text/plain',
+            ContentEncoding='gzip'
+        )
+        self.objects_written += 1
+        self.events_written += len(batch['lines'])
+
+
+def handler(event, context):
+    """
+    Lambda function behind the CloudWatch Logs subscription filters
+    Streams service logs to S3 as they arrive, as an alternative to the
+    hourly export tasks
+    """
+
+    payload = decode_payload(event['awslogs']['data'])
+    if payload['messageType'] != 'DATA_MESSAGE':
+        # CONTROL_MESSAGE is only sent to check the destination is reachable
+        return {'statusCode': 200, 'body': json.dumps({'message': 'Control message ignored'})}
+
+    batcher = HourlyBatcher(boto3.client('s3'), os.environ['S3_BUCKET'])
+    batcher.add(payload['logGroup'], payload['logStream'], payload['logEvents'])
+    # Nothing is kept across invocations; a recycled container would lose it
+    batcher.flush()
+
+    print(f"Shipped {batcher.events_written} events from {payload['logGroup']} in {batcher.objects_written} object(s)")
+
+    return {
+        'statusCode': 200,
+        'body': json.dumps({
+            'logGroup': payload['logGroup'],
+            'eventsWritten': batcher.events_written,
+            'objectsWritten': batcher.objects_written
+        })
+    }
@@ -0,0 +1,147 @@
+"""
+In-memory S3 and CloudWatch Logs stand-ins for the log export Lambdas
+
+The Lambdas in ../templates are deployed as index.py with aws_clients.py
+from the observability module next to them; both directories are put on
+sys.path so the tests import them under their source names.
+"""
+
+import io
+import os
+import sys
+
+import pytest
+
+TESTS_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(TESTS_DIR, '..', 'templates'))
+sys.path.insert(0, os.path.join(TESTS_DIR, '..', '..', 'observability', 'lambda'))
+
+FIXTURES_DIR = os.path.join(TESTS_DIR, 'fixtures')
+
+HOUR_MS = 3600 * 1000
+
+
+class S3StandIn:
+    """Bucket contents in a dict, with the calls the Lambdas make"""
+
+    class exceptions:
+        class NoSuchKey(Exception):
+            pass
+
+    def __init__(self):
+        self.objects = {}
+        self.calls = []
+
+    def get_object(self, Bucket, Key):
+        self.calls.append(('get_object', Key))
+        if (Bucket, Key) not in self.objects:
+            raise self.exceptions.NoSuchKey(Key)
+        return {'Body': io.BytesIO(self.objects[(Bucket, Key)]['Body'])}
+
+    def put_object(self, Bucket, Key, Body, **kwargs):
+        self.calls.append(('put_object', Key))
+        self.objects[(Bucket, Key)] = dict(kwargs, Body=Body)
+
+    def upload_file(self, Filename, Bucket, Key):
+        with open(Filename, 'rb') as source:
+            self.put_object(Bucket=Bucket, Key=Key, Body=source.read())
+
+    def list_objects_v2(self, Bucket, Prefix, **kwargs):
+        self.calls.append(('list_objects_v2', Prefix))
+        contents = [
+            {'Key': key, 'Size': len(obj['Body'])}
+            for (bucket, key), obj in sorted(self.objects.items())
+            if bucket == Bucket and key.startswith(Prefix)
+        ]
+        return {'Contents': contents, 'IsTruncated': False}
+
+    def keys(self, prefix=''):
+        return sorted(key for _, key in self.objects if key.startswith(prefix))
+
+
+class LogsStandIn:
+    """
+    Export tasks that complete as soon as they are described, writing one
+    object under their destination prefix. The next `throttles` submits
+    raise LimitExceededException, and with `running` set tasks never finish.
+    """
+
+    class exceptions:
+        class LimitExceededException(Exception):
+            pass
+
+    def __init__(self, s3):
+        self.s3 = s3
+        self.groups = {}
+        self.tasks = {}
+        self.created = []
+        self.throttles = 0
+        self.running = False
+
+    def add_group(self, name, last_event, stored_bytes=1024):
+        self.groups[name] = {'storedBytes': stored_bytes, 'lastEventTimestamp': last_event}
+
+    def describe_log_groups(self, limit, logGroupNamePrefix='', nextToken=None):
+        return {'logGroups': [
+            {'logGroupName': name, 'storedBytes': group['storedBytes']}
+            for name, group in sorted(self.groups.items())
+            if name.startswith(logGroupNamePrefix)
+        ]}
+
+    def describe_log_streams(self, logGroupName, orderBy, descending, limit):
+        last_event = self.groups[logGroupName]['lastEventTimestamp']
+        return {'logStreams': [{'lastEventTimestamp': last_event}] if last_event else []}
+
+    def create_export_task(self, logGroupName, fromTime, to, destination, destinationPrefix):
+        if self.throttles:
+            self.throttles -= 1
+            raise self.exceptions.LimitExceededException('Resource limit exceeded.')
+        task_id = f'task-{len(self.tasks) + 1}'
+        self.tasks[task_id] = {
+            'taskId': task_id,
+            'status': {'code': 'RUNNING' if self.running else 'COMPLETED'},
+            'executionInfo': {'creationTime': fromTime, 'completionTime': fromTime + 1000}
+        }
+        self.created.append((logGroupName, fromTime, to))
+        self.s3.put_object(Bucket=destination, Key=f'{destinationPrefix}/{task_id}/000000.gz', Body=b'logs')
+        return {'taskId': task_id}
+
+    def describe_export_tasks(self, taskId):
+        return {'exportTasks': [self.tasks[taskId]] if taskId in self.tasks else []}
+
+
+class Context:
+    """Lambda context with plenty of time left"""
+
+    def get_remaining_time_in_millis(self):
+        return 900000
+
+
+class Clock:
+    """Lambda context whose remaining time only passes while it sleeps"""
+
+    def __init__(self, remaining_ms=900000):
+        self.remaining = remaining_ms
+        self.sleeps = []
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.remaining -= seconds * 1000
+
+    def get_remaining_time_in_millis(self):
+        return self.remaining
+
+
+@pytest.fixture
+def s3():
+    return S3StandIn()
+
+
+@pytest.fixture
+def logs(s3):
+    return LogsStandIn(s3)
+
+
+@pytest.fixture
+def context():
+    return Context()
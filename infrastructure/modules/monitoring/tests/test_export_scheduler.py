@@ -0,0 +1,82 @@
+import pytest
+
+from conftest import HOUR_MS, Clock
+
+import log_exporter
+from log_exporter import AdaptiveBackoff, ExportScheduler
+
+BUCKET = 'exports'
+GROUP = '/ecs/sdt-dev/user-service'
+
+# 2024-03-01T00:00:00Z
+END = 1709251200000
+
+
+@pytest.fixture(autouse=True)
+def longest_delay(monkeypatch):
+    # Jitter picks the top of each backoff range, so delays are predictable
+    monkeypatch.setattr(log_exporter.random, 'uniform', lambda low, high: high)
+
+
+def scheduler(logs, clock, hours=2):
+    export = ExportScheduler(logs, BUCKET, remaining_ms=clock.get_remaining_time_in_millis, sleep=clock.sleep)
+    for from_time in range(END - hours * HOUR_MS, END, HOUR_MS):
+        export.add({
+            'logGroup': GROUP,
+            'fromTime': from_time,
+            'toTime': from_time + HOUR_MS,
+            'destinationPrefix': log_exporter.destination_prefix(GROUP, from_time)
+        })
+    return export
+
+
+def test_backoff_grows_while_throttled_and_decays_after():
+    backoff = AdaptiveBackoff(initial=2.0, maximum=10.0)
+
+    assert [backoff.throttled() for _ in range(5)] == [2.0, 4.0, 8.0, 10.0, 10.0]
+    backoff.succeeded()
+    assert backoff.delay == 5.0
+    backoff.succeeded()
+    backoff.succeeded()
+    assert backoff.delay == 0.0
+
+
+def test_throttled_submit_backs_off_and_recovers(logs):
+    logs.throttles = 3
+    clock = Clock(log_exporter.SAFETY_MARGIN_MS + 600000)
+    export = scheduler(logs, clock)
+
+    results = export.run()
+
+    assert clock.sleeps == [2.0, 4.0, 8.0]
+    assert [(r['status'], r['retries']) for r in results] == [('COMPLETED', 3), ('COMPLETED', 0)]
+    assert (export.throttles, len(logs.created)) == (3, 2)
+    # The delay halves with each successful submit
+    assert export.submit_backoff.delay == 2.0
+
+
+def test_throttling_stops_before_the_deadline(logs):
+    logs.throttles = 100
+    clock = Clock(log_exporter.SAFETY_MARGIN_MS + 20000)
+    export = scheduler(logs, clock)
+
+    results = export.run()
+
+    # A fourth delay of 16 seconds would run into the safety margin
+    assert clock.sleeps == [2.0, 4.0, 8.0]
+    assert clock.remaining > log_exporter.SAFETY_MARGIN_MS
+    assert (results, len(export.queue), export.stopped) == ([], 2, True)
+
+
+def test_running_task_is_left_before_the_deadline(logs):
+    logs.running = True
+    clock = Clock(log_exporter.SAFETY_MARGIN_MS + 10000)
+    export = scheduler(logs, clock)
+
+    results = export.run()
+
+    assert clock.remaining > log_exporter.SAFETY_MARGIN_MS
+    assert [(r['taskId'], r['status']) for r in results] == [('task-1', 'RUNNING')]
+    # The next hour stays queued rather than being submitted behind it
+    assert len(logs.created) == 1
+    assert len(export.queue) == 1
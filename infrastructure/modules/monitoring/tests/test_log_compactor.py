@@ -0,0 +1,43 @@
+import gzip
+import io
+import json
+from datetime import datetime, timezone
+
+import pyarrow.parquet as pq
+
+import log_compactor
+
+BUCKET = 'exports'
+GROUP = '/ecs/sdt/dev/user-service'
+SOURCE = 'cloudwatch-logs/-ecs-sdt-dev-user-service'
+HOUR = datetime(2024, 3, 1, 0, tzinfo=timezone.utc)
+
+
+def export_object(*lines):
+    return gzip.compress(''.join(line + '\n' for line in lines).encode('utf-8'))
+
+
+def test_daily_chunk_of_the_same_day_is_not_read(s3):
+    s3.put_object(Bucket=BUCKET, Key=f'{SOURCE}/2024/03/01/00/task-1/web/000000.gz', Body=export_object(
+        '2024-03-01T00:00:01.000Z 2024-03-01 00:00:01.000  INFO 1 --- [main] c.s.App : Started'
+    ))
+    s3.put_object(Bucket=BUCKET, Key=f'{SOURCE}/daily/2024/03/01/task-2/web/000000.gz', Body=export_object(
+        '2024-03-01T00:00:01.000Z 2024-03-01 00:00:01.000  INFO 1 --- [main] c.s.App : Started'
+    ))
+
+    result = log_compactor.compact_hour(s3, BUCKET, GROUP, HOUR)
+
+    assert result['rows'] == 1
+    table = pq.read_table(io.BytesIO(s3.objects[(BUCKET, result['key'])]['Body']))
+    assert table.column('message').to_pylist() == ['Started']
+
+
+def test_handler_skips_daily_windows(s3, monkeypatch):
+    monkeypatch.setenv('S3_BUCKET', BUCKET)
+    monkeypatch.setattr(log_compactor.boto3, 'client', lambda service: s3)
+    from_time = int(HOUR.timestamp() * 1000)
+
+    response = log_compactor.handler({'logGroup': GROUP, 'fromTime': from_time, 'toTime': from_time + 86400000}, None)
+
+    assert json.loads(response['body']) == {'compactedFiles': 0, 'rows': 0}
+    assert s3.calls == []
@@ -0,0 +1,183 @@
+import json
+
+from conftest import HOUR_MS, Clock
+
+import log_exporter
+
+BUCKET = 'exports'
+GROUP = '/ecs/sdt-dev/user-service'
+
+# 2024-03-01T00:00:00Z
+END = 1709251200000
+
+
+def use_stand_ins(monkeypatch, s3, logs):
+    """Route the handler's clients to the stand-ins and start with no discovery cache"""
+    monkeypatch.setenv('S3_BUCKET', BUCKET)
+    monkeypatch.setattr(log_exporter.aws_clients, 'client', lambda service, **config: {'logs': logs, 's3': s3}[service])
+    monkeypatch.setattr(log_exporter, '_discovery_cache', {'prefix': None, 'expires': 0, 'index': None})
+
+
+def export_run(s3, logs, context, end_time, **plan_options):
+    """One hourly run against the stand-ins; returns the reloaded checkpoints"""
+    checkpoints = log_exporter.CheckpointStore(s3, BUCKET).load()
+    jobs, _, skipped = log_exporter.plan_exports([GROUP], checkpoints, end_time, **plan_options)
+    for log_group, through in skipped.items():
+        checkpoints.skip(log_group, through)
+    log_exporter.run_scheduler(
+        logs, s3, BUCKET, checkpoints, jobs, context, log_exporter.RunMetrics(sleep=lambda seconds: None)
+    )
+    return log_exporter.CheckpointStore(s3, BUCKET).load()
+
+
+def test_stale_checkpoint_catches_up(s3, logs, context):
+    checkpoints = log_exporter.CheckpointStore(s3, BUCKET)
+    checkpoints.advance(GROUP, END - 30 * HOUR_MS)
+    checkpoints.save()
+
+    checkpoints = export_run(s3, logs, context, END, max_catchup_hours=24)
+
+    assert checkpoints.exported_through(GROUP) == END
+    assert [from_time for _, from_time, _ in logs.created] == list(range(END - 24 * HOUR_MS, END, HOUR_MS))
+
+    # The next run only has the new hour left
+    export_run(s3, logs, context, END + HOUR_MS, max_catchup_hours=24)
+    assert logs.created[-1][1] == END
+    assert len(logs.created) == 25
+
+
+def test_stale_checkpoint_moves_even_when_budget_is_cut(s3):
+    checkpoints = log_exporter.CheckpointStore(s3, BUCKET)
+    checkpoints.advance(GROUP, END - 30 * HOUR_MS)
+
+    jobs, outstanding, _ = log_exporter.plan_exports(
+        [GROUP], checkpoints, END, max_windows=4, max_catchup_hours=24
+    )
+
+    assert checkpoints.exported_through(GROUP) == END - 24 * HOUR_MS
+    assert jobs[0]['fromTime'] == END - 24 * HOUR_MS
+    assert (len(jobs), outstanding) == (4, 24)
+
+
+def test_rerun_of_exported_hour_does_nothing(s3, logs, context):
+    export_run(s3, logs, context, END)
+    checkpoints = log_exporter.CheckpointStore(s3, BUCKET).load()
+    checkpoints.log_groups[GROUP].pop('exportedThrough')
+    checkpoints.save()
+
+    export_run(s3, logs, context, END)
+
+    assert len(logs.created) == 1
+    assert s3.keys(f'cloudwatch-logs/{GROUP.replace("/", "-")}/2024/02/29/23/') == [
+        'cloudwatch-logs/-ecs-sdt-dev-user-service/2024/02/29/23/_COMPLETED.json',
+        'cloudwatch-logs/-ecs-sdt-dev-user-service/2024/02/29/23/task-1/000000.gz'
+    ]
+
+
+def test_idle_skip_leaves_newest_hour(s3):
+    checkpoints = log_exporter.CheckpointStore(s3, BUCKET)
+    checkpoints.advance(GROUP, END - 5 * HOUR_MS)
+
+    jobs, _, skipped = log_exporter.plan_exports([GROUP], checkpoints, END, last_activity={GROUP: None})
+
+    assert jobs == []
+    assert skipped == {GROUP: END - HOUR_MS}
+
+
+def test_idle_hours_after_last_event_stop_before_newest_hour(s3):
+    checkpoints = log_exporter.CheckpointStore(s3, BUCKET)
+    checkpoints.advance(GROUP, END - 5 * HOUR_MS)
+
+    jobs, _, skipped = log_exporter.plan_exports(
+        [GROUP], checkpoints, END, last_activity={GROUP: END - 3 * HOUR_MS + 1}
+    )
+
+    assert [job['fromTime'] for job in jobs] == [END - 5 * HOUR_MS, END - 4 * HOUR_MS, END - 3 * HOUR_MS]
+    assert jobs[-1]['advanceTo'] == END - HOUR_MS
+    assert skipped == {}
+
+
+def test_idle_group_without_checkpoint_rechecks_newest_hour(s3, logs, context):
+    checkpoints = export_run(s3, logs, context, END, last_activity={GROUP: None})
+    assert checkpoints.exported_through(GROUP) == END - HOUR_MS
+
+    # Activity that only showed up after the run is still exported
+    checkpoints = export_run(s3, logs, context, END + HOUR_MS, last_activity={GROUP: END - 1})
+    assert [from_time for _, from_time, _ in logs.created] == [END - HOUR_MS]
+    assert checkpoints.exported_through(GROUP) == END
+
+
+def test_daily_chunks_stay_out_of_hourly_layout():
+    assert log_exporter.destination_prefix(GROUP, END, log_exporter.HOUR_MS) == \
+        'cloudwatch-logs/-ecs-sdt-dev-user-service/2024/03/01/00'
+    assert log_exporter.destination_prefix(GROUP, END, log_exporter.DAY_MS) == \
+        'cloudwatch-logs/-ecs-sdt-dev-user-service/daily/2024/03/01'
+
+
+def test_backfill_finds_groups_outside_the_configured_prefix(s3, logs, context, monkeypatch):
+    use_stand_ins(monkeypatch, s3, logs)
+    monkeypatch.setenv('LOG_GROUP_PREFIX', '/ecs/sdt-dev/')
+    logs.add_group(GROUP, END)
+    logs.add_group('/aws/lambda/sdt-dev-log-exporter', END)
+
+    response = log_exporter.backfill({
+        'action': 'backfill',
+        'from': '2024-02-29T23:00:00Z',
+        'to': '2024-03-01T00:00:00Z',
+        'logGroups': [GROUP, '/aws/lambda/sdt-dev-log-exporter']
+    }, context)
+
+    assert json.loads(response['body'])['successfulExports'] == 2
+    assert sorted(log_group for log_group, _, _ in logs.created) == ['/aws/lambda/sdt-dev-log-exporter', GROUP]
+
+
+def test_completion_check_advances_only_after_the_task_completes(s3, logs, monkeypatch):
+    use_stand_ins(monkeypatch, s3, logs)
+    clock = Clock()
+    metrics = log_exporter.RunMetrics
+    monkeypatch.setattr(log_exporter, 'RunMetrics', lambda: metrics(sleep=clock.sleep))
+    s3_event = {'Records': [{'eventSource': 'aws:s3', 's3': {'object': {'key': 'cloudwatch-logs/x/000000.gz'}}}]}
+
+    # An async run leaves the task running when its wait budget is spent
+    checkpoints = log_exporter.CheckpointStore(s3, BUCKET)
+    checkpoints.advance(GROUP, END - HOUR_MS)
+    logs.running = True
+    jobs, _, _ = log_exporter.plan_exports([GROUP], checkpoints, END)
+    log_exporter.run_scheduler(
+        logs, s3, BUCKET, checkpoints, jobs, clock, log_exporter.RunMetrics(), wait_budget_ms=20000
+    )
+
+    log_exporter.handler(s3_event, clock)
+    checkpoints = log_exporter.CheckpointStore(s3, BUCKET).load()
+    assert checkpoints.exported_through(GROUP) == END - HOUR_MS
+    assert checkpoints.in_flight(GROUP)['taskId'] == 'task-1'
+
+    logs.tasks['task-1']['status']['code'] = 'COMPLETED'
+    log_exporter.handler({'action': 'check'}, clock)
+    checkpoints = log_exporter.CheckpointStore(s3, BUCKET).load()
+    assert checkpoints.exported_through(GROUP) == END
+    assert checkpoints.in_flight(GROUP) is None
+    assert log_exporter.export_marker(s3, BUCKET, jobs[0]['destinationPrefix'])['taskId'] == 'task-1'
+    assert len(logs.created) == 1
+
+
+def test_redelivered_completion_event_does_not_export_again(s3, logs, monkeypatch):
+    use_stand_ins(monkeypatch, s3, logs)
+    s3_event = {'Records': [{'eventSource': 'aws:s3', 's3': {'object': {'key': 'cloudwatch-logs/x/000000.gz'}}}]}
+    checkpoints = log_exporter.CheckpointStore(s3, BUCKET)
+    checkpoints.advance(GROUP, END - HOUR_MS)
+    jobs, _, _ = log_exporter.plan_exports([GROUP], checkpoints, END)
+    checkpoints.queue = jobs
+    checkpoints.save()
+
+    log_exporter.handler(s3_event, Clock())
+    # The same event again, and a stale queue entry for the exported window
+    response = log_exporter.handler(s3_event, Clock())
+    checkpoints = log_exporter.CheckpointStore(s3, BUCKET).load()
+    checkpoints.queue = jobs
+    checkpoints.save()
+    log_exporter.handler(s3_event, Clock())
+
+    assert json.loads(response['body']) == {'message': 'No exports pending'}
+    assert len(logs.created) == 1
+    assert log_exporter.CheckpointStore(s3, BUCKET).load().exported_through(GROUP) == END
@@ -0,0 +1,102 @@
+import gzip
+import json
+import os
+
+from conftest import FIXTURES_DIR
+
+import log_shipper
+
+BUCKET = 'exports'
+PREFIX = 'cloudwatch-logs/-ecs-sdt-dev-user-service'
+STREAM = 'ecs-user-service-3f2b9c1de4a54b0c8d7e6f5a4b3c2d1e'
+
+
+def recorded_event(name):
+    with open(os.path.join(FIXTURES_DIR, name)) as fixture:
+        return json.load(fixture)
+
+
+def recorded_payload():
+    return log_shipper.decode_payload(recorded_event('subscription_data_message.json')['awslogs']['data'])
+
+
+def test_decode_payload():
+    payload = recorded_payload()
+
+    assert payload['messageType'] == 'DATA_MESSAGE'
+    assert payload['logGroup'] == '/ecs/sdt/dev/user-service'
+    assert [event['timestamp'] for event in payload['logEvents']] == [1709247598120, 1709247599987, 1709247600004]
+
+
+def test_batches_per_hour(s3):
+    payload = recorded_payload()
+    batcher = log_shipper.HourlyBatcher(s3, BUCKET)
+
+    batcher.add(payload['logGroup'], payload['logStream'], payload['logEvents'])
+    assert s3.objects == {}
+    batcher.flush()
+
+    first_ids = [event['id'] for event in payload['logEvents']]
+    assert s3.keys() == [
+        f'{PREFIX}/2024/02/29/22/stream/{STREAM}-{first_ids[0]}.gz',
+        f'{PREFIX}/2024/02/29/23/stream/{STREAM}-{first_ids[2]}.gz'
+    ]
+    assert (batcher.objects_written, batcher.events_written) == (2, 3)
+
+
+def test_flushed_objects_use_export_task_format(s3):
+    payload = recorded_payload()
+    batcher = log_shipper.HourlyBatcher(s3, BUCKET)
+    batcher.add(payload['logGroup'], payload['logStream'], payload['logEvents'])
+    batcher.flush()
+
+    obj = s3.objects[(BUCKET, s3.keys(f'{PREFIX}/2024/02/29/22/')[0])]
+    lines = gzip.decompress(obj['Body']).decode('utf-8').splitlines()
+
+    assert obj['ContentEncoding'] == 'gzip'
+    assert lines == [
+        '2024-02-29T22:59:58.120Z ' + payload['logEvents'][0]['message'],
+        '2024-02-29T22:59:59.987Z ' + payload['logEvents'][1]['message']
+    ]
+
+
+def test_large_batch_is_written_early(s3):
+    payload = recorded_payload()
+    batcher = log_shipper.HourlyBatcher(s3, BUCKET, max_batch_bytes=1)
+
+    batcher.add(payload['logGroup'], payload['logStream'], payload['logEvents'])
+
+    assert batcher.objects_written == 3
+    assert batcher.batches == {}
+
+
+def test_redelivery_overwrites_objects(s3):
+    payload = recorded_payload()
+    for _ in range(2):
+        batcher = log_shipper.HourlyBatcher(s3, BUCKET)
+        batcher.add(payload['logGroup'], payload['logStream'], payload['logEvents'])
+        batcher.flush()
+
+    assert len(s3.keys()) == 2
+
+
+def test_handler_ships_recorded_payload(s3, monkeypatch):
+    monkeypatch.setenv('S3_BUCKET', BUCKET)
+    monkeypatch.setattr(log_shipper.boto3, 'client', lambda service: s3)
+
+    response = log_shipper.handler(recorded_event('subscription_data_message.json'), None)
+
+    assert json.loads(response['body']) == {
+        'logGroup': '/ecs/sdt/dev/user-service',
+        'eventsWritten': 3,
+        'objectsWritten': 2
+    }
+
+
+def test_handler_ignores_control_message(s3, monkeypatch):
+    monkeypatch.setattr(log_shipper.boto3, 'client', lambda service: s3)
+
+    response = log_shipper.handler(recorded_event('subscription_control_message.json'), None)
+
+    assert json.loads(response['body']) == {'message': 'Control message ignored'}
+    assert s3.objects == {}
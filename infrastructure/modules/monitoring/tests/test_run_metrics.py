@@ -0,0 +1,68 @@
+import json
+import os
+import re
+
+from conftest import TESTS_DIR
+
+import log_exporter
+
+ALARMS_TF = os.path.join(TESTS_DIR, '..', 'alarms.tf')
+
+
+def log_export_alarms():
+    """(metric_name, dimension names) of every alarm on the LogExport namespace in alarms.tf"""
+    with open(ALARMS_TF) as source:
+        blocks = re.split(r'\nresource ', source.read())
+    alarms = []
+    for block in blocks:
+        if 'namespace           = "${upper(var.project_name)}/LogExport"' not in block:
+            continue
+        metric_name = re.search(r'metric_name\s*=\s*"(\w+)"', block).group(1)
+        dimensions = re.search(r'dimensions = \{(.*?)\}', block, re.S).group(1)
+        alarms.append((metric_name, sorted(re.findall(r'(\w+)\s*=', dimensions))))
+    return alarms
+
+
+def emitted(capsys, emit):
+    emit(log_exporter.RunMetrics(clock=lambda: 0.0, sleep=lambda seconds: None))
+    return json.loads(capsys.readouterr().out)
+
+
+def test_run_record_matches_the_alarms(capsys):
+    record = emitted(capsys, lambda metrics: metrics.emit_run({
+        'ExportsCompleted': 3, 'ExportsFailed': 1, 'ExportsPending': 2, 'LogGroupsSkipped': 0, 'Throttles': 4
+    }))
+    directive, = record['_aws']['CloudWatchMetrics']
+    names = [metric['Name'] for metric in directive['Metrics']]
+
+    # alarms.tf selects "${upper(var.project_name)}/LogExport"
+    assert directive['Namespace'] == f'{log_exporter.PROJECT_NAME.upper()}/LogExport'
+    assert directive['Dimensions'] == [['Environment']]
+    assert record['Environment'] == log_exporter.ENVIRONMENT
+    assert names == ['WallTime', 'SleepTime', 'WorkTime', 'ExportsCompleted', 'ExportsFailed',
+                     'ExportsPending', 'LogGroupsSkipped', 'Throttles']
+    assert (record['ExportsFailed'], record['ExportsPending']) == (1, 2)
+
+    alarms = log_export_alarms()
+    assert {metric_name for metric_name, _ in alarms} == {'ExportsFailed', 'ExportsPending', 'WallTime'}
+    for metric_name, dimensions in alarms:
+        assert metric_name in names
+        assert dimensions == directive['Dimensions'][0]
+
+
+def test_export_record_is_per_log_group(capsys):
+    record = emitted(capsys, lambda metrics: metrics.emit_export({
+        'taskId': 'task-1', 'logGroup': '/ecs/sdt/dev/user-service', 'status': 'COMPLETED',
+        'retries': 2, 'durationMs': 4500
+    }, 65536))
+    directive, = record['_aws']['CloudWatchMetrics']
+
+    assert directive['Namespace'] == log_exporter.METRICS_NAMESPACE
+    assert directive['Dimensions'] == [['Environment', 'LogGroup']]
+    assert [(metric['Name'], metric['Unit']) for metric in directive['Metrics']] == [
+        ('ExportRetries', 'Count'), ('BytesExported', 'Bytes'), ('SubmitToCompleteTime', 'Milliseconds')
+    ]
+    assert {key: record[key] for key in ('LogGroup', 'taskId', 'status', 'ExportRetries', 'BytesExported')} == {
+        'LogGroup': '/ecs/sdt/dev/user-service', 'taskId': 'task-1', 'status': 'COMPLETED',
+        'ExportRetries': 2, 'BytesExported': 65536
+    }
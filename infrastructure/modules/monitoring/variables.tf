@@ -84,6 +84,70 @@ variable "app_logs_bucket_arn" {
   default     = ""
 }
 
+variable "log_export_max_windows_per_run" {
+  description = "Maximum number of hourly export windows a single log export run may submit"
+  type        = number
+  default     = 48
+}
+
+variable "log_export_max_catchup_hours" {
+  description = "How many hours behind a log group's export checkpoint may fall before older hours are skipped"
+  type        = number
+  default     = 24
+}
+
+variable "log_export_engine" {
+  description = "Engine used to ship ECS logs to S3: 'batch' runs hourly export tasks, 'streaming' ships events through subscription filters as they arrive"
+  type        = string
+  default     = "batch"
+
+  validation {
+    condition     = contains(["batch", "streaming"], var.log_export_engine)
+    error_message = "log_export_engine must be either \"batch\" or \"streaming\"."
+  }
+}
+
+variable "log_export_mode" {
+  description = "How the log exporter tracks export tasks: 'wait' polls until each task finishes, 'async' submits and confirms completion from S3 events and a 5-minute check (manages the app logs bucket notification)"
+  type        = string
+  default     = "wait"
+
+  validation {
+    condition     = contains(["wait", "async"], var.log_export_mode)
+    error_message = "log_export_mode must be either \"wait\" or \"async\"."
+  }
+}
+
+variable "enable_log_compaction" {
+  description = "Rewrite exported log hours as Parquet under cloudwatch-logs-parquet/ in the app logs bucket"
+  type        = bool
+  default     = false
+}
+
+variable "log_compaction_layer_arns" {
+  description = "Lambda layers providing pyarrow for the log compactor (e.g. the AWS SDK for pandas Python 3.11 layer)"
+  type        = list(string)
+  default     = []
+}
+
+variable "cost_anomaly_threshold" {
+  description = "CostAnomalyScore (robust standard deviations above the baseline) that raises the cost anomaly alarms"
+  type        = number
+  default     = 4
+}
+
+variable "cost_anomaly_services" {
+  description = "Friendly service names (as published in ServiceName) with their own cost anomaly alarm"
+  type        = list(string)
+  default     = ["RDS", "VPC"]
+}
+
+variable "monthly_cost_budget" {
+  description = "Alarm when ProjectedMonthEndCost exceeds this amount in USD (0 disables the alarm)"
+  type        = number
+  default     = 0
+}
+
 variable "service_names" {
   description = "List of service names for log export"
   type        = list(string)
@@ -2,6 +2,8 @@
 
 # IAM role for Lambda
 resource "aws_iam_role" "cost_exporter_lambda" {
+  count = var.enable_cost_exporter ? 1 : 0
+
   name = "${var.project_name}-${var.environment}-cost-exporter"
 
   assume_role_policy = jsonencode({
@@ -22,8 +24,10 @@ resource "aws_iam_role" "cost_exporter_lambda" {
 
 # Policy for Lambda to access Cost Explorer and write to CloudWatch
 resource "aws_iam_role_policy" "cost_exporter_lambda" {
+  count = var.enable_cost_exporter ? 1 : 0
+
   name = "cost-exporter-policy"
-  role = aws_iam_role.cost_exporter_lambda.id
+  role = aws_iam_role.cost_exporter_lambda[0].id
 
   policy = jsonencode({
     Version = "2012-10-17"
@@ -43,6 +47,21 @@ resource "aws_iam_role_policy" "cost_exporter_lambda" {
         ]
         Resource = "*"
       },
+      {
+        Effect = "Allow"
+        Action = [
+          "s3:ListBucket"
+        ]
+        Resource = aws_s3_bucket.cost_cache[0].arn
+      },
+      {
+        Effect = "Allow"
+        Action = [
+          "s3:GetObject",
+          "s3:PutObject"
+        ]
+        Resource = "${aws_s3_bucket.cost_cache[0].arn}/*"
+      },
       {
         Effect = "Allow"
         Action = [
@@ -58,9 +77,11 @@ resource "aws_iam_role_policy" "cost_exporter_lambda" {
 
 # Lambda function code
 resource "aws_lambda_function" "cost_exporter" {
+  count = var.enable_cost_exporter ? 1 : 0
+
   filename         = "${path.module}/lambda/cost_exporter.zip"
   function_name    = "${var.project_name}-${var.environment}-cost-exporter"
-  role             = aws_iam_role.cost_exporter_lambda.arn
+  role             = aws_iam_role.cost_exporter_lambda[0].arn
   handler          = "index.handler"
   source_code_hash = data.archive_file.cost_exporter_lambda.output_base64sha256
   runtime          = "python3.11"
@@ -68,8 +89,25 @@ resource "aws_lambda_function" "cost_exporter" {
 
   environment {
     variables = {
-      PROJECT_NAME = var.project_name
-      ENVIRONMENT  = var.environment
+      PROJECT_NAME      = var.project_name
+      ENVIRONMENT       = var.environment
+      COST_CACHE_BUCKET = aws_s3_bucket.cost_cache[0].id
+      COST_CACHE_DAYS   = var.cost_cache_days
+      COST_FORECAST     = tostring(var.enable_cost_forecast)
+      COST_CONFIG = jsonencode({
+        dimensions = var.cost_dimensions
+        maxSeries  = var.cost_max_series
+        split = length(var.cost_targets) > 0 ? {
+          key = var.cost_split_by
+          targets = [
+            for target in var.cost_targets : {
+              project     = coalesce(target.project, var.project_name)
+              environment = target.environment
+              values      = target.values != null ? target.values : [target.environment]
+            }
+          ]
+        } : null
+      })
     }
   }
 
@@ -85,11 +123,81 @@ data "archive_file" "cost_exporter_lambda" {
     content  = file("${path.module}/lambda/cost_exporter.py")
     filename = "index.py"
   }
+
+  source {
+    content  = file("${path.module}/lambda/metric_publisher.py")
+    filename = "metric_publisher.py"
+  }
+
+  source {
+    content  = file("${path.module}/lambda/cost_cache.py")
+    filename = "cost_cache.py"
+  }
+
+  source {
+    content  = file("${path.module}/lambda/cost_config.py")
+    filename = "cost_config.py"
+  }
+
+  source {
+    content  = file("${path.module}/lambda/cost_analysis.py")
+    filename = "cost_analysis.py"
+  }
+
+  source {
+    content  = file("${path.module}/lambda/aws_clients.py")
+    filename = "aws_clients.py"
+  }
+
+  source {
+    content  = file("${path.module}/lambda/cost_records.py")
+    filename = "cost_records.py"
+  }
+}
+
+# S3 bucket for the daily cost cache, so finalized days are not fetched again
+resource "aws_s3_bucket" "cost_cache" {
+  count = var.enable_cost_exporter ? 1 : 0
+
+  bucket = "${var.project_name}-${var.environment}-cost-cache"
+
+  tags = merge(
+    var.tags,
+    {
+      Name    = "${var.project_name}-${var.environment}-cost-cache"
+      Purpose = "Cost Explorer results cache"
+    }
+  )
+}
+
+resource "aws_s3_bucket_server_side_encryption_configuration" "cost_cache" {
+  count = var.enable_cost_exporter ? 1 : 0
+
+  bucket = aws_s3_bucket.cost_cache[0].id
+
+  rule {
+    apply_server_side_encryption_by_default {
+      sse_algorithm = "AES256"
+    }
+  }
+}
+
+resource "aws_s3_bucket_public_access_block" "cost_cache" {
+  count = var.enable_cost_exporter ? 1 : 0
+
+  bucket = aws_s3_bucket.cost_cache[0].id
+
+  block_public_acls       = true
+  block_public_policy     = true
+  ignore_public_acls      = true
+  restrict_public_buckets = true
 }
 
 # CloudWatch log group for Lambda
 resource "aws_cloudwatch_log_group" "cost_exporter" {
-  name              = "/aws/lambda/${aws_lambda_function.cost_exporter.function_name}"
+  count = var.enable_cost_exporter ? 1 : 0
+
+  name              = "/aws/lambda/${aws_lambda_function.cost_exporter[0].function_name}"
   retention_in_days = 7
 
   tags = var.tags
@@ -97,6 +205,8 @@ resource "aws_cloudwatch_log_group" "cost_exporter" {
 
 # EventBridge rule to trigger Lambda daily at 00:00 UTC
 resource "aws_cloudwatch_event_rule" "cost_exporter_daily" {
+  count = var.enable_cost_exporter ? 1 : 0
+
   name                = "${var.project_name}-${var.environment}-cost-exporter-daily"
   description         = "Trigger cost exporter Lambda daily"
   schedule_expression = "cron(0 0 * * ? *)"
@@ -106,16 +216,72 @@ resource "aws_cloudwatch_event_rule" "cost_exporter_daily" {
 
 # EventBridge target
 resource "aws_cloudwatch_event_target" "cost_exporter_daily" {
-  rule      = aws_cloudwatch_event_rule.cost_exporter_daily.name
+  count = var.enable_cost_exporter ? 1 : 0
+
+  rule      = aws_cloudwatch_event_rule.cost_exporter_daily[0].name
   target_id = "CostExporterLambda"
-  arn       = aws_lambda_function.cost_exporter.arn
+  arn       = aws_lambda_function.cost_exporter[0].arn
 }
 
 # Lambda permission for EventBridge
 resource "aws_lambda_permission" "cost_exporter_eventbridge" {
+  count = var.enable_cost_exporter ? 1 : 0
+
   statement_id  = "AllowExecutionFromEventBridge"
   action        = "lambda:InvokeFunction"
-  function_name = aws_lambda_function.cost_exporter.function_name
+  function_name = aws_lambda_function.cost_exporter[0].function_name
   principal     = "events.amazonaws.com"
-  source_arn    = aws_cloudwatch_event_rule.cost_exporter_daily.arn
+  source_arn    = aws_cloudwatch_event_rule.cost_exporter_daily[0].arn
+}
+
+# The resources above gained count with enable_cost_exporter; keep the
+# existing ones instead of replacing them at index 0
+moved {
+  from = aws_iam_role.cost_exporter_lambda
+  to   = aws_iam_role.cost_exporter_lambda[0]
+}
+
+moved {
+  from = aws_iam_role_policy.cost_exporter_lambda
+  to   = aws_iam_role_policy.cost_exporter_lambda[0]
+}
+
+moved {
+  from = aws_lambda_function.cost_exporter
+  to   = aws_lambda_function.cost_exporter[0]
+}
+
+moved {
+  from = aws_s3_bucket.cost_cache
+  to   = aws_s3_bucket.cost_cache[0]
+}
+
+moved {
+  from = aws_s3_bucket_server_side_encryption_configuration.cost_cache
+  to   = aws_s3_bucket_server_side_encryption_configuration.cost_cache[0]
+}
+
+moved {
+  from = aws_s3_bucket_public_access_block.cost_cache
+  to   = aws_s3_bucket_public_access_block.cost_cache[0]
+}
+
+moved {
+  from = aws_cloudwatch_log_group.cost_exporter
+  to   = aws_cloudwatch_log_group.cost_exporter[0]
+}
+
+moved {
+  from = aws_cloudwatch_event_rule.cost_exporter_daily
+  to   = aws_cloudwatch_event_rule.cost_exporter_daily[0]
+}
+
+moved {
+  from = aws_cloudwatch_event_target.cost_exporter_daily
+  to   = aws_cloudwatch_event_target.cost_exporter_daily[0]
+}
+
+moved {
+  from = aws_lambda_permission.cost_exporter_eventbridge
+  to   = aws_lambda_permission.cost_exporter_eventbridge[0]
 }
@@ -0,0 +1,405 @@
+#!/usr/bin/env python3
+"""
+Generate the cost monitoring dashboards from a panel spec
+
+The cost dashboards are built from COST_PANELS below, a compact list of the
+metrics cost_exporter publishes, and the service list in
+../lambda/cost_config.py, instead of being edited as JSON. Each entry of
+DASHBOARDS is a variant of the same spec written to its own file.
+
+Queries are kept cheap for CloudWatch:
+
+- every query names the Project and Environment dimensions the exporter adds
+  to each point and, unless it has a wildcard (Cost by Service), sets
+  matchExact, so Grafana sends plain GetMetricData metric queries instead of
+  SEARCH expressions that match every metric in the namespace
+- periods default to a day; the exporter publishes once a day, so finer
+  periods only return more empty buckets
+- totals and per-service costs come from the exporter's pre-aggregated
+  TotalCost, MonthToDateCost and ServiceCost metrics rather than being
+  summed in the dashboard
+
+Placeholders, replaced in grafana_dashboards.tf:
+
+    ${CLOUDWATCH_UID}   CloudWatch data source uid
+    ${COST_NAMESPACE}   Namespace of the cost metrics, e.g. SDT/Costs
+    ${PROJECT_NAME}     Project dimension
+    ${ENVIRONMENT}      Environment dimension
+
+Variants not deployed by Terraform (the -live copy, imported by hand) list
+concrete values for them in their 'values' instead.
+
+Output is deterministic (sorted keys, fixed ids and refIds), so regenerating
+an unchanged spec leaves the files untouched.
+
+Usage:
+    python3 generate_dashboards.py           # write the dashboards
+    python3 generate_dashboards.py --check   # exit 1 if a file is out of date
+"""
+
+import argparse
+import copy
+import json
+import os
+import sys
+
+DASHBOARD_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(DASHBOARD_DIR, '..', 'lambda'))
+
+import cost_config  # noqa: E402
+
+DAY = 86400
+WEEK = 7 * DAY
+
+DATASOURCE = {'type': 'cloudwatch', 'uid': '${CLOUDWATCH_UID}'}
+NAMESPACE = '${COST_NAMESPACE}'
+SCOPE = {'Project': '${PROJECT_NAME}', 'Environment': '${ENVIRONMENT}'}
+
+SERVICE_METRIC, SERVICE_DIMENSION = cost_config.BREAKDOWNS['SERVICE']
+
+# Friendly service name to the Cost Explorer service it is published for
+SERVICES = {name: service for service, name in cost_config.SERVICE_NAMES.items()}
+
+GRID_WIDTH = 24
+
+# Panel spec, laid out left to right and top to bottom. Each entry is
+# (type, title, width, height, options); stat panels show the latest value of
+# one metric, timeseries panels plot one.
+#
+#   metric      Metric published by cost_exporter (or cost_backfill)
+#   service     Friendly name from cost_config.SERVICE_NAMES, for ServiceCost
+#   thresholds  (yellow, red) in USD
+#   period      Seconds, a day by default; service panels take the
+#               variant's service_period and service_statistic
+COST_PANELS = [
+    ('stat', 'AWS Charges (Last 24h)', 8, 6, {
+        'metric': 'TotalCost',
+        'label': 'Total Charges (excl. credits)',
+        'description': 'Total AWS charges (excluding credits, refunds, and taxes) for the last 24 hours.',
+        'thresholds': (50, 100),
+    }),
+    ('stat', 'ECS Service Charges', 8, 6, {'service': 'ECS', 'thresholds': (20, 40)}),
+    ('stat', 'RDS Charges', 8, 6, {'service': 'RDS', 'thresholds': (15, 30)}),
+    ('stat', 'Month-to-Date Charges', 8, 6, {
+        'metric': 'MonthToDateCost',
+        'label': 'Month-to-Date',
+        'description': 'Total AWS charges for the current month (excluding credits, refunds, and taxes)',
+        'thresholds': (200, 400),
+    }),
+    ('break', None, 0, 0, {}),
+    ('timeseries', 'Cost Trend (Last 7 Days)', 24, 8, {
+        'metric': 'DailyCostHistory',
+        'label': 'Daily Cost',
+        'description': 'Daily AWS cost trend (excluding credits). Shows actual historical data from Cost Explorer.',
+        'legend': ['lastNotNull', 'mean'],
+    }),
+    ('timeseries', 'Cost by Service', 24, 10, {
+        'metric': SERVICE_METRIC,
+        'dimensions': {SERVICE_DIMENSION: '*'},
+        'label': "${PROP('Dim.%s')}" % SERVICE_DIMENSION,
+        'statistic': 'Sum',
+        'description': 'Breakdown of AWS costs by service (excluding credits)',
+        'stacked': True,
+    }),
+    ('stat', 'EC2 Charges', 6, 6, {
+        'service': 'EC2', 'thresholds': (10, 20), 'sparkline': False,
+        'description': 'EC2 compute charges (excluding credits)',
+    }),
+    ('stat', 'S3 Charges', 6, 6, {
+        'service': 'S3', 'thresholds': (5, 10), 'sparkline': False,
+        'description': 'S3 storage charges (excluding credits)',
+    }),
+    ('stat', 'Amplify Charges', 6, 6, {
+        'service': 'Amplify', 'thresholds': (3, 6), 'sparkline': False,
+        'description': 'AWS Amplify charges (excluding credits)',
+    }),
+    ('stat', 'VPC/NAT Gateway Charges', 6, 6, {
+        'service': 'VPC', 'label': 'VPC/NAT', 'thresholds': (5, 10), 'sparkline': False,
+        'description': 'VPC and NAT Gateway charges (excluding credits)',
+    }),
+]
+
+# Dashboard variants: file name to the settings that differ
+DASHBOARDS = {
+    'sdt-cost-monitoring.json': {
+        # ServiceCost is a trailing 7-day sum; one point per week is enough
+        'service_period': WEEK,
+        'service_statistic': 'Average',
+    },
+    # Imported by hand into the dev Grafana, so the placeholders are filled in
+    'sdt-cost-monitoring-live.json': {
+        'id': 2,
+        'service_period': DAY,
+        'service_statistic': 'Sum',
+        'values': {
+            'CLOUDWATCH_UID': 'ef3sq1l0eh4owd',
+            'COST_NAMESPACE': 'SDT/Costs',
+            'PROJECT_NAME': 'sdt',
+            'ENVIRONMENT': 'dev',
+        },
+    },
+}
+
+COST_DASHBOARD = {
+    'annotations': {'list': []},
+    'editable': True,
+    'fiscalYearStartMonth': 0,
+    'graphTooltip': 1,
+    'links': [],
+    'refresh': '1h',
+    'schemaVersion': 38,
+    'tags': ['cloudwatch', 'sdt', 'cost', 'billing'],
+    'templating': {'list': []},
+    'time': {'from': 'now-7d', 'to': 'now'},
+    'timepicker': {},
+    'timezone': 'browser',
+    'title': 'SDT - Cost Monitoring',
+    'uid': 'sdt-cost-monitoring',
+    'version': 9,
+}
+
+TIMESERIES_STYLE = {
+    'axisCenteredZero': False,
+    'axisColorMode': 'text',
+    'axisLabel': '',
+    'axisPlacement': 'auto',
+    'barAlignment': 0,
+    'drawStyle': 'line',
+    'gradientMode': 'none',
+    'hideFrom': {'legend': False, 'tooltip': False, 'viz': False},
+    'pointSize': 5,
+    'scaleDistribution': {'type': 'linear'},
+    'showPoints': 'auto',
+    'spanNulls': False,
+    'thresholdsStyle': {'mode': 'off'},
+}
+
+
+def cost_target(metric, ref_id, label='', dimensions=None, statistic='Maximum', period=DAY):
+    """
+    CloudWatch query of one cost metric, scoped to the project and
+    environment
+
+    Args:
+        metric: Metric name
+        ref_id: Query id within the panel (A, B, ...)
+        label: Legend label
+        dimensions: Dimensions besides Project and Environment; a '*' value
+            needs a search, so matchExact is only set without one
+        statistic: CloudWatch statistic
+        period: Seconds
+
+    Returns:
+        Grafana target dict
+    """
+    dimensions = dict(SCOPE, **(dimensions or {}))
+    return {
+        'datasource': DATASOURCE,
+        'dimensions': dimensions,
+        'expression': '',
+        'id': '',
+        'label': label,
+        'matchExact': '*' not in dimensions.values(),
+        'metricEditorMode': 0,
+        'metricName': metric,
+        'metricQueryType': 0,
+        'namespace': NAMESPACE,
+        'period': str(period),
+        'queryMode': 'Metrics',
+        'refId': ref_id,
+        'region': 'default',
+        'sqlExpression': '',
+        'statistic': statistic,
+    }
+
+
+def thresholds(levels):
+    """Threshold steps: green, then yellow and red at the given levels"""
+    steps = [{'color': 'green', 'value': None}]
+    for color, value in zip(('yellow', 'red'), levels):
+        steps.append({'color': color, 'value': value})
+    return {'mode': 'absolute', 'steps': steps}
+
+
+def stat_panel(spec):
+    """Stat panel showing the latest value of one metric"""
+    return {
+        'fieldConfig': {
+            'defaults': {
+                'color': {'mode': 'thresholds'},
+                'mappings': [],
+                'thresholds': thresholds(spec.get('thresholds', ())),
+                'unit': 'currencyUSD',
+            },
+            'overrides': [],
+        },
+        'options': {
+            'colorMode': 'value',
+            'graphMode': 'area' if spec.get('sparkline', True) else 'none',
+            'justifyMode': 'auto',
+            'orientation': 'auto',
+            'reduceOptions': {'calcs': ['lastNotNull'], 'fields': '', 'values': False},
+            'textMode': 'auto',
+        },
+        'pluginVersion': '10.0.0',
+        'type': 'stat',
+    }
+
+
+def timeseries_panel(spec):
+    """Time series panel; stacked ones get a table legend on the right"""
+    stacked = spec.get('stacked', False)
+    style = dict(
+        TIMESERIES_STYLE,
+        fillOpacity=10 if stacked else 20,
+        lineInterpolation='linear' if stacked else 'smooth',
+        lineWidth=1 if stacked else 2,
+        stacking={'group': 'A', 'mode': 'normal' if stacked else 'none'},
+    )
+    return {
+        'fieldConfig': {
+            'defaults': {
+                'color': {'mode': 'palette-classic'},
+                'custom': style,
+                'mappings': [],
+                'thresholds': thresholds(()),
+                'unit': 'currencyUSD',
+            },
+            'overrides': [],
+        },
+        'options': {
+            'legend': {
+                'calcs': spec.get('legend', ['lastNotNull', 'sum']),
+                'displayMode': 'table' if stacked else 'list',
+                'placement': 'right' if stacked else 'bottom',
+                'showLegend': True,
+            },
+            'tooltip': {'mode': 'multi', 'sort': 'desc'} if stacked else {'mode': 'single', 'sort': 'none'},
+        },
+        'type': 'timeseries',
+    }
+
+
+PANEL_BUILDERS = {
+    'stat': stat_panel,
+    'timeseries': timeseries_panel,
+}
+
+
+def panel_query(spec, variant):
+    """Metric query of a panel spec entry, with the variant's service settings"""
+    if 'service' in spec:
+        service = spec['service']
+        if service not in SERVICES:
+            raise ValueError(f"Unknown service {service!r}; add it to cost_config.SERVICE_NAMES")
+        return {
+            'metric': SERVICE_METRIC,
+            'label': spec.get('label', service),
+            'dimensions': {SERVICE_DIMENSION: service},
+            'statistic': variant['service_statistic'],
+            'period': variant['service_period'],
+            'description': spec.get('description', f'Charges for {SERVICES[service]} (excluding credits)'),
+        }
+    return {
+        'metric': spec['metric'],
+        'label': spec.get('label', ''),
+        'dimensions': spec.get('dimensions'),
+        'statistic': spec.get('statistic', 'Maximum'),
+        'period': spec.get('period', DAY),
+        'description': spec.get('description', ''),
+    }
+
+
+def build_panels(panel_specs, variant):
+    """
+    Lay out a panel spec on the dashboard grid
+
+    Panels are placed left to right, wrapping to a new row when the next one
+    does not fit; a 'break' entry starts a new row. Ids follow spec order.
+
+    Args:
+        panel_specs: List of (type, title, width, height, options)
+        variant: Dashboard variant settings (see DASHBOARDS)
+
+    Returns:
+        List of Grafana panel dicts
+    """
+    panels = []
+    x = y = row_height = 0
+    for panel_type, title, width, height, spec in panel_specs:
+        if panel_type == 'break' or x + width > GRID_WIDTH:
+            x, y, row_height = 0, y + row_height, 0
+            if panel_type == 'break':
+                continue
+        query = panel_query(spec, variant)
+        panel = PANEL_BUILDERS[panel_type](spec)
+        panel.update({
+            'datasource': DATASOURCE,
+            'description': query['description'],
+            'gridPos': {'h': height, 'w': width, 'x': x, 'y': y},
+            'id': len(panels) + 1,
+            'targets': [cost_target(
+                query['metric'], 'A', query['label'], query['dimensions'], query['statistic'], query['period']
+            )],
+            'title': title,
+        })
+        panels.append(panel)
+        x += width
+        row_height = max(row_height, height)
+    return panels
+
+
+def build_dashboard(variant):
+    """Cost monitoring dashboard for one DASHBOARDS variant"""
+    dashboard = copy.deepcopy(COST_DASHBOARD)
+    if 'id' in variant:
+        dashboard['id'] = variant['id']
+    dashboard['panels'] = build_panels(COST_PANELS, variant)
+    return dashboard
+
+
+def render(dashboard, values=None):
+    """
+    Dashboard JSON as written to disk: sorted keys, two-space indent
+
+    Args:
+        dashboard: Dashboard dict
+        values: Optional dict of placeholder name to the value written in
+            its place, e.g. {'ENVIRONMENT': 'dev'}
+    """
+    content = json.dumps(dashboard, indent=2, sort_keys=True, ensure_ascii=False) + '\n'
+    for name, value in sorted((values or {}).items()):
+        content = content.replace('${%s}' % name, value)
+    return content
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Generate the Grafana cost dashboards')
+    parser.add_argument('--check', action='store_true', help='Only report dashboards that are out of date')
+    args = parser.parse_args()
+
+    stale = []
+    for filename, variant in DASHBOARDS.items():
+        path = os.path.join(DASHBOARD_DIR, filename)
+        content = render(build_dashboard(variant), variant.get('values'))
+        try:
+            with open(path, encoding='utf-8') as current:
+                unchanged = current.read() == content
+        except FileNotFoundError:
+            unchanged = False
+        if unchanged:
+            print(f'✅ {filename} is up to date')
+        elif args.check:
+            print(f'❌ {filename} is out of date; run generate_dashboards.py')
+            stale.append(filename)
+        else:
+            with open(path, 'w', encoding='utf-8') as output:
+                output.write(content)
+            print(f'📝 Wrote {filename}')
+
+    if stale:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -7,10 +7,11 @@ resource "grafana_dashboard" "service_overview" {
 
 # CloudWatch-based Infrastructure Dashboard
 resource "grafana_dashboard" "infrastructure" {
-  config_json = replace(
+  config_json = replace(replace(replace(
     file("${path.module}/dashboards/sdt-infrastructure.json"),
-    "$${CLOUDWATCH_UID}",
-    grafana_data_source.cloudwatch.uid
+    "$${CLOUDWATCH_UID}", grafana_data_source.cloudwatch.uid),
+    "$${LOG_EXPORT_NAMESPACE}", "${upper(var.project_name)}/LogExport"),
+    "$${ENVIRONMENT}", var.environment
   )
 
   depends_on = [grafana_data_source.cloudwatch]
@@ -375,12 +376,14 @@ resource "grafana_dashboard" "infrastructure_old" {
   depends_on = [grafana_data_source.cloudwatch]
 }
 
-# Cost Monitoring Dashboard
+# Cost Monitoring Dashboard, generated by dashboards/generate_dashboards.py
 resource "grafana_dashboard" "cost_monitoring" {
-  config_json = replace(
+  config_json = replace(replace(replace(replace(
     file("${path.module}/dashboards/sdt-cost-monitoring.json"),
-    "$${CLOUDWATCH_UID}",
-    grafana_data_source.cloudwatch.uid
+    "$${CLOUDWATCH_UID}", grafana_data_source.cloudwatch.uid),
+    "$${COST_NAMESPACE}", "${upper(var.project_name)}/Costs"),
+    "$${PROJECT_NAME}", var.project_name),
+    "$${ENVIRONMENT}", var.environment
   )
 
   depends_on = [grafana_data_source.cloudwatch]
@@ -0,0 +1,72 @@
+"""
+Shared AWS client factory for the Lambda functions
+
+Clients are created on first use and kept at module level, so a warm
+invocation reuses them (and their connection pools) instead of paying for
+boto3's session and service-model loading again. boto3 itself is only
+imported when the first client is needed.
+"""
+
+import os
+
+# Tuned for short-lived Lambda calls: fail fast on connect, let adaptive
+# retries pace throttled APIs such as Cost Explorer and PutMetricData
+CONNECT_TIMEOUT = float(os.environ.get('AWS_CONNECT_TIMEOUT', 5))
+READ_TIMEOUT = float(os.environ.get('AWS_READ_TIMEOUT', 30))
+MAX_ATTEMPTS = int(os.environ.get('AWS_MAX_ATTEMPTS', 5))
+MAX_POOL_CONNECTIONS = int(os.environ.get('AWS_MAX_POOL_CONNECTIONS', 10))
+
+_session = None
+_clients = {}
+
+
+def default_config():
+    from botocore.config import Config
+
+    return Config(
+        connect_timeout=CONNECT_TIMEOUT,
+        read_timeout=READ_TIMEOUT,
+        retries={'mode': 'adaptive', 'max_attempts': MAX_ATTEMPTS},
+        max_pool_connections=MAX_POOL_CONNECTIONS
+    )
+
+
+def session():
+    """The process-wide boto3 session, created on first use"""
+    global _session
+    if _session is None:
+        import boto3
+
+        _session = boto3.session.Session()
+    return _session
+
+
+def client(service_name, region_name=None, **overrides):
+    """
+    Client for a service, created once per process
+
+    Args:
+        service_name: e.g. 'ce', 'cloudwatch', 'logs', 's3'
+        region_name: Optional region (Cost Explorer only answers in us-east-1)
+        **overrides: botocore Config options replacing the defaults for
+            this client, e.g. retries={'mode': 'standard', 'max_attempts': 1}
+
+    Returns:
+        boto3 client
+    """
+    key = (service_name, region_name, repr(sorted(overrides.items())))
+    if key not in _clients:
+        config = default_config()
+        if overrides:
+            from botocore.config import Config
+
+            config = config.merge(Config(**overrides))
+        _clients[key] = session().client(service_name, region_name=region_name, config=config)
+    return _clients[key]
+
+
+def reset():
+    """Forget every cached client (for tests and benchmarks)"""
+    global _session
+    _session = None
+    _clients.clear()
@@ -0,0 +1,127 @@
+"""
+Cold and warm start benchmark for the Lambda handler modules
+
+Each cold sample runs in a fresh Python process and times:
+    import:       importing the handler module (boto3 is not loaded yet)
+    first client: creating the handler's clients through aws_clients
+Warm samples reuse one process and time the same client lookups again, as a
+warm Lambda invocation does, next to creating a new boto3 client per call
+(what the handlers used to do on every invocation).
+
+No AWS calls are made and no credentials are needed. Run from anywhere:
+
+    python benchmarks/client_startup.py --runs 10
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+LAMBDA_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+LOG_EXPORTER = os.path.join(LAMBDA_DIR, '..', '..', 'monitoring', 'templates', 'log_exporter.py')
+
+# Handler module and the clients one invocation needs
+HANDLERS = {
+    'cost_exporter': (os.path.join(LAMBDA_DIR, 'cost_exporter.py'), [('ce', 'us-east-1'), ('cloudwatch', None)]),
+    'cost_backfill': (os.path.join(LAMBDA_DIR, 'cost_backfill.py'), [('ce', 'us-east-1'), ('cloudwatch', None), ('s3', None)]),
+    'log_exporter': (os.path.abspath(LOG_EXPORTER), [('logs', None), ('s3', None)])
+}
+
+# Runs in the child process; prints one JSON line of timings in milliseconds
+CHILD = """
+import importlib.util, json, sys, time
+sys.path.insert(0, {lambda_dir!r})
+started = time.perf_counter()
+spec = importlib.util.spec_from_file_location('handler', {path!r})
+module = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(module)
+imported = time.perf_counter()
+boto3_at_import = 'boto3' in sys.modules
+import aws_clients
+for service_name, region_name in {clients!r}:
+    aws_clients.client(service_name, region_name=region_name)
+created = time.perf_counter()
+print(json.dumps({{
+    'import': (imported - started) * 1000,
+    'first client': (created - imported) * 1000,
+    'boto3 at import': boto3_at_import
+}}))
+"""
+
+
+def cold_sample(path, clients):
+    """Time import and first client creation in a fresh interpreter"""
+    env = dict(os.environ)
+    env.setdefault('AWS_DEFAULT_REGION', 'us-east-1')
+    env.setdefault('S3_BUCKET', 'benchmark')
+    env.setdefault('LOG_GROUPS', '[]')
+    code = CHILD.format(lambda_dir=LAMBDA_DIR, path=path, clients=clients)
+    output = subprocess.run(
+        [sys.executable, '-c', code], env=env, check=True, capture_output=True, text=True
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def warm_samples(clients, runs):
+    """
+    Time repeated client lookups in this process
+
+    Returns:
+        Dict of timings in milliseconds per invocation, for cached lookups
+        and for a new boto3 client per call
+    """
+    sys.path.insert(0, LAMBDA_DIR)
+    import aws_clients
+    import boto3
+
+    aws_clients.reset()
+    for service_name, region_name in clients:
+        aws_clients.client(service_name, region_name=region_name)
+
+    cached, uncached = [], []
+    for _ in range(runs):
+        started = time.perf_counter()
+        for service_name, region_name in clients:
+            aws_clients.client(service_name, region_name=region_name)
+        cached.append((time.perf_counter() - started) * 1000)
+
+        started = time.perf_counter()
+        for service_name, region_name in clients:
+            boto3.client(service_name, region_name=region_name)
+        uncached.append((time.perf_counter() - started) * 1000)
+    return {'warm (cached)': cached, 'warm (new client)': uncached}
+
+
+def summary(values):
+    return f"median {statistics.median(values):8.2f} ms   min {min(values):8.2f} ms   max {max(values):8.2f} ms"
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark Lambda cold and warm client startup')
+    parser.add_argument('--runs', type=int, default=5, help='Samples per measurement')
+    parser.add_argument('--handler', choices=sorted(HANDLERS), action='append', help='Only these handlers')
+    args = parser.parse_args()
+    os.environ.setdefault('AWS_DEFAULT_REGION', 'us-east-1')
+
+    for name in args.handler or sorted(HANDLERS):
+        path, clients = HANDLERS[name]
+        samples = [cold_sample(path, clients) for _ in range(args.runs)]
+        timings = {
+            'cold import': [sample['import'] for sample in samples],
+            'cold first client': [sample['first client'] for sample in samples]
+        }
+        timings.update(warm_samples(clients, args.runs))
+
+        print(f"\n{name} ({', '.join(service for service, _ in clients)}), {args.runs} run(s)")
+        if any(sample['boto3 at import'] for sample in samples):
+            print("  boto3 is imported at module load; cold import includes it")
+        for label, values in timings.items():
+            print(f"  {label:<18} {summary(values)}")
+
+
+if __name__ == '__main__':
+    main()
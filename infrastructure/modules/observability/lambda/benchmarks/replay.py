@@ -0,0 +1,786 @@
+"""
+Replay harness for the log exporter, cost exporter and cost backfill handlers
+
+Runs each handler in this process against in-memory stand-ins for Cost
+Explorer, CloudWatch, CloudWatch Logs, S3 and Lambda, on a fake clock:
+time.sleep, time.time, time.monotonic and the handlers' datetime.now and
+date.today all follow the clock, and every API call advances it by a
+typical latency, so throttling backoff and export polling cost no real
+time. The clients are real boto3 clients; the stand-ins answer through
+botocore's before-call hook (the one Stubber uses), so every request is
+still validated against the service model and errors surface as the
+modeled exceptions.
+
+For each handler, size (log groups or services) and throttling profile it
+reports API call counts, simulated wall time, CPU time and peak memory:
+
+    python benchmarks/replay.py                           # all handlers, 5/50/500
+    python benchmarks/replay.py --handler log_exporter --profile heavy --sizes 50
+    python benchmarks/replay.py --save baseline.json      # record a baseline
+    python benchmarks/replay.py --baseline baseline.json  # compare against it
+
+Cost Explorer data is synthetic unless --recording points at responses
+captured from a real account with --record (one live run of the cost
+exporter; everything but Cost Explorer stays stubbed). Recorded days are
+shifted so the newest one is yesterday.
+"""
+
+import argparse
+import contextlib
+import importlib.util
+import io
+import json
+import os
+import random
+import sys
+import time
+import tracemalloc
+from collections import Counter
+from datetime import date, datetime, timedelta, timezone
+
+from botocore import xform_name
+from botocore.awsrequest import AWSResponse
+
+LAMBDA_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+LOG_EXPORTER = os.path.abspath(os.path.join(LAMBDA_DIR, '..', '..', 'monitoring', 'templates', 'log_exporter.py'))
+
+# Modules of the lambda directory, which the handlers import from; reloaded
+# for every scenario so each one starts cold
+SHARED_MODULES = tuple(sorted(name[:-3] for name in os.listdir(LAMBDA_DIR) if name.endswith('.py')))
+
+LAMBDA_TIMEOUT_MS = 900000
+DEFAULT_SIZES = (5, 50, 500)
+
+# Simulated latency of one API call per service, in milliseconds
+LATENCY_MS = {'ce': 600, 'cloudwatch': 40, 'lambda': 50, 'logs': 60, 's3': 25}
+
+# Throttling profiles: probability that a call is throttled, and how long
+# an export task runs
+PROFILES = {
+    'none': {'create_throttle': 0.0, 'describe_throttle': 0.0, 'cloudwatch_throttle': 0.0, 'task_seconds': 5},
+    'light': {'create_throttle': 0.05, 'describe_throttle': 0.02, 'cloudwatch_throttle': 0.02, 'task_seconds': 15},
+    'heavy': {'create_throttle': 0.3, 'describe_throttle': 0.1, 'cloudwatch_throttle': 0.2, 'task_seconds': 45}
+}
+
+# Groups per Cost Explorer page before a NextPageToken is returned
+CE_PAGE_SIZE = 500
+
+# Days of history the synthetic Cost Explorer data covers (14 months)
+CE_HISTORY_DAYS = 430
+
+# Days Cost Explorer still reports as estimated
+CE_ESTIMATED_DAYS = 2
+
+# Size of the object a finished export task writes
+EXPORT_BYTES = 64 * 1024
+
+SERVICES = [
+    'Amazon Elastic Container Service',
+    'Amazon Relational Database Service',
+    'Amazon Elastic Compute Cloud - Compute',
+    'Amazon Simple Storage Service',
+    'AWS Amplify',
+    'Amazon Virtual Private Cloud',
+    'AmazonCloudWatch',
+    'AWS Lambda',
+    'Amazon CloudFront'
+]
+REGIONS = ['us-east-1', 'us-west-2', 'eu-west-1']
+ACCOUNTS = ['111111111111', '222222222222']
+
+
+class ServiceError(Exception):
+    """Error response of a stand-in, raised as the client's modeled exception"""
+
+    def __init__(self, code, message, status=400, throttle=False):
+        super().__init__(message)
+        self.code = code
+        self.status = status
+        self.throttle = throttle
+
+
+class FakeClock:
+    """
+    Simulated time shared by the handlers and the stand-ins
+
+    Args:
+        start: Epoch seconds the clock starts at
+    """
+
+    def __init__(self, start):
+        self.now = start
+        self.slept = 0.0
+
+    def time(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.slept += seconds
+        self.now += seconds
+
+    def advance(self, seconds):
+        self.now += seconds
+
+    @contextlib.contextmanager
+    def patch(self):
+        """Route time.time, time.monotonic and time.sleep to this clock"""
+        saved = (time.time, time.monotonic, time.sleep)
+        time.time, time.monotonic, time.sleep = self.time, self.time, self.sleep
+        try:
+            yield self
+        finally:
+            time.time, time.monotonic, time.sleep = saved
+
+    def datetime_types(self):
+        """datetime and date subclasses whose now/today follow this clock"""
+        clock = self
+
+        class FakeDatetime(datetime):
+            @classmethod
+            def now(cls, tz=None):
+                return cls.fromtimestamp(clock.now, tz)
+
+            @classmethod
+            def utcnow(cls):
+                return cls.fromtimestamp(clock.now, timezone.utc).replace(tzinfo=None)
+
+        class FakeDate(date):
+            @classmethod
+            def today(cls):
+                return cls.fromtimestamp(clock.now)
+
+        return FakeDatetime, FakeDate
+
+
+class FakeContext:
+    """Lambda context whose deadline runs on the fake clock"""
+
+    def __init__(self, clock, timeout_ms=LAMBDA_TIMEOUT_MS):
+        self.clock = clock
+        self.deadline = clock.now + timeout_ms / 1000
+
+    def get_remaining_time_in_millis(self):
+        return int((self.deadline - self.clock.now) * 1000)
+
+
+class CostDataset:
+    """
+    Daily costs served by the Cost Explorer stand-in
+
+    Synthetic data has one row per service and day carrying every group-by
+    key, so any breakdown can be answered; amounts are derived from the seed
+    on demand instead of being stored, so the stand-in adds little to the
+    peak memory measured for the handler. Recorded data only answers the
+    GroupBy combinations that were recorded.
+    """
+
+    def __init__(self, today):
+        self.today = today
+        self.seed = 0
+        self.services = []
+        self.tables = {}
+
+    @classmethod
+    def synthetic(cls, services, today, seed=0):
+        dataset = cls(today)
+        dataset.seed = seed
+        for index in range(services):
+            service = SERVICES[index] if index < len(SERVICES) else f'Service {index:03d}'
+            dataset.services.append({
+                'SERVICE': service,
+                'USAGE_TYPE': f'USE1-{service.split()[-1]}-Usage',
+                'REGION': REGIONS[index % len(REGIONS)],
+                'LINKED_ACCOUNT': ACCOUNTS[index % len(ACCOUNTS)],
+                'TAG': '' if index % 4 == 3 else f'service-{index:03d}',
+                'base': random.Random(f'{seed}-{index}').uniform(0.05, 20.0)
+            })
+        return dataset
+
+    @classmethod
+    def from_recording(cls, path, today):
+        """
+        Load responses saved by --record
+
+        Returns:
+            CostDataset answering the recorded GroupBy combinations, with
+            the newest recorded day moved to yesterday
+        """
+        with open(path) as f:
+            recording = json.load(f)
+        days = [
+            result['TimePeriod']['Start']
+            for entry in recording['responses']
+            for result in entry['response']['ResultsByTime']
+        ]
+        shift = (today - timedelta(days=1)) - date.fromisoformat(max(days))
+
+        dataset = cls(today)
+        for entry in recording['responses']:
+            signature = group_signature(entry['params'].get('GroupBy', []))
+            table = dataset.tables.setdefault(signature, {})
+            for result in entry['response']['ResultsByTime']:
+                day = str(date.fromisoformat(result['TimePeriod']['Start']) + shift)
+                groups = table.setdefault(day, {})
+                for group in result.get('Groups', []):
+                    groups[tuple(group['Keys'])] = float(group['Metrics']['UnblendedCost']['Amount'])
+        print(f"Loaded {len(days)} recorded day(s) from {path}, shifted by {shift.days} day(s)")
+        return dataset
+
+    def groups(self, day, group_by):
+        """
+        Costs of one day grouped like Cost Explorer does
+
+        Returns:
+            List of (group key tuple, amount), sorted by key
+        """
+        if not self.services:
+            signature = group_signature(group_by)
+            if signature not in self.tables:
+                raise ServiceError('ValidationException', f"GroupBy {list(signature)} is not in the recording")
+            return sorted(self.tables[signature].get(day, {}).items())
+
+        rng = random.Random(f'{self.seed}-{day}')
+        groups = {}
+        for service in self.services:
+            keys = tuple(
+                f"{entry['Key']}${service['TAG']}" if entry['Type'] == 'TAG' else service[entry['Key']]
+                for entry in group_by
+            )
+            groups[keys] = groups.get(keys, 0.0) + max(service['base'] * rng.gauss(1.0, 0.1), 0.0)
+        return sorted(groups.items())
+
+    def is_estimated(self, day):
+        return day >= str(self.today - timedelta(days=CE_ESTIMATED_DAYS))
+
+    def earliest(self):
+        if self.services:
+            return str(self.today - timedelta(days=CE_HISTORY_DAYS))
+        return min((min(table) for table in self.tables.values() if table), default=str(self.today))
+
+
+def group_signature(group_by):
+    return tuple((entry['Type'], entry['Key']) for entry in group_by)
+
+
+class CostExplorerStandIn:
+    """get_cost_and_usage and get_cost_forecast over a CostDataset"""
+
+    def __init__(self, dataset):
+        self.dataset = dataset
+        self._counts = {}
+
+    def get_cost_and_usage(self, TimePeriod, GroupBy=(), NextPageToken=None, **_):
+        offset = int(NextPageToken or 0)
+        results = []
+        position = 0
+        total = 0
+        for daily_date, count in self._day_counts(TimePeriod, GroupBy):
+            total += max(count, 1)
+            if position + max(count, 1) <= offset or position >= offset + CE_PAGE_SIZE:
+                position += max(count, 1)
+                continue
+            first, last = max(offset - position, 0), offset + CE_PAGE_SIZE - position
+            position += max(count, 1)
+            results.append({
+                'TimePeriod': {'Start': daily_date, 'End': str(date.fromisoformat(daily_date) + timedelta(days=1))},
+                'Total': {},
+                'Groups': [
+                    {'Keys': list(keys), 'Metrics': {'UnblendedCost': {'Amount': f'{amount:.10f}', 'Unit': 'USD'}}}
+                    for keys, amount in self.dataset.groups(daily_date, GroupBy)[first:last]
+                ],
+                'Estimated': self.dataset.is_estimated(daily_date)
+            })
+
+        response = {'GroupDefinitions': list(GroupBy), 'ResultsByTime': results}
+        if offset + CE_PAGE_SIZE < total:
+            response['NextPageToken'] = str(offset + CE_PAGE_SIZE)
+        return response
+
+    def _day_counts(self, time_period, group_by):
+        """
+        Days of a query with their number of groups (a day without groups
+        still takes a place on a page), counted once per query
+        """
+        query = json.dumps([time_period, group_by], sort_keys=True)
+        if query not in self._counts:
+            day = max(date.fromisoformat(time_period['Start']), date.fromisoformat(self.dataset.earliest()))
+            end = min(date.fromisoformat(time_period['End']), self.dataset.today + timedelta(days=1))
+            counts = []
+            while day < end:
+                counts.append((str(day), len(self.dataset.groups(str(day), group_by))))
+                day += timedelta(days=1)
+            self._counts[query] = counts
+        return self._counts[query]
+
+    def get_cost_forecast(self, TimePeriod, **_):
+        start = date.fromisoformat(TimePeriod['Start'])
+        end = date.fromisoformat(TimePeriod['End'])
+        recent = [
+            sum(amount for _, amount in self.dataset.groups(str(start - timedelta(days=offset)), [{'Type': 'DIMENSION', 'Key': 'SERVICE'}]))
+            for offset in range(1, 8)
+        ]
+        amount = sum(recent) / len(recent) * (end - start).days
+        return {'Total': {'Amount': f'{amount:.10f}', 'Unit': 'USD'}, 'ForecastResultsByTime': []}
+
+
+class S3StandIn:
+    """In-memory buckets"""
+
+    def __init__(self):
+        self.objects = {}
+
+    def get_object(self, Bucket, Key, **_):
+        if (Bucket, Key) not in self.objects:
+            raise ServiceError('NoSuchKey', 'The specified key does not exist.', status=404)
+        body = self.objects[(Bucket, Key)]
+        return {'Body': io.BytesIO(body), 'ContentLength': len(body)}
+
+    def put_object(self, Bucket, Key, Body=b'', **_):
+        if hasattr(Body, 'read'):
+            Body = Body.read()
+        self.objects[(Bucket, Key)] = Body.encode('utf-8') if isinstance(Body, str) else bytes(Body)
+        return {}
+
+    def list_objects_v2(self, Bucket, Prefix='', MaxKeys=1000, ContinuationToken=None, **_):
+        keys = sorted(key for bucket, key in self.objects if bucket == Bucket and key.startswith(Prefix))
+        offset = int(ContinuationToken or 0)
+        page = keys[offset:offset + MaxKeys]
+        response = {
+            'KeyCount': len(page),
+            'Contents': [{'Key': key, 'Size': len(self.objects[(Bucket, key)])} for key in page],
+            'IsTruncated': offset + MaxKeys < len(keys)
+        }
+        if response['IsTruncated']:
+            response['NextContinuationToken'] = str(offset + MaxKeys)
+        return response
+
+
+class LogsStandIn:
+    """
+    Log groups with recent events and the account's single export slot
+
+    A submit while a task is still running fails with LimitExceededException,
+    as the real API does; the profile adds throttling on top.
+    """
+
+    def __init__(self, clock, profile, rng, s3, log_groups):
+        self.clock = clock
+        self.profile = profile
+        self.rng = rng
+        self.s3 = s3
+        self.log_groups = sorted(log_groups)
+        self.tasks = {}
+        self.active = None
+
+    def describe_log_groups(self, logGroupNamePrefix='', nextToken=None, limit=50, **_):
+        names = [name for name in self.log_groups if name.startswith(logGroupNamePrefix)]
+        offset = int(nextToken or 0)
+        response = {'logGroups': [
+            {'logGroupName': name, 'storedBytes': 1024 * 1024, 'retentionInDays': 30, 'creationTime': 0}
+            for name in names[offset:offset + limit]
+        ]}
+        if offset + limit < len(names):
+            response['nextToken'] = str(offset + limit)
+        return response
+
+    def describe_log_streams(self, logGroupName, **_):
+        last_event = int((self.clock.now - 60) * 1000)
+        return {'logStreams': [{'logStreamName': 'replay', 'lastEventTimestamp': last_event, 'lastIngestionTime': last_event}]}
+
+    def create_export_task(self, logGroupName, to, destination, destinationPrefix, **params):
+        # fromTime in boto3; 'from' is the service model's name for it
+        if self.active and self._status(self.tasks[self.active]) == 'RUNNING':
+            raise ServiceError('LimitExceededException', 'Resource limit exceeded.', throttle=True)
+        if self.rng.random() < self.profile['create_throttle']:
+            raise ServiceError('LimitExceededException', 'Rate exceeded.', throttle=True)
+        task_id = f'{len(self.tasks):08x}-replay'
+        self.tasks[task_id] = {
+            'taskId': task_id,
+            'logGroupName': logGroupName,
+            'from': params['from'],
+            'to': to,
+            'destination': destination,
+            'destinationPrefix': destinationPrefix,
+            'createdAt': self.clock.now,
+            'doneAt': self.clock.now + self.profile['task_seconds'] * self.rng.uniform(0.5, 1.5)
+        }
+        self.active = task_id
+        return {'taskId': task_id}
+
+    def describe_export_tasks(self, taskId, **_):
+        if self.rng.random() < self.profile['describe_throttle']:
+            raise ServiceError('ThrottlingException', 'Rate exceeded.', throttle=True)
+        task = self.tasks.get(taskId)
+        if task is None:
+            return {'exportTasks': []}
+        status = self._status(task)
+        described = {key: task[key] for key in ('taskId', 'logGroupName', 'from', 'to', 'destination', 'destinationPrefix')}
+        described['status'] = {'code': status}
+        described['executionInfo'] = {'creationTime': int(task['createdAt'] * 1000)}
+        if status == 'COMPLETED':
+            described['executionInfo']['completionTime'] = int(task['doneAt'] * 1000)
+            key = f"{task['destinationPrefix']}/{taskId}/replay/000000.gz"
+            self.s3.objects.setdefault((task['destination'], key), b'\0' * EXPORT_BYTES)
+        return {'exportTasks': [described]}
+
+    def _status(self, task):
+        return 'COMPLETED' if self.clock.now >= task['doneAt'] else 'RUNNING'
+
+
+class CloudWatchStandIn:
+    def __init__(self, profile, rng):
+        self.profile = profile
+        self.rng = rng
+        self.datums = 0
+
+    def put_metric_data(self, Namespace, MetricData, **_):
+        if len(MetricData) > 1000:
+            raise ServiceError('InvalidParameterValue', f'{len(MetricData)} datums in one request, the limit is 1000')
+        if self.rng.random() < self.profile['cloudwatch_throttle']:
+            raise ServiceError('Throttling', 'Rate exceeded', throttle=True)
+        self.datums += len(MetricData)
+        return {}
+
+
+class LambdaStandIn:
+    def invoke(self, **_):
+        return {'StatusCode': 202}
+
+
+class Stubs:
+    """
+    Answers every call of the attached clients from the stand-ins and
+    counts them
+
+    Args:
+        clock: FakeClock advanced by each call's latency
+        profile: Throttling profile (from PROFILES)
+        rng: Random source of the throttling decisions
+        dataset: CostDataset for Cost Explorer, or None to call the real
+            Cost Explorer and record its responses
+        log_groups: Log group names the Logs stand-in knows
+    """
+
+    def __init__(self, clock, profile, rng, dataset, log_groups):
+        self.clock = clock
+        s3 = S3StandIn()
+        self.stand_ins = {
+            's3': s3,
+            'logs': LogsStandIn(clock, profile, rng, s3, log_groups),
+            'cloudwatch': CloudWatchStandIn(profile, rng),
+            'lambda': LambdaStandIn(),
+            'ce': CostExplorerStandIn(dataset) if dataset else None
+        }
+        self.calls = Counter()
+        self.throttled = Counter()
+        self.recorded = []
+        self._attached = set()
+
+    def attach(self, client, service_name):
+        """Register the hooks on a client, once per client"""
+        if id(client) in self._attached:
+            return client
+        self._attached.add(id(client))
+        stand_in = self.stand_ins.get(service_name)
+        if stand_in is None and service_name == 'ce':
+            client.meta.events.register('after-call', self._record)
+            return client
+        if stand_in is None:
+            raise ValueError(f"No stand-in for {service_name}")
+
+        def remember_params(params, context, **kwargs):
+            context['replay_params'] = dict(params)
+
+        def respond(model, context, **kwargs):
+            self.clock.advance(LATENCY_MS.get(service_name, 50) / 1000)
+            operation = f'{service_name}.{model.name}'
+            self.calls[operation] += 1
+            try:
+                parsed = getattr(stand_in, xform_name(model.name))(**context['replay_params'])
+                status = 200
+            except ServiceError as e:
+                if e.throttle:
+                    self.throttled[operation] += 1
+                parsed = {'Error': {'Code': e.code, 'Message': str(e)}}
+                status = e.status
+            parsed['ResponseMetadata'] = {'HTTPStatusCode': status, 'RequestId': 'replay'}
+            return AWSResponse('https://replay.invalid/', status, {}, None), parsed
+
+        client.meta.events.register('before-parameter-build', remember_params)
+        client.meta.events.register('before-call', respond)
+        return client
+
+    def _record(self, model, http_response, parsed, context, **kwargs):
+        self.calls[f'ce.{model.name}'] += 1
+        if model.name == 'GetCostAndUsage' and http_response.status_code == 200:
+            response = {key: value for key, value in parsed.items() if key != 'ResponseMetadata'}
+            self.recorded.append({'params': context.get('replay_params', {}), 'response': response})
+
+
+def scenario(handler_name, size, args):
+    """
+    Environment, event, log groups and time between invocations of a run
+
+    Returns:
+        Tuple of (module path, env dict, event, log groups, interval seconds)
+    """
+    if handler_name == 'log_exporter':
+        log_groups = [f'/ecs/sdt-replay/service-{index:03d}' for index in range(size)]
+        env = {'S3_BUCKET': 'replay-logs', 'LOG_GROUPS': json.dumps(log_groups), 'EXPORT_MODE': 'wait'}
+        return LOG_EXPORTER, env, {}, log_groups, 3600
+    if handler_name == 'cost_exporter':
+        env = {'COST_CACHE_BUCKET': 'replay-cost-cache'}
+        if args.cost_config:
+            env['COST_CONFIG'] = args.cost_config
+        if args.forecast:
+            env['COST_FORECAST'] = 'true'
+        return os.path.join(LAMBDA_DIR, 'cost_exporter.py'), env, {}, [], 86400
+    env = {'COST_HISTORY_BUCKET': 'replay-cost-history'}
+    return os.path.join(LAMBDA_DIR, 'cost_backfill.py'), env, {'months': args.backfill_months}, [], 0
+
+
+def load_handler(name, path, clock, stubs):
+    """
+    Import a handler module from scratch, as a new Lambda container would,
+    with its clients and clock patched
+    """
+    for module_name in SHARED_MODULES:
+        sys.modules.pop(module_name, None)
+    if LAMBDA_DIR not in sys.path:
+        sys.path.insert(0, LAMBDA_DIR)
+
+    spec = importlib.util.spec_from_file_location(f'replay_{name}', path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+
+    fake_datetime, fake_date = clock.datetime_types()
+    for loaded in [module] + [sys.modules[name] for name in SHARED_MODULES if name in sys.modules]:
+        if getattr(loaded, 'datetime', None) is datetime:
+            loaded.datetime = fake_datetime
+        if getattr(loaded, 'date', None) is date:
+            loaded.date = fake_date
+
+    aws_clients = sys.modules['aws_clients']
+    create = aws_clients.client
+
+    def client(service_name, region_name=None, **overrides):
+        return stubs.attach(create(service_name, region_name=region_name, **overrides), service_name)
+
+    aws_clients.client = client
+    return module
+
+
+class LineCounter(io.TextIOBase):
+    """Counts the lines of handler output, passing them on when verbose"""
+
+    def __init__(self, verbose=False):
+        self.lines = 0
+        self.stream = sys.stdout if verbose else None
+
+    def write(self, text):
+        self.lines += text.count('\n')
+        if self.stream:
+            self.stream.write(text)
+        return len(text)
+
+
+def outcome(response):
+    """Short summary of a handler response"""
+    body = response.get('body', '')
+    try:
+        parsed = json.loads(body)
+    except ValueError:
+        return body[:80]
+    counts = {key: value for key, value in parsed.items() if key.endswith('Exports')}
+    return ' '.join(f'{key}={value}' for key, value in counts.items()) or parsed.get('message', '')[:80]
+
+
+@contextlib.contextmanager
+def environment(values):
+    saved = {key: os.environ.get(key) for key in values}
+    os.environ.update(values)
+    try:
+        yield
+    finally:
+        for key, value in saved.items():
+            if value is None:
+                os.environ.pop(key, None)
+            else:
+                os.environ[key] = value
+
+
+def run(handler_name, size, profile_name, args):
+    """
+    Invoke one handler args.invocations times on a fresh module and backend
+
+    Returns:
+        List of result dicts, one per invocation (the first is a cold start)
+    """
+    path, env, event, log_groups, interval = scenario(handler_name, size, args)
+    clock = FakeClock(args.start)
+    rng = random.Random(args.seed)
+    random.seed(args.seed)
+
+    today = date.fromtimestamp(clock.now)
+    dataset = None
+    if args.record is None:
+        dataset = CostDataset.from_recording(args.recording, today) if args.recording else CostDataset.synthetic(size, today, args.seed)
+    stubs = Stubs(clock, PROFILES[profile_name], rng, dataset, log_groups)
+
+    env = dict(env, PROJECT_NAME='sdt', ENVIRONMENT='replay')
+    if args.record is None:
+        env.update(AWS_ACCESS_KEY_ID='replay', AWS_SECRET_ACCESS_KEY='replay', AWS_DEFAULT_REGION='us-east-1')
+    else:
+        env.setdefault('AWS_DEFAULT_REGION', os.environ.get('AWS_DEFAULT_REGION', 'us-east-1'))
+
+    results = []
+    clock_patch = clock.patch() if args.record is None else contextlib.nullcontext()
+    with environment(env), clock_patch:
+        module = load_handler(handler_name, path, clock, stubs)
+        for invocation in range(args.invocations):
+            calls_before = Counter(stubs.calls)
+            throttled_before = sum(stubs.throttled.values())
+            started = clock.now
+            cpu_started = time.process_time()
+            output = LineCounter(args.verbose)
+
+            tracemalloc.start()
+            try:
+                with contextlib.redirect_stdout(output):
+                    summary = outcome(module.handler(dict(event), FakeContext(clock)))
+            except Exception as e:
+                summary = f'error: {type(e).__name__}: {e}'
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+
+            calls = Counter(stubs.calls)
+            calls.subtract(calls_before)
+            results.append({
+                'handler': handler_name,
+                'size': size,
+                'profile': profile_name,
+                'invocation': invocation + 1,
+                'calls': {operation: count for operation, count in sorted(calls.items()) if count},
+                'throttled': sum(stubs.throttled.values()) - throttled_before,
+                'simulatedSeconds': round(clock.now - started, 3),
+                'cpuMs': round((time.process_time() - cpu_started) * 1000, 1),
+                'peakKb': round(peak / 1024, 1),
+                'logLines': output.lines,
+                'outcome': summary
+            })
+            clock.advance(interval)
+
+    if args.record is not None:
+        with open(args.record, 'w') as f:
+            json.dump({'recordedAt': str(today), 'responses': stubs.recorded}, f, indent=1, sort_keys=True)
+        print(f"Recorded {len(stubs.recorded)} Cost Explorer response(s) to {args.record}")
+    return results
+
+
+def print_results(results):
+    print(f"\n{'handler':<14} {'size':>5} {'profile':<7} {'inv':>3} {'calls':>6} {'thr':>5} "
+          f"{'sim s':>9} {'cpu ms':>9} {'peak KB':>9} {'logs':>6}  outcome")
+    for result in results:
+        print(f"{result['handler']:<14} {result['size']:>5} {result['profile']:<7} {result['invocation']:>3} "
+              f"{sum(result['calls'].values()):>6} {result['throttled']:>5} {result['simulatedSeconds']:>9.1f} "
+              f"{result['cpuMs']:>9.1f} {result['peakKb']:>9.1f} {result['logLines']:>6}  {result['outcome']}")
+        print('    ' + ' '.join(f'{operation}={count}' for operation, count in result['calls'].items()))
+
+
+def compare(results, baseline, tolerance):
+    """
+    Print changes against a saved baseline
+
+    Call counts, simulated time and peak memory are compared; CPU time is
+    too noisy to gate on.
+
+    Returns:
+        Number of metrics that got worse by more than the tolerance
+    """
+    previous = {
+        (entry['handler'], entry['size'], entry['profile'], entry['invocation']): entry
+        for entry in baseline
+    }
+    regressions = 0
+    print(f"\nChanges against baseline (tolerance {tolerance:.0%}):")
+    for result in results:
+        key = (result['handler'], result['size'], result['profile'], result['invocation'])
+        if key not in previous:
+            continue
+        old = previous[key]
+        changes = []
+        for label, before, after in (
+            ('calls', sum(old['calls'].values()), sum(result['calls'].values())),
+            ('sim s', old['simulatedSeconds'], result['simulatedSeconds']),
+            ('peak KB', old['peakKb'], result['peakKb'])
+        ):
+            if before == after:
+                continue
+            worse = after > before * (1 + tolerance) + 1e-9
+            regressions += worse
+            changes.append(f"{label} {before} -> {after}" + (' (worse)' if worse else ''))
+        if changes:
+            print(f"  {' '.join(str(part) for part in key)}: {', '.join(changes)}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Replay the Lambda handlers against local stand-ins')
+    parser.add_argument('--handler', choices=['log_exporter', 'cost_exporter', 'cost_backfill'], action='append',
+                        help='Only these handlers (repeatable)')
+    parser.add_argument('--sizes', type=int, nargs='+', default=list(DEFAULT_SIZES),
+                        help='Log groups or services per scenario')
+    parser.add_argument('--profile', choices=sorted(PROFILES), action='append', help='Throttling profiles (repeatable)')
+    parser.add_argument('--invocations', type=int, default=2, help='Invocations per scenario; the first is cold')
+    parser.add_argument('--backfill-months', type=int, default=3, help='Months the cost backfill covers')
+    parser.add_argument('--cost-config', help='COST_CONFIG for the cost exporter')
+    parser.add_argument('--forecast', action='store_true', help='Enable the cost exporter forecast')
+    parser.add_argument('--recording', help='Cost Explorer responses saved with --record')
+    parser.add_argument('--record', help='Run the cost exporter once against the real Cost Explorer and save its responses')
+    parser.add_argument('--start', help='Simulated start time, ISO 8601 UTC (default: 5 minutes past the current hour)')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--verbose', action='store_true', help='Show the handler output')
+    parser.add_argument('--save', help='Write the results as JSON, e.g. as a baseline')
+    parser.add_argument('--baseline', help='Compare against results saved with --save')
+    parser.add_argument('--tolerance', type=float, default=0.1, help='Allowed growth before a change counts as worse')
+    args = parser.parse_args()
+
+    if args.start:
+        args.start = datetime.fromisoformat(args.start).replace(tzinfo=timezone.utc).timestamp()
+    else:
+        args.start = (datetime.now(timezone.utc).replace(minute=5, second=0, microsecond=0)).timestamp()
+
+    handlers = args.handler or ['log_exporter', 'cost_exporter', 'cost_backfill']
+    sizes = args.sizes
+    profiles = args.profile or ['none', 'heavy']
+    if args.record:
+        handlers, sizes, profiles = ['cost_exporter'], [0], ['none']
+        args.invocations = 1
+
+    # Import boto3 and botocore's submodules up front; otherwise whichever
+    # scenario runs first is charged for them
+    import boto3
+    boto3.session.Session().client('s3', region_name='us-east-1')
+
+    results = []
+    for handler_name in handlers:
+        # Recorded Cost Explorer data has its own number of services
+        for size in ([0] if args.recording and handler_name != 'log_exporter' else sizes):
+            for profile_name in profiles:
+                results.extend(run(handler_name, size, profile_name, args))
+    print_results(results)
+
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump(results, f, indent=1)
+        print(f"\nSaved {len(results)} result(s) to {args.save}")
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        if regressions:
+            print(f"{regressions} metric(s) got worse")
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,76 @@
+"""
+Cost baselines, anomaly scores and month-end projections
+
+Computed by cost_exporter from the cached daily history, so Grafana and the
+alarms get ready-made signals instead of working on sparse daily points.
+"""
+
+import calendar
+
+# Weight of the newest day in the exponentially weighted moving average
+EWMA_ALPHA = 0.3
+
+# Scales the median absolute deviation to a standard deviation estimate
+MAD_SCALE = 1.4826
+
+# Fewer days than this give no meaningful baseline
+MIN_HISTORY_DAYS = 7
+
+
+def ewma(values, alpha=EWMA_ALPHA):
+    """Exponentially weighted moving average of values, oldest first"""
+    average = None
+    for value in values:
+        average = value if average is None else alpha * value + (1 - alpha) * average
+    return average
+
+
+def median(values):
+    ordered = sorted(values)
+    middle = len(ordered) // 2
+    if len(ordered) % 2:
+        return ordered[middle]
+    return (ordered[middle - 1] + ordered[middle]) / 2
+
+
+def anomaly_score(history, latest):
+    """
+    How unusual the latest day is against its history
+
+    The baseline is the EWMA of the history and the spread is the median
+    absolute deviation, which a few earlier spikes do not inflate. The
+    spread has a floor of 5% of the median, so a flat history does not turn
+    cent-level changes into large scores.
+
+    Args:
+        history: Daily amounts before the latest day, oldest first
+        latest: Amount of the latest day
+
+    Returns:
+        Score in robust standard deviations above (positive) or below the
+        baseline, or None when the history is too short
+    """
+    if len(history) < MIN_HISTORY_DAYS:
+        return None
+    middle = median(history)
+    spread = MAD_SCALE * median([abs(value - middle) for value in history])
+    spread = max(spread, 0.05 * abs(middle), 0.01)
+    return (latest - ewma(history)) / spread
+
+
+def projected_month_end(mtd_amount, recent_days, today):
+    """
+    Month-to-date cost plus the EWMA daily rate for the rest of the month
+
+    Args:
+        mtd_amount: Cost so far this month, up to the day before today
+        recent_days: Recent daily totals, oldest first
+        today: First day not counted in mtd_amount (the current date, or
+            the oldest estimated day); it and later days are still to come
+
+    Returns:
+        Projected month-end cost
+    """
+    days_in_month = calendar.monthrange(today.year, today.month)[1]
+    remaining_days = days_in_month - today.day + 1
+    return mtd_amount + (ewma(recent_days) or 0.0) * remaining_days
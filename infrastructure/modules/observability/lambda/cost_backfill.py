@@ -1,172 +1,301 @@
 """
-AWS Cost Backfill Script - One-time execution
+AWS Cost Backfill Script
 
-This script publishes the last 7 days of cost data with current timestamps
-so it can be immediately visible in Grafana dashboards.
+Publishes historical daily cost data, up to the 14 months Cost Explorer
+keeps, at the real billing date of each point. CloudWatch only accepts
+points up to two weeks old, so older days are written to an S3 time-series
+store (one JSON object per month) instead.
+
+Cost Explorer is queried one month at a time, and each finished month is
+recorded in a progress object, so a run that stops early (or is invoked
+again) resumes with the first month not yet done.
 """
 
-import boto3
+import argparse
+import json
 import os
-from datetime import datetime, timedelta
+import time
+from datetime import date, datetime, timedelta
 
-ce_client = boto3.client('ce', region_name='us-east-1')
-cw_client = boto3.client('cloudwatch')
+import aws_clients
+from cost_config import SERVICE_NAMES
+from cost_records import CostRecords
+from metric_publisher import MetricPublisher, publisher_client
 
 PROJECT_NAME = os.environ.get('PROJECT_NAME', 'sdt')
 ENVIRONMENT = os.environ.get('ENVIRONMENT', 'dev')
 
+# Cost Explorer keeps the current month plus the 13 before it
+MAX_MONTHS = 14
+
+# CloudWatch rejects data points older than two weeks; keep a day of margin
+CLOUDWATCH_MAX_AGE_DAYS = 13
+
+# S3 store for days too old for CloudWatch (optional)
+HISTORY_BUCKET = os.environ.get('COST_HISTORY_BUCKET')
+HISTORY_PREFIX = f"cost-history/{PROJECT_NAME}-{ENVIRONMENT}/"
+
+# Stop starting new months when less than this much Lambda time is left
+SAFETY_MARGIN_MS = 30000
+
+
+def ce_client():
+    """Cost Explorer client (the API is only served from us-east-1)"""
+    return aws_clients.client('ce', region_name='us-east-1')
+
 
 def handler(event, context):
     """
-    Backfill handler that publishes last 7 days of cost data
-    with current timestamps for immediate visibility
+    Backfill handler
+
+    Event keys (all optional; the last 7 days by default):
+        months: Number of months to backfill, counting the current one (max 14)
+        from, to: Explicit range as YYYY-MM-DD, to exclusive
     """
 
     try:
-        # Calculate date range for last 7 days
-        end_date = datetime.now().date()
-        start_date = end_date - timedelta(days=7)
-
-        # Format dates for Cost Explorer API
-        end_str = end_date.strftime('%Y-%m-%d')
-        start_str = start_date.strftime('%Y-%m-%d')
-
-        print(f"Backfilling costs from {start_str} to {end_str}")
-
-        # Fetch daily costs for the last 7 days excluding credits
-        response = ce_client.get_cost_and_usage(
-            TimePeriod={
-                'Start': start_str,
-                'End': end_str
-            },
-            Granularity='DAILY',
-            Metrics=['UnblendedCost'],
-            Filter={
-                'Not': {
-                    'Dimensions': {
-                        'Key': 'RECORD_TYPE',
-                        'Values': ['Credit', 'Refund', 'Tax']
-                    }
-                }
-            }
+        start_date, end_date = backfill_range(event or {}, date.today())
+        print(f"Backfilling costs from {start_date} to {end_date}")
+
+        s3_client = aws_clients.client('s3') if HISTORY_BUCKET else None
+        progress = load_progress(s3_client, start_date, end_date)
+        publisher = MetricPublisher(
+            publisher_client(),
+            namespace=f'{PROJECT_NAME.upper()}/Costs',
+            base_dimensions=[
+                {'Name': 'Project', 'Value': PROJECT_NAME},
+                {'Name': 'Environment', 'Value': ENVIRONMENT}
+            ]
         )
+        cloudwatch_cutoff = (date.today() - timedelta(days=CLOUDWATCH_MAX_AGE_DAYS)).strftime('%Y-%m-%d')
 
-        # Also fetch service breakdown for the period
-        service_response = ce_client.get_cost_and_usage(
-            TimePeriod={
-                'Start': start_str,
-                'End': end_str
-            },
-            Granularity='DAILY',
-            Metrics=['UnblendedCost'],
-            GroupBy=[
-                {
-                    'Type': 'DIMENSION',
-                    'Key': 'SERVICE'
-                }
-            ],
-            Filter={
-                'Not': {
-                    'Dimensions': {
-                        'Key': 'RECORD_TYPE',
-                        'Values': ['Credit', 'Refund', 'Tax']
+        total_days = 0
+        pending_months = []
+        for chunk_start, chunk_end in month_chunks(start_date, end_date):
+            month = chunk_start.strftime('%Y-%m')
+            if month in progress['completed']:
+                print(f"Month {month} already backfilled, skipping...")
+                continue
+            if context and context.get_remaining_time_in_millis() < SAFETY_MARGIN_MS:
+                pending_months.append(month)
+                continue
+
+            print(f"\n=== Backfilling {chunk_start} to {chunk_end} ===")
+            days = fetch_month(chunk_start, chunk_end).by_day()
+
+            history = {}
+            for offset in range((chunk_end - chunk_start).days):
+                daily_date = (chunk_start + timedelta(days=offset)).strftime('%Y-%m-%d')
+                day = days.get(daily_date, CostRecords())
+                total = day.total()
+                services = day.by_group(name=service_name)
+                total_days += 1
+                if daily_date >= cloudwatch_cutoff:
+                    publish_day(publisher, daily_date, total, services)
+                else:
+                    history[daily_date] = {
+                        'total': str(total),
+                        'services': {name: str(amount) for name, amount in sorted(services.items())}
                     }
-                }
-            }
-        )
+                print(f"{daily_date}: ${total:.2f}" + (' (S3)' if daily_date in history else ''))
 
-        # Map AWS service names to friendly names
-        service_mapping = {
-            'Amazon Elastic Container Service': 'ECS',
-            'Amazon Relational Database Service': 'RDS',
-            'Amazon Elastic Compute Cloud - Compute': 'EC2',
-            'Amazon Simple Storage Service': 'S3',
-            'AWS Amplify': 'Amplify',
-            'Amazon Virtual Private Cloud': 'VPC',
-            'AmazonCloudWatch': 'CloudWatch',
-            'AWS Lambda': 'Lambda',
-            'Amazon CloudFront': 'CloudFront'
-        }
+            if history:
+                write_history(s3_client, month, history)
 
-        # Publish daily total costs
-        print("\n=== Publishing Daily Total Costs ===")
-        metrics_to_publish = []
-
-        for i, daily_result in enumerate(response['ResultsByTime']):
-            daily_date = daily_result['TimePeriod']['Start']
-            daily_amount = float(daily_result['Total']['UnblendedCost']['Amount'])
-
-            # Use current timestamp with offset to spread out the data points
-            timestamp = datetime.utcnow() - timedelta(days=(6 - i))
-
-            print(f"Day {i+1}: {daily_date} = ${daily_amount:.2f} (timestamp: {timestamp})")
-
-            metrics_to_publish.append({
-                'MetricName': 'DailyCostHistory',
-                'Value': daily_amount,
-                'Unit': 'None',
-                'Timestamp': timestamp,
-                'Dimensions': [
-                    {'Name': 'Project', 'Value': PROJECT_NAME},
-                    {'Name': 'Environment', 'Value': ENVIRONMENT},
-                    {'Name': 'Date', 'Value': daily_date}
-                ]
-            })
-
-        # Publish in batches (CloudWatch allows max 20 metrics per call)
-        for i in range(0, len(metrics_to_publish), 20):
-            batch = metrics_to_publish[i:i+20]
-            cw_client.put_metric_data(
-                Namespace=f'{PROJECT_NAME.upper()}/Costs',
-                MetricData=batch
-            )
-            print(f"Published batch of {len(batch)} metrics")
-
-        # Calculate and publish service costs for the entire period
-        print("\n=== Publishing Service Cost Totals ===")
-        service_costs = {}
-        for result in service_response['ResultsByTime']:
-            for group in result.get('Groups', []):
-                service_name = group['Keys'][0]
-                amount = float(group['Metrics']['UnblendedCost']['Amount'])
-
-                if service_name not in service_costs:
-                    service_costs[service_name] = 0
-                service_costs[service_name] += amount
-
-        service_metrics = []
-        for service_name, amount in service_costs.items():
-            if amount > 0:
-                friendly_name = service_mapping.get(service_name, service_name)
-                print(f"{friendly_name}: ${amount:.2f}")
-
-                service_metrics.append({
-                    'MetricName': 'ServiceCost',
-                    'Value': amount,
-                    'Unit': 'None',
-                    'Timestamp': datetime.utcnow(),
-                    'Dimensions': [
-                        {'Name': 'Project', 'Value': PROJECT_NAME},
-                        {'Name': 'Environment', 'Value': ENVIRONMENT},
-                        {'Name': 'ServiceName', 'Value': friendly_name}
-                    ]
-                })
-
-        # Publish service metrics
-        if service_metrics:
-            for i in range(0, len(service_metrics), 20):
-                batch = service_metrics[i:i+20]
-                cw_client.put_metric_data(
-                    Namespace=f'{PROJECT_NAME.upper()}/Costs',
-                    MetricData=batch
-                )
-
-        total_days = len(response['ResultsByTime'])
+            publisher.flush()
+            progress['completed'].append(month)
+            save_progress(s3_client, progress)
+
+        print(f"Published {publisher.datums_flushed} metrics in {publisher.calls} PutMetricData call(s)")
+
+        if pending_months:
+            message = f'Backfilled {total_days} days; out of time, invoke again to resume from {pending_months[0]}'
+        else:
+            message = f'Successfully backfilled {total_days} days of cost data'
         return {
             'statusCode': 200,
-            'body': f'Successfully backfilled {total_days} days of cost data'
+            'body': message
         }
 
     except Exception as e:
         print(f"Error: {str(e)}")
         raise
+
+
+def backfill_range(event, today):
+    """
+    Start and (exclusive) end date of the backfill
+
+    Args:
+        event: Handler event with optional months or from/to keys
+        today: Current date
+
+    Returns:
+        Tuple of (start, end) dates, start clamped to what Cost Explorer keeps
+    """
+    earliest = add_months(today.replace(day=1), -(MAX_MONTHS - 1))
+    if 'from' in event:
+        start = date.fromisoformat(event['from'])
+        end = date.fromisoformat(event['to']) if event.get('to') else today
+    elif 'months' in event:
+        months = min(int(event['months']), MAX_MONTHS)
+        start = add_months(today.replace(day=1), -(months - 1))
+        end = today
+    else:
+        start = today - timedelta(days=7)
+        end = today
+
+    if start < earliest:
+        print(f"Cost Explorer only keeps {MAX_MONTHS} months, starting at {earliest}")
+        start = earliest
+    return start, min(end, today)
+
+
+def add_months(day, months):
+    """First-of-month date shifted by a number of months"""
+    index = day.year * 12 + day.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def month_chunks(start, end):
+    """Split [start, end) at month boundaries"""
+    chunk_start = start
+    while chunk_start < end:
+        chunk_end = min(add_months(chunk_start.replace(day=1), 1), end)
+        yield chunk_start, chunk_end
+        chunk_start = chunk_end
+
+
+def fetch_month(start, end):
+    """
+    Daily per-service costs, excluding credits, refunds and taxes
+
+    Args:
+        start: First day
+        end: Day after the last, at most one month later
+
+    Returns:
+        CostRecords keyed by Cost Explorer service name
+    """
+
+    params = {
+        'TimePeriod': {
+            'Start': start.strftime('%Y-%m-%d'),
+            'End': end.strftime('%Y-%m-%d')
+        },
+        'Granularity': 'DAILY',
+        'Metrics': ['UnblendedCost'],
+        'GroupBy': [
+            {
+                'Type': 'DIMENSION',
+                'Key': 'SERVICE'
+            }
+        ],
+        'Filter': {
+            'Not': {
+                'Dimensions': {
+                    'Key': 'RECORD_TYPE',
+                    'Values': ['Credit', 'Refund', 'Tax']
+                }
+            }
+        }
+    }
+
+    records = CostRecords()
+    while True:
+        response = ce_client().get_cost_and_usage(**params)
+        records.add_results(response['ResultsByTime'])
+        if not response.get('NextPageToken'):
+            return records
+        params['NextPageToken'] = response['NextPageToken']
+
+
+def service_name(service):
+    """Friendly name of a Cost Explorer service"""
+    return SERVICE_NAMES.get(service, service)
+
+
+def publish_day(publisher, daily_date, total, services):
+    """Queue one day's total and non-zero service costs at the day's timestamp"""
+    timestamp = datetime.strptime(daily_date, '%Y-%m-%d')
+    publisher.add('DailyCostHistory', float(total), timestamp=timestamp)
+    for friendly_name, amount in sorted(services.items()):
+        if amount > 0:
+            publisher.add(
+                'DailyServiceCost',
+                float(amount),
+                dimensions=[{'Name': 'ServiceName', 'Value': friendly_name}],
+                timestamp=timestamp
+            )
+
+
+def write_history(s3_client, month, days):
+    """
+    Store a month's days that are too old for CloudWatch. Amounts are kept
+    as decimal strings, exactly as summed.
+    """
+    if s3_client is None:
+        print(f"COST_HISTORY_BUCKET not set, dropping {len(days)} day(s) of {month} older than two weeks")
+        return
+    s3_client.put_object(
+        Bucket=HISTORY_BUCKET,
+        Key=f'{HISTORY_PREFIX}{month}.json',
+        Body=json.dumps({'month': month, 'days': days}, sort_keys=True).encode('utf-8'),
+        ContentType='application/json'
+    )
+
+
+def load_progress(s3_client, start, end):
+    """
+    Months already backfilled for this range. Progress is only kept in S3;
+    without COST_HISTORY_BUCKET every run starts over.
+    """
+    progress = {'range': [str(start), str(end)], 'completed': []}
+    if s3_client is None:
+        return progress
+    try:
+        response = s3_client.get_object(Bucket=HISTORY_BUCKET, Key=f'{HISTORY_PREFIX}_backfill.json')
+    except s3_client.exceptions.NoSuchKey:
+        return progress
+    saved = json.loads(response['Body'].read())
+    if saved.get('range') == progress['range']:
+        print(f"Resuming backfill, {len(saved['completed'])} month(s) already done")
+        return saved
+    return progress
+
+
+def save_progress(s3_client, progress):
+    if s3_client is None:
+        return
+    s3_client.put_object(
+        Bucket=HISTORY_BUCKET,
+        Key=f'{HISTORY_PREFIX}_backfill.json',
+        Body=json.dumps(progress, sort_keys=True).encode('utf-8'),
+        ContentType='application/json'
+    )
+
+
+class LocalContext:
+    """Stand-in for the Lambda context when running from the command line"""
+
+    def __init__(self, minutes):
+        self.deadline = time.monotonic() + minutes * 60
+
+    def get_remaining_time_in_millis(self):
+        return int((self.deadline - time.monotonic()) * 1000)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Backfill daily cost metrics')
+    parser.add_argument('--months', type=int, help=f'Months to backfill, up to {MAX_MONTHS}')
+    parser.add_argument('--from', dest='from_date', help='Start date, YYYY-MM-DD')
+    parser.add_argument('--to', dest='to_date', help='End date (exclusive), YYYY-MM-DD')
+    parser.add_argument('--max-minutes', type=float, default=60, help='Stop after this long; rerun to resume')
+    args = parser.parse_args()
+
+    event = {}
+    if args.from_date:
+        event = {'from': args.from_date, 'to': args.to_date}
+    elif args.months:
+        event = {'months': args.months}
+    print(handler(event, LocalContext(args.max_minutes))['body'])
@@ -0,0 +1,152 @@
+"""
+Incremental cache of daily Cost Explorer results
+
+Finalized days almost never change, so the exporter keeps every day it has
+fetched, keyed by date and service, together with the Estimated flag from
+Cost Explorer. Only missing days, days still marked estimated and the newest
+day are queried again.
+"""
+
+import json
+import os
+from datetime import date, timedelta
+
+
+class CostCache:
+    """
+    Daily per-service costs persisted as one JSON document.
+
+    Stored either in S3 (bucket and key) or in a local file (path), the
+    latter for running the exporter outside Lambda. With neither, the cache
+    only lives for the current run.
+
+    Args:
+        s3_client: boto3 S3 client, when the cache lives in S3
+        bucket: Bucket holding the cache object
+        key: Cache object key
+        path: Local file used instead of S3
+        retention_days: Days kept; older entries are dropped on save
+    """
+
+    def __init__(self, s3_client=None, bucket=None, key=None, path=None, retention_days=90):
+        self.s3_client = s3_client
+        self.bucket = bucket
+        self.key = key
+        self.path = path
+        self.retention_days = retention_days
+        self.days = {}
+
+    def load(self):
+        if not self.path and not self.s3_client:
+            return self
+        try:
+            if self.path:
+                with open(self.path) as f:
+                    document = json.load(f)
+            else:
+                response = self.s3_client.get_object(Bucket=self.bucket, Key=self.key)
+                document = json.loads(response['Body'].read())
+        except (FileNotFoundError, self._missing_key_error()):
+            print("No cost cache found, fetching the full lookback window")
+            return self
+        except ValueError as e:
+            # Rewritten from the full lookback window on the next save
+            print(f"Cost cache is not valid JSON ({str(e)}), fetching the full lookback window")
+            return self
+        self.days = document.get('days', {})
+        return self
+
+    def save(self, today=None):
+        oldest = ((today or date.today()) - timedelta(days=self.retention_days)).strftime('%Y-%m-%d')
+        self.days = {day: entry for day, entry in self.days.items() if day >= oldest}
+        if not self.path and not self.s3_client:
+            return
+        body = json.dumps({'version': 1, 'days': self.days}, sort_keys=True)
+        if self.path:
+            with open(self.path, 'w') as f:
+                f.write(body)
+        else:
+            self.s3_client.put_object(
+                Bucket=self.bucket,
+                Key=self.key,
+                Body=body.encode('utf-8'),
+                ContentType='application/json'
+            )
+
+    def stale_days(self, start, end):
+        """
+        Days in [start, end) that have to be fetched again: missing, still
+        estimated, or the newest day of the range
+
+        Args:
+            start: First day as a date
+            end: Day after the last as a date
+
+        Returns:
+            Sorted list of YYYY-MM-DD strings
+        """
+        newest = (end - timedelta(days=1)).strftime('%Y-%m-%d')
+        stale = []
+        for offset in range((end - start).days):
+            day = (start + timedelta(days=offset)).strftime('%Y-%m-%d')
+            entry = self.days.get(day)
+            if entry is None or entry['estimated'] or day == newest:
+                stale.append(day)
+        return stale
+
+    def put_day(self, day, services, estimated):
+        """
+        Replace a day's entries
+
+        Args:
+            day: YYYY-MM-DD
+            services: Dict of group key to amount, as a string so no
+                precision is lost
+            estimated: Estimated flag of the Cost Explorer result
+        """
+        self.days[day] = {'estimated': bool(estimated), 'services': services}
+
+    def services(self, day):
+        """Dict of group key to amount string for a cached day"""
+        return self.days.get(day, {}).get('services', {})
+
+    def estimated(self, day):
+        """Estimated flag of a cached day (False when it is not cached)"""
+        return self.days.get(day, {}).get('estimated', False)
+
+    def _missing_key_error(self):
+        if self.s3_client is None:
+            return FileNotFoundError
+        return self.s3_client.exceptions.NoSuchKey
+
+
+def from_environment(s3_client_factory, name=None):
+    """
+    Cache configured by COST_CACHE_PATH (local file) or COST_CACHE_BUCKET
+    (S3), or None when neither is set
+
+    Args:
+        s3_client_factory: Callable returning an S3 client, only called
+            when the cache lives in S3
+        name: Suffix telling apart the caches of different queries
+    """
+    retention_days = int(os.environ.get('COST_CACHE_DAYS', 90))
+    if os.environ.get('COST_CACHE_PATH'):
+        return CostCache(path=with_suffix(os.environ['COST_CACHE_PATH'], name), retention_days=retention_days)
+    if os.environ.get('COST_CACHE_BUCKET'):
+        return CostCache(
+            s3_client=s3_client_factory(),
+            bucket=os.environ['COST_CACHE_BUCKET'],
+            key=with_suffix(os.environ.get('COST_CACHE_KEY', 'cost-cache/daily.json'), name),
+            retention_days=retention_days
+        )
+    return None
+
+
+def with_suffix(path, name):
+    """daily.json -> daily-<name>.json"""
+    if not name:
+        return path
+    root, ext = os.path.splitext(path)
+    return f'{root}-{name}{ext}'
+
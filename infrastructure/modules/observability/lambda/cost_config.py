@@ -0,0 +1,163 @@
+"""
+Cost breakdown configuration shared by the cost Lambdas
+
+COST_CONFIG (JSON, set from cost_exporter.tf) lists the Cost Explorer
+group-by keys to publish and optional friendly-name maps, e.g.
+
+    {
+        "dimensions": [
+            {"key": "SERVICE"},
+            {"key": "TAG:Service", "names": {"": "untagged"}},
+            {"key": "REGION"}
+        ],
+        "maxSeries": 20
+    }
+
+Supported keys are SERVICE, USAGE_TYPE, REGION, LINKED_ACCOUNT and
+TAG:<tag key>. Without COST_CONFIG only the SERVICE breakdown is published.
+
+An optional "split" lets one exporter run publish for several
+project/environment targets sharing the account. Every query is then also
+grouped by the split key, and each target gets the costs whose split value
+is one of its values (the environment name by default):
+
+    "split": {
+        "key": "TAG:Environment",
+        "targets": [
+            {"project": "sdt", "environment": "dev"},
+            {"project": "sdt", "environment": "production", "values": ["production", "prod"]}
+        ]
+    }
+"""
+
+import json
+import os
+
+# Map AWS service names to friendly names
+SERVICE_NAMES = {
+    'Amazon Elastic Container Service': 'ECS',
+    'Amazon Relational Database Service': 'RDS',
+    'Amazon Elastic Compute Cloud - Compute': 'EC2',
+    'Amazon Simple Storage Service': 'S3',
+    'AWS Amplify': 'Amplify',
+    'Amazon Virtual Private Cloud': 'VPC',
+    'AmazonCloudWatch': 'CloudWatch',
+    'AWS Lambda': 'Lambda',
+    'Amazon CloudFront': 'CloudFront'
+}
+
+# Metric name and CloudWatch dimension name per Cost Explorer key
+BREAKDOWNS = {
+    'SERVICE': ('ServiceCost', 'ServiceName'),
+    'USAGE_TYPE': ('UsageTypeCost', 'UsageType'),
+    'REGION': ('RegionCost', 'Region'),
+    'LINKED_ACCOUNT': ('AccountCost', 'LinkedAccount')
+}
+
+# Cost Explorer accepts at most two group-by keys per request
+MAX_GROUP_BY = 2
+
+# Series published per breakdown; the rest are summed into 'Other'
+DEFAULT_MAX_SERIES = 20
+
+
+def load_config(raw=None):
+    """
+    Parse COST_CONFIG
+
+    Args:
+        raw: JSON string (defaults to the COST_CONFIG env var)
+
+    Returns:
+        Dict with 'dimensions' (list of dicts with key, metric, dimension
+        and names), 'maxSeries' and 'split' (None, or a dict with the split
+        dimension and its targets)
+    """
+    config = json.loads(raw or os.environ.get('COST_CONFIG') or '{}')
+    dimensions = [parse_dimension(entry) for entry in config.get('dimensions') or [{'key': 'SERVICE'}]]
+
+    split = None
+    if config.get('split'):
+        split = {
+            'dimension': parse_dimension({'key': config['split']['key']}),
+            'targets': [
+                {
+                    'project': target.get('project') or os.environ.get('PROJECT_NAME', 'sdt'),
+                    'environment': target['environment'],
+                    'values': target.get('values') or [target['environment']]
+                }
+                for target in config['split']['targets']
+            ]
+        }
+    return {
+        'dimensions': dimensions,
+        'maxSeries': int(config.get('maxSeries', DEFAULT_MAX_SERIES)),
+        'split': split
+    }
+
+
+def parse_dimension(entry):
+    """Breakdown settings of one COST_CONFIG dimension entry"""
+    key = entry['key']
+    if key.startswith('TAG:'):
+        metric, dimension = 'TagCost', key[len('TAG:'):]
+    elif key in BREAKDOWNS:
+        metric, dimension = BREAKDOWNS[key]
+    else:
+        raise ValueError(f"Unsupported cost dimension {key}")
+    names = dict(SERVICE_NAMES) if key == 'SERVICE' else {}
+    names.update(entry.get('names', {}))
+    return {
+        'key': key,
+        'metric': entry.get('metric', metric),
+        'dimension': entry.get('dimension', dimension),
+        'names': names
+    }
+
+
+def query_plan(dimensions, split=None):
+    """
+    Split the breakdowns into Cost Explorer queries of up to two group-by
+    keys each. With a split dimension, it takes the first key of every
+    query, leaving room for one breakdown per query.
+    """
+    if split:
+        return [[split, dimension] for dimension in dimensions]
+    return [dimensions[i:i + MAX_GROUP_BY] for i in range(0, len(dimensions), MAX_GROUP_BY)]
+
+
+def group_by(dimension):
+    """GroupBy entry for a breakdown"""
+    if dimension['key'].startswith('TAG:'):
+        return {'Type': 'TAG', 'Key': dimension['dimension']}
+    return {'Type': 'DIMENSION', 'Key': dimension['key']}
+
+
+def friendly_name(dimension, value):
+    """
+    Display value of a group key. Tag keys come back as '<tag>$<value>',
+    with an empty value for untagged resources.
+    """
+    if dimension['key'].startswith('TAG:'):
+        value = value.split('$', 1)[-1]
+    name = dimension['names'].get(value, value)
+    return name or 'untagged'
+
+
+def cap_series(amounts, max_series):
+    """
+    Keep the max_series largest values and sum the rest into 'Other', so the
+    number of metric series stays bounded
+
+    Args:
+        amounts: Dict of display value to amount
+        max_series: Series to keep
+
+    Returns:
+        Dict of display value to amount with at most max_series + 1 entries
+    """
+    ranked = sorted(amounts.items(), key=lambda item: (-item[1], item[0]))
+    capped = dict(ranked[:max_series])
+    if len(ranked) > max_series:
+        capped['Other'] = capped.get('Other', 0) + sum(amount for _, amount in ranked[max_series:])
+    return capped
@@ -5,269 +5,439 @@ This function fetches cost data from AWS Cost Explorer (excluding credits)
 and publishes it as custom CloudWatch metrics for Grafana dashboards.
 """
 
-import boto3
+import functools
 import os
 from datetime import datetime, timedelta
-from decimal import Decimal
 
-ce_client = boto3.client('ce', region_name='us-east-1')
-cw_client = boto3.client('cloudwatch')
+import aws_clients
+import cost_analysis
+import cost_cache
+import cost_config
+import cost_records
+from metric_publisher import MetricPublisher, publisher_client
 
 PROJECT_NAME = os.environ.get('PROJECT_NAME', 'sdt')
 ENVIRONMENT = os.environ.get('ENVIRONMENT', 'dev')
 
+# Days of history behind the anomaly baselines
+ANOMALY_WINDOW_DAYS = int(os.environ.get('ANOMALY_WINDOW_DAYS', 28))
+
+# Cross-check the month-end projection with get_cost_forecast (a paid request)
+COST_FORECAST = os.environ.get('COST_FORECAST', 'false').lower() == 'true'
+
+
+def ce_client():
+    """Cost Explorer client (the API is only served from us-east-1)"""
+    return aws_clients.client('ce', region_name='us-east-1')
+
 
 def handler(event, context):
     """
     Main handler function that:
     1. Fetches cost data from Cost Explorer (excluding credits)
-    2. Publishes metrics to CloudWatch
+    2. Publishes metrics to CloudWatch, for this project and environment or,
+       with a split configured, for every target sharing the account
     """
 
+    cw_client = publisher_client()
+    publishers = {}
+
     try:
-        # Calculate date range (yesterday, last 7 days, and month-to-date)
+        # Calculate date range (last 7 days, month-to-date and the anomaly
+        # baseline window)
         end_date = datetime.now().date()
-        start_date_1d = end_date - timedelta(days=1)
         start_date_7d = end_date - timedelta(days=7)
         start_date_mtd = end_date.replace(day=1)  # First day of current month
+        start_date = min(start_date_7d, start_date_mtd, end_date - timedelta(days=ANOMALY_WINDOW_DAYS + 1))
 
         # Format dates for Cost Explorer API
         end_str = end_date.strftime('%Y-%m-%d')
-        start_1d_str = start_date_1d.strftime('%Y-%m-%d')
-        start_7d_str = start_date_7d.strftime('%Y-%m-%d')
         start_mtd_str = start_date_mtd.strftime('%Y-%m-%d')
 
-        print(f"Fetching costs from {start_1d_str} to {end_str}")
+        # Each query covers up to two breakdowns; the first also gives the
+        # daily and month-to-date totals. With a split, every query is also
+        # grouped by the split key and covers a single breakdown.
+        config = cost_config.load_config()
+        split = config['split']
+        queries = cost_config.query_plan(config['dimensions'], split['dimension'] if split else None)
+        days = [
+            (start_date + timedelta(days=offset)).strftime('%Y-%m-%d')
+            for offset in range((end_date - start_date).days)
+        ]
+        records = [
+            cached_records(refresh_cache(query, start_date, end_date), days)
+            for query in queries
+        ]
         print(f"Month-to-date period: {start_mtd_str} to {end_str}")
 
-        # Fetch total cost (last 7 days) excluding credits
-        total_cost_response = ce_client.get_cost_and_usage(
-            TimePeriod={
-                'Start': start_7d_str,  # Changed from start_1d_str to get 7 days
-                'End': end_str
-            },
-            Granularity='DAILY',
-            Metrics=['UnblendedCost'],
-            Filter={
-                'Not': {
-                    'Dimensions': {
-                        'Key': 'RECORD_TYPE',
-                        'Values': ['Credit', 'Refund', 'Tax']
-                    }
-                }
-            }
+        if split:
+            targets = split['targets']
+            breakdowns = [query[1:] for query in queries]
+            target_records = split_records(records, split, days)
+        else:
+            targets = [{'project': PROJECT_NAME, 'environment': ENVIRONMENT}]
+            breakdowns = queries
+            target_records = {(PROJECT_NAME, ENVIRONMENT): records}
+
+        # One publisher per namespace; the points of every target in it go
+        # out in shared batches. A target that fails does not keep the
+        # others from being published; the run fails once all are done.
+        total_amount = cost_records.ZERO
+        failed = []
+        for target in targets:
+            namespace = f"{target['project'].upper()}/Costs"
+            if namespace not in publishers:
+                publishers[namespace] = MetricPublisher(cw_client, namespace=namespace)
+            publisher = publishers[namespace].scoped([
+                {'Name': 'Project', 'Value': target['project']},
+                {'Name': 'Environment', 'Value': target['environment']}
+            ])
+            if split:
+                print(f"\n=== {target['project']}/{target['environment']} ===")
+            try:
+                total_amount += publish_costs(
+                    publisher,
+                    breakdowns,
+                    target_records[(target['project'], target['environment'])],
+                    days,
+                    end_date,
+                    config['maxSeries'],
+                    forecast_filter=split_filter(split, target) if split else None
+                )
+            except Exception as e:
+                print(f"Error publishing costs of {target['project']}/{target['environment']}: {str(e)}")
+                failed.append(f"{target['project']}/{target['environment']}")
+
+        for namespace, publisher in publishers.items():
+            try:
+                publisher.flush()
+            except Exception as e:
+                print(f"Error publishing metrics to {namespace}: {str(e)}")
+                failed.append(namespace)
+        print(
+            f"Published {sum(p.datums_flushed for p in publishers.values())} metrics in "
+            f"{sum(p.calls for p in publishers.values())} PutMetricData call(s)"
         )
+        if failed:
+            raise RuntimeError(f"Cost metrics not published for {', '.join(failed)}")
 
-        # Fetch cost by service (last 7 days) excluding credits
-        service_cost_response = ce_client.get_cost_and_usage(
-            TimePeriod={
-                'Start': start_7d_str,
-                'End': end_str
-            },
-            Granularity='DAILY',
-            Metrics=['UnblendedCost'],
-            GroupBy=[
-                {
-                    'Type': 'DIMENSION',
-                    'Key': 'SERVICE'
-                }
-            ],
-            Filter={
-                'Not': {
-                    'Dimensions': {
-                        'Key': 'RECORD_TYPE',
-                        'Values': ['Credit', 'Refund', 'Tax']
-                    }
-                }
-            }
-        )
+        if split:
+            body = f'Successfully published cost metrics for {len(targets)} targets. Total: ${total_amount:.2f}'
+        else:
+            body = f'Successfully published cost metrics. Total: ${total_amount:.2f}'
+        return {
+            'statusCode': 200,
+            'body': body
+        }
 
-        # Fetch month-to-date cost excluding credits
-        mtd_cost_response = ce_client.get_cost_and_usage(
-            TimePeriod={
-                'Start': start_mtd_str,
-                'End': end_str
-            },
-            Granularity='MONTHLY',
-            Metrics=['UnblendedCost'],
-            Filter={
-                'Not': {
-                    'Dimensions': {
-                        'Key': 'RECORD_TYPE',
-                        'Values': ['Credit', 'Refund', 'Tax']
-                    }
-                }
-            }
-        )
+    except Exception as e:
+        print(f"Error: {str(e)}")
+        raise
 
-        # Process and publish total cost
-        if total_cost_response['ResultsByTime']:
-            latest_cost = total_cost_response['ResultsByTime'][-1]
-            total_amount = float(latest_cost['Total']['UnblendedCost']['Amount'])
 
-            print(f"Total cost (last 24h): ${total_amount:.2f}")
+def publish_costs(publisher, breakdowns, records, days, end_date, max_series, forecast_filter=None):
+    """
+    Queue the cost metrics of one project/environment
 
-            # Publish total cost metric
-            publish_metric(
-                metric_name='TotalCost',
-                value=total_amount,
-                unit='None',
-                dimensions=[]
+    Args:
+        publisher: MetricPublisher (or a scoped one) to queue the points on
+        breakdowns: Breakdowns of each query, matching records
+        records: CostRecords per query; the first also gives the totals
+        days: Every YYYY-MM-DD of the lookback window, oldest first
+        end_date: Today; the window ends the day before
+        max_series: Series published per breakdown
+        forecast_filter: Optional Cost Explorer filter limiting the
+            forecast to this target's costs
+
+    Returns:
+        Total cost of the latest day, as a Decimal
+    """
+    start_7d_str = (end_date - timedelta(days=7)).strftime('%Y-%m-%d')
+    start_mtd_str = end_date.replace(day=1).strftime('%Y-%m-%d')
+
+    # All sums are exact Decimals; values become floats when published
+    history = records[0].daily_totals(days)
+    daily_costs = {day: amount for day, amount in history.items() if day >= start_7d_str}
+    mtd_amount = sum((amount for day, amount in history.items() if day >= start_mtd_str), cost_records.ZERO)
+
+    # Process and publish total cost
+    total_amount = cost_records.ZERO
+    if daily_costs:
+        total_amount = daily_costs[max(daily_costs)]
+
+        print(f"Total cost (last 24h): ${total_amount:.2f}")
+
+        # Publish total cost metric
+        publisher.add('TotalCost', float(total_amount))
+
+    # Process and publish month-to-date cost
+    print(f"Month-to-date cost: ${mtd_amount:.2f}")
+
+    # Publish MTD cost metric
+    publisher.add('MonthToDateCost', float(mtd_amount))
+
+    # Process and publish daily costs for the last 7 days
+    print(f"\nPublishing daily cost data for last 7 days...")
+    for daily_date in sorted(daily_costs):
+        daily_amount = daily_costs[daily_date]
+
+        # Parse the date
+        result_datetime = datetime.strptime(daily_date, '%Y-%m-%d')
+
+        print(f"Date: {daily_date}, Cost: ${daily_amount:.2f}")
+
+        # Publish with timestamp for that specific day
+        publisher.add('TotalCost', float(daily_amount), timestamp=result_datetime)
+
+    # Publish each breakdown, capped to the largest series
+    published_services = []
+    service_history = {}
+    for query, query_records in zip(breakdowns, records):
+        recent = query_records.between(start_7d_str)
+        for index, dimension in enumerate(query):
+            display_name = functools.partial(cost_config.friendly_name, dimension)
+            sums = recent.by_group(index, display_name)
+            if dimension['key'] == 'SERVICE':
+                service_history = query_records.daily_by_group(index, display_name)
+
+            print(f"\n{dimension['key']} costs (last 7 days):")
+            nonzero = {name: amount for name, amount in sums.items() if amount > 0}  # Only publish non-zero costs
+            for name, amount in cost_config.cap_series(nonzero, max_series).items():
+                print(f"{name}: ${amount:.2f}")
+
+                publisher.add(
+                    dimension['metric'],
+                    float(amount),
+                    dimensions=[{'Name': dimension['dimension'], 'Value': name}]
+                )
+                if dimension['key'] == 'SERVICE' and name != 'Other':
+                    published_services.append((dimension['dimension'], name))
+
+    # Cost Explorer keeps the newest days estimated (at 00:00 UTC yesterday
+    # is still partial), so scores and the projection use final days only
+    estimated_days = records[0].estimated_days()
+    final_days = [day for day in days if day not in estimated_days]
+
+    # Anomaly scores of the latest final day against its baseline
+    print(f"\nCost anomaly scores (baseline of {ANOMALY_WINDOW_DAYS} days):")
+    totals = [float(history[day]) for day in final_days]
+    score = cost_analysis.anomaly_score(totals[:-1], totals[-1]) if totals else None
+    if score is not None:
+        print(f"Total: {score:.2f}")
+        publisher.add('CostAnomalyScore', score)
+    for dimension_name, name in published_services:
+        series = [float(service_history.get(name, {}).get(day, 0)) for day in final_days]
+        score = cost_analysis.anomaly_score(series[:-1], series[-1])
+        if score is not None:
+            print(f"{name}: {score:.2f}")
+            publisher.add(
+                'CostAnomalyScore',
+                score,
+                dimensions=[{'Name': dimension_name, 'Value': name}]
             )
 
-        # Process and publish month-to-date cost
-        if mtd_cost_response['ResultsByTime']:
-            mtd_cost = mtd_cost_response['ResultsByTime'][0]
-            mtd_amount = float(mtd_cost['Total']['UnblendedCost']['Amount'])
+    # Month-end projection from the recent daily rate, counting the
+    # estimated days as still to come
+    final_mtd = sum((history[day] for day in final_days if day >= start_mtd_str), cost_records.ZERO)
+    next_day = end_date.replace(day=1)
+    if final_days:
+        next_day = max(next_day, datetime.strptime(final_days[-1], '%Y-%m-%d').date() + timedelta(days=1))
+    projected = cost_analysis.projected_month_end(float(final_mtd), totals[-7:], next_day)
+    print(f"Projected month-end cost: ${projected:.2f}")
+    publisher.add('ProjectedMonthEndCost', projected)
+    if COST_FORECAST:
+        forecast = fetch_forecast(end_date, forecast_filter)
+        if forecast is not None:
+            forecast_total = float(mtd_amount) + forecast
+            print(f"Cost Explorer forecast: ${forecast_total:.2f} ({forecast_total - projected:+.2f} vs projection)")
+            publisher.add('ForecastMonthEndCost', forecast_total)
+
+    return total_amount
+
+
+def split_records(records, split, days):
+    """
+    Divide the records of split queries between the targets
 
-            print(f"Month-to-date cost: ${mtd_amount:.2f}")
+    Args:
+        records: CostRecords per query, grouped by the split key first
+        split: Split settings from cost_config.load_config
+        days: Days of the lookback window, for the unallocated report
 
-            # Publish MTD cost metric
-            publish_metric(
-                metric_name='MonthToDateCost',
-                value=mtd_amount,
-                unit='None',
-                dimensions=[]
-            )
+    Returns:
+        Dict of (project, environment) to CostRecords per query, without
+        the split key
+    """
+    owners = {}
+    for target in split['targets']:
+        for value in target['values']:
+            owners.setdefault(value, []).append((target['project'], target['environment']))
+
+    def assign(value):
+        return owners.get(cost_config.friendly_name(split['dimension'], value), [])
+
+    partitions = [query_records.partition(0, assign) for query_records in records]
+    unallocated = records[0].total() - sum(
+        (partition.total() for partition in partitions[0].values()), cost_records.ZERO
+    )
+    if unallocated:
+        print(f"Costs matching no target from {days[0]} on: ${unallocated:.2f}")
+
+    return {
+        (target['project'], target['environment']): [
+            partition.get((target['project'], target['environment']), cost_records.CostRecords())
+            for partition in partitions
+        ]
+        for target in split['targets']
+    }
 
-        # Process and publish daily costs for the last 7 days
-        print(f"\nPublishing daily cost data for last 7 days...")
-        if total_cost_response['ResultsByTime']:
-            for daily_result in total_cost_response['ResultsByTime']:
-                daily_date = daily_result['TimePeriod']['Start']
-                daily_amount = float(daily_result['Total']['UnblendedCost']['Amount'])
-
-                # Parse the date
-                result_datetime = datetime.strptime(daily_date, '%Y-%m-%d')
-
-                print(f"Date: {daily_date}, Cost: ${daily_amount:.2f}")
-
-                # Publish with timestamp for that specific day
-                publish_metric_with_timestamp(
-                    metric_name='TotalCost',
-                    value=daily_amount,
-                    unit='None',
-                    dimensions=[],
-                    timestamp=result_datetime
-                )
 
-        # Process and publish cost by service
-        service_costs = {}
-        for result in service_cost_response['ResultsByTime']:
-            for group in result.get('Groups', []):
-                service_name = group['Keys'][0]
-                amount = float(group['Metrics']['UnblendedCost']['Amount'])
-
-                if service_name not in service_costs:
-                    service_costs[service_name] = 0
-                service_costs[service_name] += amount
-
-        # Map AWS service names to friendly names
-        service_mapping = {
-            'Amazon Elastic Container Service': 'ECS',
-            'Amazon Relational Database Service': 'RDS',
-            'Amazon Elastic Compute Cloud - Compute': 'EC2',
-            'Amazon Simple Storage Service': 'S3',
-            'AWS Amplify': 'Amplify',
-            'Amazon Virtual Private Cloud': 'VPC',
-            'AmazonCloudWatch': 'CloudWatch',
-            'AWS Lambda': 'Lambda',
-            'Amazon CloudFront': 'CloudFront'
-        }
+def split_filter(split, target):
+    """Cost Explorer filter matching one target's costs"""
+    dimension = split['dimension']
+    if dimension['key'].startswith('TAG:'):
+        return {'Tags': {'Key': dimension['dimension'], 'Values': target['values']}}
+    return {'Dimensions': {'Key': dimension['key'], 'Values': target['values']}}
 
-        # Publish service-specific metrics
-        for service_name, amount in service_costs.items():
-            if amount > 0:  # Only publish non-zero costs
-                friendly_name = service_mapping.get(service_name, service_name)
-                print(f"{friendly_name}: ${amount:.2f}")
-
-                publish_metric(
-                    metric_name='ServiceCost',
-                    value=amount,
-                    unit='None',
-                    dimensions=[
-                        {'Name': 'ServiceName', 'Value': friendly_name}
-                    ]
-                )
 
-        return {
-            'statusCode': 200,
-            'body': f'Successfully published cost metrics. Total: ${total_amount:.2f}'
-        }
+def refresh_cache(query, start_date, end_date):
+    """
+    Load the cache of one query and fetch the days it is missing.
 
-    except Exception as e:
-        print(f"Error: {str(e)}")
-        raise
+    Days already cached as final are not fetched again; without a configured
+    cache everything is fetched and kept for this run only.
 
+    Args:
+        query: Breakdowns grouped in this query (from cost_config.query_plan)
+        start_date: First day needed
+        end_date: Day after the last
 
-def publish_metric(metric_name, value, unit, dimensions):
+    Returns:
+        The CostCache, keyed by '|'-joined group keys
     """
-    Publish a metric to CloudWatch
-
-    Args:
-        metric_name: Name of the metric
-        value: Metric value
-        unit: Unit of measurement
-        dimensions: List of dimension dicts with Name and Value keys
+    keys = [dimension['key'] for dimension in query]
+    name = None if keys == ['SERVICE'] else '-'.join(key.replace(':', '_') for key in keys)
+    cache = cost_cache.from_environment(lambda: aws_clients.client('s3'), name=name) or cost_cache.CostCache()
+    cache.load()
+    if cache.path or cache.s3_client:
+        start_date = min(start_date, end_date - timedelta(days=cache.retention_days))
+
+    end_str = end_date.strftime('%Y-%m-%d')
+    stale_days = cache.stale_days(start_date, end_date)
+    if not stale_days:
+        print(f"All {'/'.join(keys)} costs up to {end_str} are cached")
+        return cache
+
+    print(f"Fetching {'/'.join(keys)} costs from {stale_days[0]} to {end_str} ({len(stale_days)} day(s) to refresh)")
+    fetched = {}
+    for result in fetch_daily_costs(stale_days[0], end_str, [cost_config.group_by(d) for d in query]):
+        day = fetched.setdefault(result['TimePeriod']['Start'], {'services': {}, 'estimated': False})
+        day['estimated'] = day['estimated'] or result.get('Estimated', False)
+        for group in result.get('Groups', []):
+            day['services']['|'.join(group['Keys'])] = group['Metrics']['UnblendedCost']['Amount']
+    for daily_date, day in fetched.items():
+        cache.put_day(daily_date, day['services'], day['estimated'])
+    cache.save(today=end_date)
+    return cache
+
+
+def cached_records(cache, days):
     """
+    Parse the cached amounts of the given days into CostRecords
 
-    metric_data = {
-        'MetricName': metric_name,
-        'Value': value,
-        'Unit': unit,
-        'Timestamp': datetime.utcnow(),
-        'Dimensions': [
-            {'Name': 'Project', 'Value': PROJECT_NAME},
-            {'Name': 'Environment', 'Value': ENVIRONMENT}
-        ]
-    }
-
-    # Add additional dimensions
-    metric_data['Dimensions'].extend(dimensions)
+    Args:
+        cache: CostCache from refresh_cache
+        days: YYYY-MM-DD dates to include
 
-    try:
-        cw_client.put_metric_data(
-            Namespace=f'{PROJECT_NAME.upper()}/Costs',
-            MetricData=[metric_data]
-        )
-        print(f"Published metric: {metric_name} = {value}")
-    except Exception as e:
-        print(f"Error publishing metric {metric_name}: {str(e)}")
-        raise
+    Returns:
+        CostRecords of every group on those days
+    """
+    records = cost_records.CostRecords()
+    for day in days:
+        records.add_day(day, cache.services(day), cache.estimated(day))
+    return records
 
 
-def publish_metric_with_timestamp(metric_name, value, unit, dimensions, timestamp):
+def fetch_daily_costs(start, end, group_by):
     """
-    Publish a metric to CloudWatch with a specific timestamp
+    Daily grouped costs, excluding credits, refunds and taxes
+
+    Follows NextPageToken, so long group lists are not cut off. A day may
+    appear on several pages with different groups.
 
     Args:
-        metric_name: Name of the metric
-        value: Metric value
-        unit: Unit of measurement
-        dimensions: List of dimension dicts with Name and Value keys
-        timestamp: Datetime object for the metric timestamp
+        start: First day, YYYY-MM-DD
+        end: Day after the last, YYYY-MM-DD
+        group_by: Cost Explorer GroupBy entries (at most two)
+
+    Returns:
+        Generator of ResultsByTime entries
     """
 
-    metric_data = {
-        'MetricName': metric_name,
-        'Value': value,
-        'Unit': unit,
-        'Timestamp': timestamp,
-        'Dimensions': [
-            {'Name': 'Project', 'Value': PROJECT_NAME},
-            {'Name': 'Environment', 'Value': ENVIRONMENT}
-        ]
+    params = {
+        'TimePeriod': {
+            'Start': start,
+            'End': end
+        },
+        'Granularity': 'DAILY',
+        'Metrics': ['UnblendedCost'],
+        'GroupBy': group_by,
+        'Filter': {
+            'Not': {
+                'Dimensions': {
+                    'Key': 'RECORD_TYPE',
+                    'Values': ['Credit', 'Refund', 'Tax']
+                }
+            }
+        }
     }
 
-    # Add additional dimensions
-    metric_data['Dimensions'].extend(dimensions)
+    while True:
+        response = ce_client().get_cost_and_usage(**params)
+        for result in response['ResultsByTime']:
+            yield result
+        if not response.get('NextPageToken'):
+            break
+        params['NextPageToken'] = response['NextPageToken']
+
+
+def fetch_forecast(today, target_filter=None):
+    """
+    Cost Explorer's forecast for the rest of the month, excluding credits,
+    refunds and taxes
+
+    Args:
+        today: First day of the forecast period
+        target_filter: Optional filter narrowing the forecast to one
+            target (from split_filter)
 
+    Returns:
+        Forecast amount from today to the end of the month, or None when
+        Cost Explorer has none (e.g. too little history)
+    """
+    next_month = (today.replace(day=1) + timedelta(days=32)).replace(day=1)
+    cost_filter = {
+        'Not': {
+            'Dimensions': {
+                'Key': 'RECORD_TYPE',
+                'Values': ['Credit', 'Refund', 'Tax']
+            }
+        }
+    }
+    if target_filter:
+        cost_filter = {'And': [cost_filter, target_filter]}
     try:
-        cw_client.put_metric_data(
-            Namespace=f'{PROJECT_NAME.upper()}/Costs',
-            MetricData=[metric_data]
+        response = ce_client().get_cost_forecast(
+            TimePeriod={
+                'Start': today.strftime('%Y-%m-%d'),
+                'End': next_month.strftime('%Y-%m-%d')
+            },
+            Metric='UNBLENDED_COST',
+            Granularity='MONTHLY',
+            Filter=cost_filter
         )
-        print(f"Published metric: {metric_name} = {value} at {timestamp}")
     except Exception as e:
-        print(f"Error publishing metric {metric_name}: {str(e)}")
-        raise
+        # The projection is still published; the forecast is only a cross-check
+        print(f"Error fetching cost forecast: {str(e)}")
+        return None
+    return float(response['Total']['Amount'])
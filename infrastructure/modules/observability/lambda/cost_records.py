@@ -0,0 +1,187 @@
+"""
+Decimal-exact daily cost records shared by the cost Lambdas
+
+Cost Explorer returns amounts as decimal strings. Each one is parsed once
+into a CostRecord holding a Decimal, and totals, per-group sums and daily
+series are all summed from those records, so published figures match the
+billing console instead of drifting with float rounding over hundreds of
+line items. Amounts only become floats when they are published.
+"""
+
+from decimal import Decimal
+
+ZERO = Decimal('0')
+
+
+class CostRecord:
+    """
+    Cost of one group on one day
+
+    Args:
+        date: YYYY-MM-DD
+        keys: Tuple of group key values, e.g. ('AWS Lambda',) or
+            ('AWS Lambda', 'us-east-1') for two group-by keys
+        amount: Decimal amount
+        estimated: Whether Cost Explorer still marks the day as estimated
+    """
+
+    __slots__ = ('date', 'keys', 'amount', 'estimated')
+
+    def __init__(self, date, keys, amount, estimated=False):
+        self.date = date
+        self.keys = keys
+        self.amount = amount
+        self.estimated = estimated
+
+    def __repr__(self):
+        return f"CostRecord({self.date!r}, {self.keys!r}, {self.amount!r}, {self.estimated!r})"
+
+
+class CostRecords:
+    """
+    Array of CostRecord entries with the aggregations the exporter and the
+    backfill need
+
+    Args:
+        records: Optional iterable of CostRecord
+    """
+
+    __slots__ = ('records',)
+
+    def __init__(self, records=None):
+        self.records = list(records or [])
+
+    def __len__(self):
+        return len(self.records)
+
+    def __iter__(self):
+        return iter(self.records)
+
+    def add_results(self, results):
+        """
+        Parse Cost Explorer ResultsByTime entries
+
+        Args:
+            results: Iterable of ResultsByTime entries with Groups and
+                UnblendedCost amounts
+
+        Returns:
+            self, for chaining
+        """
+        for result in results:
+            day = result['TimePeriod']['Start']
+            estimated = bool(result.get('Estimated', False))
+            for group in result.get('Groups', []):
+                amount = Decimal(group['Metrics']['UnblendedCost']['Amount'])
+                self.records.append(CostRecord(day, tuple(group['Keys']), amount, estimated))
+        return self
+
+    def add_day(self, day, groups, estimated=False):
+        """
+        Add one day of cached amounts
+
+        Args:
+            day: YYYY-MM-DD
+            groups: Dict of '|'-joined group keys to amount strings (as kept
+                by CostCache)
+            estimated: Estimated flag of the day
+
+        Returns:
+            self, for chaining
+        """
+        for group_key, amount in groups.items():
+            self.records.append(CostRecord(day, tuple(group_key.split('|')), Decimal(amount), estimated))
+        return self
+
+    def between(self, start, end=None):
+        """Records from start up to (excluding) end, both YYYY-MM-DD"""
+        return CostRecords(
+            record for record in self.records
+            if record.date >= start and (end is None or record.date < end)
+        )
+
+    def total(self):
+        return sum((record.amount for record in self.records), ZERO)
+
+    def days(self):
+        """Sorted dates that have records"""
+        return sorted({record.date for record in self.records})
+
+    def estimated_days(self):
+        """Set of dates Cost Explorer still marks as estimated"""
+        return {record.date for record in self.records if record.estimated}
+
+    def by_day(self):
+        """Dict of date to the CostRecords of that day"""
+        days = {}
+        for record in self.records:
+            days.setdefault(record.date, CostRecords()).records.append(record)
+        return days
+
+    def daily_totals(self, days=None):
+        """
+        Total per day
+
+        Args:
+            days: Optional dates to include even without records (as zero)
+
+        Returns:
+            Dict of date to Decimal
+        """
+        totals = {day: ZERO for day in days or []}
+        for record in self.records:
+            totals[record.date] = totals.get(record.date, ZERO) + record.amount
+        return totals
+
+    def by_group(self, index=0, name=None):
+        """
+        Sum per value of one group key
+
+        Args:
+            index: Position of the group key (0 or 1)
+            name: Optional callable mapping a key value to its display name;
+                values sharing a display name are summed together
+
+        Returns:
+            Dict of display name to Decimal
+        """
+        sums = {}
+        for record in self.records:
+            group = name(record.keys[index]) if name else record.keys[index]
+            sums[group] = sums.get(group, ZERO) + record.amount
+        return sums
+
+    def daily_by_group(self, index=0, name=None):
+        """
+        Daily series per value of one group key
+
+        Returns:
+            Dict of display name to a dict of date to Decimal
+        """
+        series = {}
+        for record in self.records:
+            group = name(record.keys[index]) if name else record.keys[index]
+            days = series.setdefault(group, {})
+            days[record.date] = days.get(record.date, ZERO) + record.amount
+        return series
+
+    def partition(self, index, assign):
+        """
+        Split the records on one group key, dropping that key
+
+        Args:
+            index: Position of the group key to split on
+            assign: Callable mapping a key value to a list of partition
+                names (empty to leave the record out)
+
+        Returns:
+            Dict of partition name to CostRecords
+        """
+        partitions = {}
+        for record in self.records:
+            for partition in assign(record.keys[index]):
+                keys = record.keys[:index] + record.keys[index + 1:]
+                partitions.setdefault(partition, CostRecords()).records.append(
+                    CostRecord(record.date, keys, record.amount, record.estimated)
+                )
+        return partitions
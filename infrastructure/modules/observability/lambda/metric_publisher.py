@@ -0,0 +1,195 @@
+"""
+Batched CloudWatch metric publisher shared by the cost Lambdas
+
+Collects MetricDatum entries and sends them with as few PutMetricData calls
+as the API limits allow, instead of one call per data point.
+"""
+
+import random
+import time
+from datetime import datetime
+
+import aws_clients
+
+# PutMetricData limits: 1000 datums and 1 MB of request payload per call,
+# and 150 distinct values in one datum's Values array
+MAX_DATUMS_PER_CALL = 1000
+MAX_REQUEST_BYTES = 1024 * 1024
+MAX_VALUES_PER_DATUM = 150
+
+# Errors worth retrying; anything else (e.g. a bad dimension) fails at once
+RETRYABLE_ERRORS = ('Throttling', 'ThrottlingException', 'ServiceUnavailable', 'InternalFailure')
+
+# The publisher retries a failed batch itself, so its client makes a single
+# attempt per call instead of running botocore's retries inside each one
+CLIENT_RETRIES = {'mode': 'standard', 'max_attempts': 1}
+
+
+def publisher_client():
+    """CloudWatch client for a MetricPublisher, without botocore retries"""
+    return aws_clients.client('cloudwatch', retries=CLIENT_RETRIES)
+
+
+class MetricPublisher:
+    """
+    Buffers metric data points and flushes them in batched PutMetricData calls.
+
+    Points sharing a metric name, dimensions, timestamp and unit are merged
+    into one datum using the Values/Counts arrays. A batch is sent as soon as
+    it would exceed the datum or payload limit, and a failed batch is retried
+    on its own with jittered backoff.
+
+    Args:
+        cw_client: boto3 CloudWatch client (or any object with put_metric_data),
+            normally publisher_client()
+        namespace: Metric namespace, e.g. SDT/Costs
+        base_dimensions: Dimensions added to every datum (e.g. Project, Environment)
+        max_attempts: Attempts per batch before the error is raised
+        sleep: Sleep function (replaceable in tests)
+    """
+
+    def __init__(self, cw_client, namespace, base_dimensions=None, max_attempts=5, sleep=time.sleep):
+        self.cw_client = cw_client
+        self.namespace = namespace
+        self.base_dimensions = list(base_dimensions or [])
+        self.max_attempts = max_attempts
+        self.sleep = sleep
+        self.pending = {}
+        self.pending_bytes = 0
+        self.datums_flushed = 0
+        self.calls = 0
+
+    def add(self, metric_name, value, dimensions=None, timestamp=None, unit='None'):
+        """
+        Queue one data point
+
+        Args:
+            metric_name: Name of the metric
+            value: Metric value
+            dimensions: List of dimension dicts with Name and Value keys,
+                added after the base dimensions
+            timestamp: Datetime of the point (defaults to now)
+            unit: Unit of measurement
+        """
+        dimensions = self.base_dimensions + list(dimensions or [])
+        timestamp = timestamp or datetime.utcnow()
+        key = (
+            metric_name,
+            tuple((d['Name'], d['Value']) for d in dimensions),
+            timestamp,
+            unit
+        )
+
+        datum = self.pending.get(key)
+        if datum is not None and (value in datum['values'] or len(datum['values']) < MAX_VALUES_PER_DATUM):
+            before = encoded_size(self._render(datum))
+            datum['values'][value] = datum['values'].get(value, 0) + 1
+            self.pending_bytes += encoded_size(self._render(datum)) - before
+            if self.pending_bytes > MAX_REQUEST_BYTES:
+                self.flush()
+            return
+
+        if datum is not None:
+            # The datum is full; send what is buffered and start a fresh one
+            self.flush()
+
+        datum = {'name': metric_name, 'dimensions': dimensions, 'timestamp': timestamp, 'unit': unit,
+                 'values': {value: 1}}
+        size = encoded_size(self._render(datum))
+        if len(self.pending) >= MAX_DATUMS_PER_CALL or self.pending_bytes + size > MAX_REQUEST_BYTES:
+            self.flush()
+        self.pending[key] = datum
+        self.pending_bytes += size
+
+    def scoped(self, dimensions):
+        """
+        Publisher that adds dimensions to every point but shares this one's
+        buffer, so points of several projects or environments are sent in
+        the same batches
+
+        Args:
+            dimensions: List of dimension dicts with Name and Value keys
+        """
+        return ScopedPublisher(self, dimensions)
+
+    def flush(self):
+        """Send every buffered datum"""
+        if not self.pending:
+            return
+        batch = [self._render(datum) for datum in self.pending.values()]
+        self.pending = {}
+        self.pending_bytes = 0
+        self._put(batch)
+
+    def _put(self, batch):
+        attempt = 0
+        while True:
+            attempt += 1
+            self.calls += 1
+            try:
+                self.cw_client.put_metric_data(Namespace=self.namespace, MetricData=batch)
+                break
+            except Exception as e:
+                # botocore's ClientError, matched by its response so botocore
+                # is not imported before the first client is created
+                code = (getattr(e, 'response', None) or {}).get('Error', {}).get('Code')
+                if code not in RETRYABLE_ERRORS or attempt >= self.max_attempts:
+                    print(f"Error publishing {len(batch)} metrics: {str(e)}")
+                    raise
+                # Full jitter: a random delay up to an exponentially growing cap
+                delay = random.uniform(0, min(20.0, 0.5 * 2 ** attempt))
+                print(f"PutMetricData throttled ({code}), retrying batch in {delay:.1f} seconds...")
+                self.sleep(delay)
+        self.datums_flushed += len(batch)
+        print(f"Published batch of {len(batch)} metrics")
+
+    @staticmethod
+    def _render(datum):
+        metric = {
+            'MetricName': datum['name'],
+            'Timestamp': datum['timestamp'],
+            'Unit': datum['unit'],
+            'Dimensions': datum['dimensions']
+        }
+        if len(datum['values']) == 1 and next(iter(datum['values'].values())) == 1:
+            metric['Value'] = next(iter(datum['values']))
+        else:
+            metric['Values'] = list(datum['values'])
+            metric['Counts'] = [float(count) for count in datum['values'].values()]
+        return metric
+
+
+class ScopedPublisher:
+    """
+    Adds fixed dimensions to the points it passes on to a MetricPublisher
+
+    Args:
+        publisher: MetricPublisher holding the shared buffer
+        dimensions: Dimensions placed after the publisher's base dimensions
+            and before each point's own
+    """
+
+    def __init__(self, publisher, dimensions):
+        self.publisher = publisher
+        self.dimensions = list(dimensions)
+
+    def add(self, metric_name, value, dimensions=None, timestamp=None, unit='None'):
+        self.publisher.add(metric_name, value, self.dimensions + list(dimensions or []), timestamp, unit)
+
+
+def encoded_size(metric):
+    """
+    Upper bound on the bytes a datum adds to the form-encoded request, e.g.
+    MetricData.member.1000.Dimensions.member.1.Name=Project&
+    """
+    prefix = len('MetricData.member.1000.') + 1
+    size = prefix + len('MetricName=') + len(metric['MetricName'])
+    size += prefix + len('Timestamp=') + len('2000-01-01T00:00:00.000000Z')
+    size += prefix + len('Unit=') + len(metric['Unit'])
+    for dimension in metric['Dimensions']:
+        size += 2 * (prefix + len('Dimensions.member.10.Value=')) + len(dimension['Name']) + len(dimension['Value']) * 3
+    for value in metric.get('Values', [metric.get('Value')]):
+        size += prefix + len('Values.member.150=') + len(repr(value))
+    for count in metric.get('Counts', []):
+        size += prefix + len('Counts.member.150=') + len(repr(count))
+    return size
@@ -0,0 +1,117 @@
+"""
+In-memory AWS stand-ins for the cost Lambdas
+
+The Lambda modules are deployed side by side, so the lambda directory is
+put on sys.path and the tests import them under their source names.
+"""
+
+import io
+import os
+import sys
+from datetime import date, timedelta
+
+import pytest
+
+TESTS_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(TESTS_DIR, '..'))
+
+
+class ClientError(Exception):
+    """Error carrying a botocore-style response, like botocore's ClientError"""
+
+    def __init__(self, code):
+        super().__init__(f'An error occurred ({code})')
+        self.response = {'Error': {'Code': code, 'Message': code}}
+
+
+class CloudWatchStandIn:
+    """
+    Records PutMetricData calls. The error codes in errors are raised by
+    the next calls, one per call; calls to a namespace in denied always
+    fail.
+    """
+
+    def __init__(self):
+        self.errors = []
+        self.denied = set()
+        self.calls = []
+        self.published = []
+
+    def put_metric_data(self, Namespace, MetricData):
+        self.calls.append(MetricData)
+        if self.errors:
+            raise ClientError(self.errors.pop(0))
+        if Namespace in self.denied:
+            raise ClientError('AccessDenied')
+        self.published.extend(dict(datum, Namespace=Namespace) for datum in MetricData)
+
+    def points(self, metric_name):
+        """Published datums of one metric"""
+        return [datum for datum in self.published if datum['MetricName'] == metric_name]
+
+
+class S3StandIn:
+    """Bucket contents in a dict, with the calls the Lambdas make"""
+
+    class exceptions:
+        class NoSuchKey(Exception):
+            pass
+
+    def __init__(self):
+        self.objects = {}
+
+    def get_object(self, Bucket, Key):
+        if (Bucket, Key) not in self.objects:
+            raise self.exceptions.NoSuchKey(Key)
+        return {'Body': io.BytesIO(self.objects[(Bucket, Key)])}
+
+    def put_object(self, Bucket, Key, Body, **kwargs):
+        self.objects[(Bucket, Key)] = Body
+
+
+class CostExplorerStandIn:
+    """
+    Daily costs of every group in groups, the same amount each day. Days
+    in estimated come back flagged as Estimated.
+
+    Args:
+        groups: Dict of '|'-joined group keys (e.g. a service name, or
+            'Environment$dev|AWS Lambda' for two group-by keys) to daily
+            amount string
+    """
+
+    def __init__(self, groups):
+        self.groups = groups
+        self.estimated = set()
+        self.calls = []
+
+    def get_cost_and_usage(self, TimePeriod, Granularity, Metrics, GroupBy, Filter, NextPageToken=None):
+        self.calls.append(TimePeriod)
+        start = date.fromisoformat(TimePeriod['Start'])
+        results = []
+        for offset in range((date.fromisoformat(TimePeriod['End']) - start).days):
+            day = (start + timedelta(days=offset)).strftime('%Y-%m-%d')
+            results.append({
+                'TimePeriod': {'Start': day, 'End': (start + timedelta(days=offset + 1)).strftime('%Y-%m-%d')},
+                'Estimated': day in self.estimated,
+                'Groups': [
+                    {'Keys': keys.split('|'), 'Metrics': {'UnblendedCost': {'Amount': amount, 'Unit': 'USD'}}}
+                    for keys, amount in self.groups.items()
+                ]
+            })
+        return {'ResultsByTime': results}
+
+
+@pytest.fixture
+def cloudwatch():
+    return CloudWatchStandIn()
+
+
+@pytest.fixture
+def s3():
+    return S3StandIn()
+
+
+@pytest.fixture
+def cost_explorer():
+    return CostExplorerStandIn({'AWS Lambda': '1.25', 'Amazon Simple Storage Service': '0.40'})
@@ -0,0 +1,45 @@
+from datetime import date
+
+import pytest
+
+import cost_analysis
+
+
+def test_flat_history_scores_zero():
+    assert cost_analysis.anomaly_score([10.0] * 14, 10.0) == 0
+
+
+def test_spike_scores_high_and_dip_scores_low():
+    history = [10.0, 11.0, 9.5, 10.5, 10.0, 9.0, 11.5, 10.0, 10.5, 9.5]
+
+    spike = cost_analysis.anomaly_score(history, 30.0)
+    dip = cost_analysis.anomaly_score(history, 2.0)
+
+    assert spike > 10
+    assert dip < -5
+    assert cost_analysis.anomaly_score(history, 10.5) == pytest.approx(0.3, abs=0.5)
+
+
+def test_earlier_spikes_do_not_widen_the_spread():
+    history = [10.0] * 12 + [40.0] + [10.0] * 7
+
+    # The median absolute deviation ignores the single spike, so a new one
+    # still stands out
+    assert cost_analysis.anomaly_score(history, 40.0) > 20
+
+
+def test_zero_mad_uses_the_spread_floor():
+    # MAD is zero; the floor is 5% of the median, i.e. 1.0
+    assert cost_analysis.anomaly_score([20.0] * 10, 21.0) == pytest.approx(1.0)
+    # A history of zeros falls back to the one-cent floor
+    assert cost_analysis.anomaly_score([0.0] * 10, 0.05) == pytest.approx(5.0)
+
+
+def test_short_history_has_no_score():
+    assert cost_analysis.anomaly_score([10.0] * (cost_analysis.MIN_HISTORY_DAYS - 1), 50.0) is None
+
+
+def test_projection_adds_the_daily_rate_for_the_remaining_days():
+    # 15 March: 17 days including today are still to come
+    assert cost_analysis.projected_month_end(140.0, [10.0] * 7, date(2024, 3, 15)) == pytest.approx(310.0)
+    assert cost_analysis.projected_month_end(0.0, [], date(2024, 3, 1)) == 0.0
@@ -0,0 +1,89 @@
+import json
+from datetime import date, timedelta
+
+import pytest
+
+import cost_cache
+import cost_config
+import cost_exporter
+
+BUCKET = 'cost-cache'
+KEY = 'cost-cache/daily.json'
+QUERY = [cost_config.parse_dimension({'key': 'SERVICE'})]
+TODAY = date(2024, 3, 15)
+
+
+def day(offset):
+    """YYYY-MM-DD of TODAY plus offset days"""
+    return (TODAY + timedelta(days=offset)).strftime('%Y-%m-%d')
+
+
+@pytest.fixture
+def cached_run(s3, cost_explorer, monkeypatch):
+    """refresh_cache against the stand-ins, with the cache in S3 keeping 30 days"""
+    monkeypatch.setenv('COST_CACHE_BUCKET', BUCKET)
+    monkeypatch.setenv('COST_CACHE_DAYS', '30')
+    monkeypatch.delenv('COST_CACHE_PATH', raising=False)
+    monkeypatch.setattr(cost_exporter.aws_clients, 'client', lambda service, **config: s3)
+    monkeypatch.setattr(cost_exporter, 'ce_client', lambda: cost_explorer)
+    return lambda today: cost_exporter.refresh_cache(QUERY, today - timedelta(days=8), today)
+
+
+def test_stale_days_are_missing_estimated_or_newest():
+    cache = cost_cache.CostCache()
+    cache.put_day(day(-4), {'AWS Lambda': '1.25'}, estimated=False)
+    cache.put_day(day(-3), {'AWS Lambda': '1.25'}, estimated=True)
+    cache.put_day(day(-1), {'AWS Lambda': '1.25'}, estimated=False)
+
+    assert cache.stale_days(TODAY - timedelta(days=5), TODAY) == [day(-5), day(-3), day(-2), day(-1)]
+
+
+def test_final_days_are_served_from_the_cache(cached_run, cost_explorer, s3):
+    cost_explorer.estimated = {day(-2), day(-1)}
+    cached_run(TODAY)
+
+    # The next day only the days that were estimated, and the new one, are
+    # fetched again
+    cost_explorer.estimated = {day(-1), day(0)}
+    cache = cached_run(TODAY + timedelta(days=1))
+
+    assert cost_explorer.calls == [
+        {'Start': day(-30), 'End': day(0)},
+        {'Start': day(-2), 'End': day(1)}
+    ]
+    assert cache.services(day(-20)) == {'AWS Lambda': '1.25', 'Amazon Simple Storage Service': '0.40'}
+    assert [cache.estimated(d) for d in (day(-2), day(-1), day(0))] == [False, True, True]
+
+
+def test_estimated_days_are_always_refetched(cached_run, cost_explorer):
+    cost_explorer.estimated = {day(-3), day(-2), day(-1)}
+    cached_run(TODAY)
+    cost_explorer.groups['AWS Lambda'] = '2.00'
+
+    # Still estimated the next day; refetched with their new amounts
+    cost_explorer.estimated = {day(-3), day(-2), day(-1), day(0)}
+    cache = cached_run(TODAY + timedelta(days=1))
+
+    assert cost_explorer.calls[-1] == {'Start': day(-3), 'End': day(1)}
+    assert cache.services(day(-3))['AWS Lambda'] == '2.00'
+    assert cache.services(day(-4))['AWS Lambda'] == '1.25'
+
+
+def test_days_past_retention_are_dropped(cached_run, s3):
+    cached_run(TODAY)
+    cached_run(TODAY + timedelta(days=5))
+
+    days = json.loads(s3.objects[(BUCKET, KEY)])['days']
+    assert min(days) == day(-25)
+
+
+@pytest.mark.parametrize('body', [None, b'{"version": 1, "days": {', b''])
+def test_missing_or_corrupt_cache_falls_back_to_a_full_query(cached_run, cost_explorer, s3, body):
+    if body is not None:
+        s3.put_object(Bucket=BUCKET, Key=KEY, Body=body)
+
+    cache = cached_run(TODAY)
+
+    assert cost_explorer.calls == [{'Start': day(-30), 'End': day(0)}]
+    assert len(json.loads(s3.objects[(BUCKET, KEY)])['days']) == 30
+    assert cache.services(day(-1))['AWS Lambda'] == '1.25'
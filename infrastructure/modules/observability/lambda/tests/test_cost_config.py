@@ -0,0 +1,94 @@
+import json
+from decimal import Decimal
+
+import pytest
+
+import cost_config
+
+CONFIG = json.dumps({
+    'dimensions': [
+        {'key': 'SERVICE'},
+        {'key': 'TAG:Service', 'names': {'': 'untagged', 'user-svc': 'user-service'}},
+        {'key': 'REGION'}
+    ],
+    'maxSeries': 5
+})
+
+
+def group_bys(queries):
+    return [[cost_config.group_by(dimension) for dimension in query] for query in queries]
+
+
+def test_default_config_is_the_service_breakdown(monkeypatch):
+    monkeypatch.delenv('COST_CONFIG', raising=False)
+
+    config = cost_config.load_config()
+
+    assert [d['key'] for d in config['dimensions']] == ['SERVICE']
+    assert (config['maxSeries'], config['split']) == (cost_config.DEFAULT_MAX_SERIES, None)
+    assert group_bys(cost_config.query_plan(config['dimensions'])) == [[{'Type': 'DIMENSION', 'Key': 'SERVICE'}]]
+
+
+def test_query_plan_pairs_breakdowns():
+    config = cost_config.load_config(CONFIG)
+
+    assert group_bys(cost_config.query_plan(config['dimensions'])) == [
+        [{'Type': 'DIMENSION', 'Key': 'SERVICE'}, {'Type': 'TAG', 'Key': 'Service'}],
+        [{'Type': 'DIMENSION', 'Key': 'REGION'}]
+    ]
+    assert [(d['metric'], d['dimension']) for d in config['dimensions']] == [
+        ('ServiceCost', 'ServiceName'), ('TagCost', 'Service'), ('RegionCost', 'Region')
+    ]
+
+
+def test_query_plan_with_split_leads_every_query():
+    config = cost_config.load_config(json.dumps(dict(json.loads(CONFIG), split={
+        'key': 'TAG:Environment',
+        'targets': [{'environment': 'dev'}, {'project': 'sdt', 'environment': 'production', 'values': ['prod']}]
+    })))
+    split = config['split']
+
+    assert group_bys(cost_config.query_plan(config['dimensions'], split['dimension'])) == [
+        [{'Type': 'TAG', 'Key': 'Environment'}, {'Type': 'DIMENSION', 'Key': 'SERVICE'}],
+        [{'Type': 'TAG', 'Key': 'Environment'}, {'Type': 'TAG', 'Key': 'Service'}],
+        [{'Type': 'TAG', 'Key': 'Environment'}, {'Type': 'DIMENSION', 'Key': 'REGION'}]
+    ]
+    assert [target['values'] for target in split['targets']] == [['dev'], ['prod']]
+
+
+def test_unsupported_key_is_rejected():
+    with pytest.raises(ValueError):
+        cost_config.load_config(json.dumps({'dimensions': [{'key': 'INSTANCE_TYPE_FAMILY'}]}))
+
+
+def test_friendly_name():
+    service, tag, region = cost_config.load_config(CONFIG)['dimensions']
+
+    assert cost_config.friendly_name(service, 'Amazon Relational Database Service') == 'RDS'
+    assert cost_config.friendly_name(service, 'Amazon Kinesis') == 'Amazon Kinesis'
+    assert cost_config.friendly_name(tag, 'Service$user-svc') == 'user-service'
+    assert cost_config.friendly_name(tag, 'Service$billing') == 'billing'
+    assert cost_config.friendly_name(tag, 'Service$') == 'untagged'
+    assert cost_config.friendly_name(region, 'us-east-1') == 'us-east-1'
+
+
+def test_cap_series_rolls_the_smallest_into_other():
+    amounts = {name: Decimal(amount) for name, amount in
+               [('ECS', '40.00'), ('RDS', '30.00'), ('S3', '0.10'), ('EC2', '12.50'), ('Lambda', '0.20')]}
+
+    assert cost_config.cap_series(amounts, 3) == {
+        'ECS': Decimal('40.00'), 'RDS': Decimal('30.00'), 'EC2': Decimal('12.50'), 'Other': Decimal('0.30')
+    }
+    assert cost_config.cap_series(amounts, 5) == amounts
+
+
+def test_cap_series_adds_to_an_existing_other():
+    amounts = {'ECS': Decimal('40'), 'Other': Decimal('5'), 'S3': Decimal('1'), 'Lambda': Decimal('2')}
+
+    assert cost_config.cap_series(amounts, 2) == {'ECS': Decimal('40'), 'Other': Decimal('8')}
+
+
+def test_cap_series_breaks_ties_by_name():
+    amounts = {'b': Decimal('1'), 'a': Decimal('1'), 'c': Decimal('1')}
+
+    assert cost_config.cap_series(amounts, 2) == {'a': Decimal('1'), 'b': Decimal('1'), 'Other': Decimal('1')}
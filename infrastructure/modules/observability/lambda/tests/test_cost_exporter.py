@@ -0,0 +1,163 @@
+import json
+from datetime import date, timedelta
+from decimal import Decimal
+
+import pytest
+
+import cost_config
+import cost_exporter
+from cost_records import CostRecord, CostRecords
+from metric_publisher import MetricPublisher
+
+SERVICE = cost_config.parse_dimension({'key': 'SERVICE'})
+
+SPLIT_CONFIG = {
+    'split': {
+        'key': 'TAG:Environment',
+        'targets': [
+            {'project': 'sdt', 'environment': 'dev'},
+            {'project': 'sdt', 'environment': 'production', 'values': ['production', 'prod']},
+            {'project': 'billing', 'environment': 'production', 'values': ['prod']}
+        ]
+    }
+}
+
+# Run of 15 March 2024 at 00:00 UTC; 14 March is still estimated
+END_DATE = date(2024, 3, 15)
+DAYS = [(END_DATE - timedelta(days=offset)).strftime('%Y-%m-%d') for offset in range(29, 0, -1)]
+
+
+def daily_records(amounts, estimated=()):
+    """CostRecords of one service per day, from a dict of date to amount string"""
+    return CostRecords(
+        CostRecord(day, ('AWS Lambda',), Decimal(amount), day in estimated)
+        for day, amount in amounts.items()
+    )
+
+
+def publish(cloudwatch, records):
+    publisher = MetricPublisher(cloudwatch, 'SDT/Costs')
+    total = cost_exporter.publish_costs(publisher, [[SERVICE]], [records], DAYS, END_DATE, max_series=20)
+    publisher.flush()
+    return total
+
+
+def test_estimated_day_is_not_scored_or_projected(cloudwatch):
+    amounts = dict.fromkeys(DAYS, '10.00')
+    amounts['2024-03-14'] = '2.00'
+
+    publish(cloudwatch, daily_records(amounts, estimated={'2024-03-14'}))
+
+    # The partial day is left to the next run; 13 March scores as usual
+    assert [point['Value'] for point in cloudwatch.points('CostAnomalyScore')] == [0.0, 0.0]
+    # 1-13 March final at 10.00 plus 18 days to come at 10.00
+    assert cloudwatch.points('ProjectedMonthEndCost')[0]['Value'] == pytest.approx(310.0)
+    # The raw month-to-date figure still includes the estimated day
+    assert cloudwatch.points('MonthToDateCost')[0]['Value'] == pytest.approx(132.0)
+
+
+def test_final_latest_day_is_scored(cloudwatch):
+    amounts = dict.fromkeys(DAYS, '10.00')
+    amounts['2024-03-14'] = '40.00'
+
+    publish(cloudwatch, daily_records(amounts))
+
+    assert all(point['Value'] > 10 for point in cloudwatch.points('CostAnomalyScore'))
+
+
+def test_amounts_become_floats_only_when_published(cloudwatch):
+    # A cent per line item; summed as floats the day would be 9.99999999999983
+    records = CostRecords()
+    for day in DAYS:
+        records.add_day(day, {f'Service {index}': '0.01' for index in range(1000)})
+
+    total = publish(cloudwatch, records)
+
+    assert total == Decimal('10.00')
+    assert [point['Value'] for point in cloudwatch.points('TotalCost')] == [10.0] * 8
+    assert cloudwatch.points('MonthToDateCost')[0]['Value'] == 140.0
+
+
+def test_split_records_divides_costs_between_targets():
+    split = cost_config.load_config(json.dumps(SPLIT_CONFIG))['split']
+    records = CostRecords().add_day('2024-03-14', {
+        'Environment$dev|AWS Lambda': '1.00',
+        'Environment$production|AWS Lambda': '2.00',
+        'Environment$prod|Amazon Relational Database Service': '4.00',
+        'Environment$|AWS Lambda': '8.00'
+    })
+
+    targets = cost_exporter.split_records([records], split, ['2024-03-14'])
+
+    assert {target: [(r.keys, r.amount) for r in query_records[0]] for target, query_records in targets.items()} == {
+        ('sdt', 'dev'): [(('AWS Lambda',), Decimal('1.00'))],
+        ('sdt', 'production'): [
+            (('AWS Lambda',), Decimal('2.00')),
+            (('Amazon Relational Database Service',), Decimal('4.00'))
+        ],
+        # A value can belong to several targets; untagged costs to none
+        ('billing', 'production'): [(('Amazon Relational Database Service',), Decimal('4.00'))]
+    }
+
+
+def fan_out(monkeypatch, cloudwatch, cost_explorer):
+    """Run the handler with SPLIT_CONFIG against the stand-ins"""
+    monkeypatch.setenv('COST_CONFIG', json.dumps(SPLIT_CONFIG))
+    for name in ('COST_CACHE_BUCKET', 'COST_CACHE_PATH'):
+        monkeypatch.delenv(name, raising=False)
+    monkeypatch.setattr(cost_exporter, 'publisher_client', lambda: cloudwatch)
+    monkeypatch.setattr(cost_exporter, 'ce_client', lambda: cost_explorer)
+    cost_explorer.groups = {
+        'Environment$dev|AWS Lambda': '1.00',
+        'Environment$prod|AWS Lambda': '2.00',
+        'Environment$prod|Amazon Relational Database Service': '4.00'
+    }
+    return cost_exporter.handler({}, None)
+
+
+def published_scopes(cloudwatch):
+    """(namespace, project, environment) of every TotalCost point"""
+    return {
+        (point['Namespace'],) + tuple(d['Value'] for d in point['Dimensions'][:2])
+        for point in cloudwatch.points('TotalCost')
+    }
+
+
+def test_one_query_fans_out_to_every_target(monkeypatch, cloudwatch, cost_explorer):
+    response = fan_out(monkeypatch, cloudwatch, cost_explorer)
+
+    assert len(cost_explorer.calls) == 1
+    assert published_scopes(cloudwatch) == {
+        ('SDT/Costs', 'sdt', 'dev'), ('SDT/Costs', 'sdt', 'production'), ('BILLING/Costs', 'billing', 'production')
+    }
+    latest = {
+        tuple(d['Value'] for d in point['Dimensions'][:2]): point['Value']
+        for point in cloudwatch.points('MonthToDateCost')
+    }
+    assert latest[('sdt', 'production')] == latest[('billing', 'production')] == 6 * latest[('sdt', 'dev')]
+    assert response['body'].startswith('Successfully published cost metrics for 3 targets')
+
+
+def test_failed_namespace_does_not_stop_the_other_targets(monkeypatch, cloudwatch, cost_explorer):
+    cloudwatch.denied = {'BILLING/Costs'}
+
+    with pytest.raises(RuntimeError, match='BILLING/Costs'):
+        fan_out(monkeypatch, cloudwatch, cost_explorer)
+
+    assert published_scopes(cloudwatch) == {('SDT/Costs', 'sdt', 'dev'), ('SDT/Costs', 'sdt', 'production')}
+
+
+def test_failed_target_does_not_stop_the_others(monkeypatch, cloudwatch, cost_explorer):
+    publish_costs = cost_exporter.publish_costs
+
+    def failing_for_dev(publisher, *args, **kwargs):
+        if {'Name': 'Environment', 'Value': 'dev'} in publisher.dimensions:
+            raise ValueError('bad records')
+        return publish_costs(publisher, *args, **kwargs)
+
+    monkeypatch.setattr(cost_exporter, 'publish_costs', failing_for_dev)
+
+    with pytest.raises(RuntimeError, match='sdt/dev'):
+        fan_out(monkeypatch, cloudwatch, cost_explorer)
+
+    assert published_scopes(cloudwatch) == {('SDT/Costs', 'sdt', 'production'), ('BILLING/Costs', 'billing', 'production')}
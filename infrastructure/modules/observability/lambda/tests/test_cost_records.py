@@ -0,0 +1,70 @@
+from decimal import Decimal
+
+from cost_records import ZERO, CostRecords
+
+
+def result(day, groups, estimated=False):
+    """ResultsByTime entry with the group keys and amount strings in groups"""
+    return {
+        'TimePeriod': {'Start': day, 'End': day},
+        'Estimated': estimated,
+        'Groups': [
+            {'Keys': list(keys), 'Metrics': {'UnblendedCost': {'Amount': amount, 'Unit': 'USD'}}}
+            for keys, amount in groups
+        ]
+    }
+
+
+def test_amount_strings_are_parsed_once_as_decimals():
+    records = CostRecords().add_results([
+        result('2024-03-01', [(('AWS Lambda', 'us-east-1'), '0.0000012345'), (('AWS Lambda', 'eu-west-1'), '3.1')]),
+        result('2024-03-02', [(('AWS Lambda', 'us-east-1'), '-0.5')], estimated=True)
+    ])
+
+    assert [(r.date, r.keys, r.amount, r.estimated) for r in records] == [
+        ('2024-03-01', ('AWS Lambda', 'us-east-1'), Decimal('0.0000012345'), False),
+        ('2024-03-01', ('AWS Lambda', 'eu-west-1'), Decimal('3.1'), False),
+        ('2024-03-02', ('AWS Lambda', 'us-east-1'), Decimal('-0.5'), True)
+    ]
+    assert records.estimated_days() == {'2024-03-02'}
+
+
+def test_sums_have_no_float_drift():
+    line_items = [(('Service %d' % index,), '0.01') for index in range(1000)]
+    records = CostRecords().add_results([result('2024-03-01', line_items), result('2024-03-02', line_items)])
+
+    assert sum(float(amount) for _, amount in line_items) != 10.0
+    assert records.total() == Decimal('20.00')
+    assert records.daily_totals() == {'2024-03-01': Decimal('10.00'), '2024-03-02': Decimal('10.00')}
+    assert records.between('2024-03-02').total() == Decimal('10.00')
+
+
+def test_daily_totals_include_days_without_records():
+    records = CostRecords().add_day('2024-03-02', {'AWS Lambda': '1.10'})
+
+    assert records.daily_totals(['2024-03-01', '2024-03-02']) == {'2024-03-01': ZERO, '2024-03-02': Decimal('1.10')}
+    assert CostRecords().total() == ZERO
+
+
+def test_groups_sharing_a_display_name_are_summed():
+    records = CostRecords()
+    records.add_day('2024-03-01', {'Amazon Elastic Compute Cloud - Compute|us-east-1': '0.10', 'EC2 - Other|us-east-1': '0.20'})
+    records.add_day('2024-03-02', {'Amazon Elastic Compute Cloud - Compute|eu-west-1': '0.05'})
+
+    def name(service):
+        return 'EC2'
+
+    assert records.by_group(0, name) == {'EC2': Decimal('0.35')}
+    assert records.by_group(1) == {'us-east-1': Decimal('0.30'), 'eu-west-1': Decimal('0.05')}
+    assert records.daily_by_group(0, name) == {'EC2': {'2024-03-01': Decimal('0.30'), '2024-03-02': Decimal('0.05')}}
+
+
+def test_partition_drops_the_split_key():
+    records = CostRecords().add_day('2024-03-01', {'dev|AWS Lambda': '1.00', 'prod|AWS Lambda': '2.00', '|AWS Lambda': '0.50'})
+
+    partitions = records.partition(0, lambda value: [value] if value else [])
+
+    assert {name: [(r.keys, r.amount) for r in part] for name, part in partitions.items()} == {
+        'dev': [(('AWS Lambda',), Decimal('1.00'))],
+        'prod': [(('AWS Lambda',), Decimal('2.00'))]
+    }
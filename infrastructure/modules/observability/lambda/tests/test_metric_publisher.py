@@ -0,0 +1,97 @@
+from datetime import datetime
+
+import pytest
+
+import metric_publisher
+from metric_publisher import MetricPublisher
+
+DAY = datetime(2024, 3, 1)
+SCOPE = [{'Name': 'Project', 'Value': 'sdt'}, {'Name': 'Environment', 'Value': 'dev'}]
+
+
+def test_points_of_one_series_share_a_datum(cloudwatch):
+    publisher = MetricPublisher(cloudwatch, 'SDT/Costs', base_dimensions=SCOPE)
+    for value in (1.5, 1.5, 2.0):
+        publisher.add('ServiceCost', value, timestamp=DAY)
+    publisher.add('TotalCost', 12.25, timestamp=DAY)
+    publisher.flush()
+
+    assert cloudwatch.calls == [[
+        {'MetricName': 'ServiceCost', 'Timestamp': DAY, 'Unit': 'None', 'Dimensions': SCOPE,
+         'Values': [1.5, 2.0], 'Counts': [2.0, 1.0]},
+        {'MetricName': 'TotalCost', 'Timestamp': DAY, 'Unit': 'None', 'Dimensions': SCOPE, 'Value': 12.25}
+    ]]
+    assert (publisher.datums_flushed, publisher.calls) == (2, 1)
+
+
+def test_full_values_array_starts_a_new_datum(cloudwatch):
+    publisher = MetricPublisher(cloudwatch, 'SDT/Costs')
+    for value in range(metric_publisher.MAX_VALUES_PER_DATUM + 1):
+        publisher.add('ServiceCost', float(value), timestamp=DAY)
+    publisher.flush()
+
+    assert [len(call) for call in cloudwatch.calls] == [1, 1]
+    assert len(cloudwatch.calls[0][0]['Values']) == metric_publisher.MAX_VALUES_PER_DATUM
+    assert cloudwatch.calls[1][0]['Value'] == float(metric_publisher.MAX_VALUES_PER_DATUM)
+
+
+def test_batches_hold_at_most_1000_datums(cloudwatch):
+    publisher = MetricPublisher(cloudwatch, 'SDT/Costs')
+    for index in range(metric_publisher.MAX_DATUMS_PER_CALL + 1):
+        publisher.add(f'Metric{index}', 1.0, timestamp=DAY)
+    publisher.flush()
+
+    assert [len(call) for call in cloudwatch.calls] == [metric_publisher.MAX_DATUMS_PER_CALL, 1]
+    assert (publisher.datums_flushed, publisher.calls) == (metric_publisher.MAX_DATUMS_PER_CALL + 1, 2)
+
+
+def test_batches_split_at_the_request_size_limit(cloudwatch):
+    publisher = MetricPublisher(cloudwatch, 'SDT/Costs')
+    for index in range(500):
+        publisher.add('TagCost', 1.0, dimensions=[{'Name': 'Service', 'Value': f'{index:04d}' + 'x' * 1000}],
+                      timestamp=DAY)
+    publisher.flush()
+
+    assert len(cloudwatch.calls) == 2
+    assert sum(len(call) for call in cloudwatch.calls) == 500
+    for call in cloudwatch.calls:
+        assert sum(metric_publisher.encoded_size(datum) for datum in call) <= metric_publisher.MAX_REQUEST_BYTES
+
+
+def test_throttled_batch_is_retried_once_on_its_own(cloudwatch):
+    cloudwatch.errors = ['Throttling']
+    sleeps = []
+    publisher = MetricPublisher(cloudwatch, 'SDT/Costs', sleep=sleeps.append)
+    for index in range(metric_publisher.MAX_DATUMS_PER_CALL + 1):
+        publisher.add(f'Metric{index}', 1.0, timestamp=DAY)
+    publisher.flush()
+
+    # The first batch is sent twice, the second one once
+    assert [len(call) for call in cloudwatch.calls] == [metric_publisher.MAX_DATUMS_PER_CALL] * 2 + [1]
+    assert cloudwatch.calls[0] == cloudwatch.calls[1]
+    assert len(sleeps) == 1 and 0 <= sleeps[0] <= 1.0
+    assert len(cloudwatch.published) == metric_publisher.MAX_DATUMS_PER_CALL + 1
+    assert publisher.calls == 3
+
+
+def test_other_errors_are_not_retried(cloudwatch):
+    cloudwatch.errors = ['InvalidParameterValue']
+    sleeps = []
+    publisher = MetricPublisher(cloudwatch, 'SDT/Costs', sleep=sleeps.append)
+    publisher.add('TotalCost', 1.0, timestamp=DAY)
+
+    with pytest.raises(Exception):
+        publisher.flush()
+    assert (len(cloudwatch.calls), sleeps) == (1, [])
+
+
+def test_scoped_publishers_share_batches(cloudwatch):
+    publisher = MetricPublisher(cloudwatch, 'SDT/Costs')
+    for environment in ('dev', 'production'):
+        publisher.scoped([{'Name': 'Environment', 'Value': environment}]).add('TotalCost', 1.0, timestamp=DAY)
+    publisher.flush()
+
+    assert [datum['Dimensions'] for datum in cloudwatch.calls[0]] == [
+        [{'Name': 'Environment', 'Value': 'dev'}],
+        [{'Name': 'Environment', 'Value': 'production'}]
+    ]
@@ -65,6 +65,57 @@ variable "key_name" {
   default     = null
 }
 
+variable "cost_cache_days" {
+  description = "Days of daily Cost Explorer results kept in the cost cache"
+  type        = number
+  default     = 90
+}
+
+variable "cost_dimensions" {
+  description = "Cost Explorer breakdowns published by the cost exporter: SERVICE, USAGE_TYPE, REGION, LINKED_ACCOUNT or TAG:<key>, each with an optional map of friendly names"
+  type = list(object({
+    key   = string
+    names = optional(map(string), {})
+  }))
+  default = [
+    { key = "SERVICE" }
+  ]
+}
+
+variable "cost_max_series" {
+  description = "Largest series published per cost breakdown; the rest are summed into Other"
+  type        = number
+  default     = 20
+}
+
+variable "enable_cost_forecast" {
+  description = "Also publish Cost Explorer's month-end forecast (ForecastMonthEndCost); each forecast is a paid API request"
+  type        = bool
+  default     = false
+}
+
+variable "enable_cost_exporter" {
+  description = "Deploy the cost exporter Lambda; turn off in environments whose costs another environment's exporter publishes (see cost_targets)"
+  type        = bool
+  default     = true
+}
+
+variable "cost_split_by" {
+  description = "Cost Explorer key telling the cost_targets apart: TAG:<key> or LINKED_ACCOUNT"
+  type        = string
+  default     = "TAG:Environment"
+}
+
+variable "cost_targets" {
+  description = "Project/environment pairs one exporter run publishes costs for, each owning the cost_split_by values listed (its environment name by default). Empty publishes the whole account as this project and environment"
+  type = list(object({
+    project     = optional(string)
+    environment = string
+    values      = optional(list(string))
+  }))
+  default = []
+}
+
 variable "tags" {
   description = "Tags to apply"
   type        = map(string)